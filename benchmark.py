@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+
+"""benchmark.py
+
+Udacity conference server-side Python App Engine micro-benchmarks
+
+Boots conference.api and main.app against the App Engine testbed
+(datastore, memcache, taskqueue and friends stubbed out locally), seeds
+conferences, sessions and users, then calls each ConferenceApi endpoint
+and task handler repeatedly.  For every endpoint it reports throughput,
+p50/p95/p99 latency and the mean number of API RPCs per call by service.
+
+usage: python benchmark.py --sdk ~/google-cloud-sdk/platform/google_appengine
+           [--conferences 200] [--sessions 5] [--users 20] [--calls 100]
+           [--only getConference,queryConferences]
+
+"""
+
+import argparse
+import collections
+import os
+import random
+import sys
+import time
+
+CITIES = ['London', 'Chicago', 'Tokyo', 'Paris', 'Palo Alto', 'San Francisco']
+TOPICS = ['Medical Innovations', 'Programming Languages',
+          'Web Technologies', 'Movie Making']
+SESSION_TYPES = ['Lecture', 'Keynote', 'Workshop', 'Panel']
+SPEAKERS = ['Speaker %d' % i for i in range(40)]
+
+
+def setupSdk(sdk_path):
+    """Put the App Engine SDK and its bundled libraries on sys.path."""
+    if sdk_path:
+        sys.path.insert(0, sdk_path)
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile of sorted values."""
+    if not values:
+        return 0.0
+    index = int(round(pct / 100.0 * (len(values) - 1)))
+    return values[index]
+
+
+class RpcCounter(object):
+    """RpcCounter -- counts API calls made through the apiproxy"""
+
+    def __init__(self):
+        self.counts = collections.Counter()
+
+    def __call__(self, service, call, request, response):
+        self.counts['%s.%s' % (service, call)] += 1
+
+    def reset(self):
+        counts, self.counts = self.counts, collections.Counter()
+        return counts
+
+
+class Benchmark(object):
+    """Benchmark -- testbed backed driver for the conference app"""
+
+    def __init__(self, args):
+        from google.appengine.api import apiproxy_stub_map
+        from google.appengine.datastore import datastore_stub_util
+        from google.appengine.ext import testbed
+
+        self.args = args
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub(
+            consistency_policy=datastore_stub_util.
+            PseudoRandomHRConsistencyPolicy(probability=1))
+        self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub(
+            root_path=os.path.dirname(os.path.abspath(__file__)))
+        self.testbed.init_app_identity_stub()
+        self.testbed.init_mail_stub()
+        self.testbed.init_search_stub()
+        self.testbed.init_urlfetch_stub()
+        self.testbed.init_user_stub()
+        self.taskqueue = self.testbed.get_stub(
+            testbed.TASKQUEUE_SERVICE_NAME)
+
+        self.rpcs = RpcCounter()
+        apiproxy_stub_map.apiproxy.GetPreCallHooks().Append(
+            'benchmark', self.rpcs)
+
+        import conference
+        import main
+        self.conference = conference
+        self.main = main
+        self.results = collections.OrderedDict()
+
+    def close(self):
+        self.testbed.deactivate()
+
+    def loginAs(self, user_index):
+        """Make the endpoints user the benchmark user user_index."""
+        os.environ['ENDPOINTS_AUTH_EMAIL'] = 'user%d@example.com' % (
+            user_index)
+        os.environ['ENDPOINTS_AUTH_DOMAIN'] = 'example.com'
+
+    def api(self):
+        """Return a fresh ConferenceApi, as for every real request."""
+        return self.conference.ConferenceApi()
+
+    @staticmethod
+    def request(method, **fields):
+        """Return a request message for an endpoints method."""
+        return method.remote.request_type(**fields)
+
+    def runTasks(self):
+        """Run queued tasks through main.app until the queues drain."""
+        while True:
+            # pull queue tasks are leased by the push tasks' handlers
+            tasks = self.taskqueue.get_filtered_tasks(
+                queue_names=['default'])
+            if not tasks:
+                return
+            for queue in set(task.queue_name for task in tasks):
+                self.taskqueue.FlushQueue(queue)
+            for task in tasks:
+                self.main.app.get_response(
+                    task.url, method=task.method, POST=task.payload or '',
+                    headers=dict(task.headers))
+
+    def seed(self):
+        """Create users, conferences, sessions, registrations and
+        wishlists through the API."""
+        from models import ConferenceForm
+        from models import ConferenceForms
+        from models import SessionForm
+
+        api_class = self.conference.ConferenceApi
+        args = self.args
+        self.conf_keys = []
+        self.session_keys = []
+        for user in range(args.users):
+            self.loginAs(user)
+            forms = []
+            for i in range(user, args.conferences, args.users):
+                month = random.randint(1, 12)
+                forms.append(ConferenceForm(
+                    name='Conference %d' % i,
+                    description='Benchmark conference %d' % i,
+                    city=random.choice(CITIES),
+                    topics=random.sample(TOPICS, 2),
+                    startDate='2016-%02d-01' % month,
+                    endDate='2016-%02d-03' % month,
+                    maxAttendees=random.choice([5, 50, 500])))
+            result = self.api().importConferences(ConferenceForms(items=forms))
+            self.conf_keys.extend(
+                item.websafeKey for item in result.items if item.websafeKey)
+
+        self.loginAs(0)
+        for websafe_key in self.conf_keys:
+            forms = [SessionForm(
+                name='Session %d' % i,
+                speaker=random.choice(SPEAKERS),
+                typeOfSession=random.choice(SESSION_TYPES),
+                date='2016-06-01',
+                start_time='%02d:00' % random.randint(8, 20),
+                duration='60') for i in range(args.sessions)]
+            result = self.api().importSessions(self.request(
+                api_class.importSessions,
+                websafeConferenceKey=websafe_key, items=forms))
+            self.session_keys.extend(
+                item.websafeKey for item in result.items if item.websafeKey)
+
+        for user in range(args.users):
+            self.loginAs(user)
+            for websafe_key in random.sample(
+                    self.conf_keys, min(3, len(self.conf_keys))):
+                try:
+                    self.api().registerForConference(self.request(
+                        api_class.registerForConference,
+                        websafeConferenceKey=websafe_key))
+                except self.conference.ConflictException:
+                    pass
+            if self.session_keys:
+                self.api().addSessionToWishlist(self.request(
+                    api_class.addSessionToWishlist,
+                    websafeSessionKey=random.choice(self.session_keys)))
+        self.runTasks()
+        self.rpcs.reset()
+
+    def measure(self, name, call):
+        """Time args.calls invocations of call(i) and record the results."""
+        if self.args.only and name not in self.args.only:
+            return
+        latencies = []
+        rpcs = collections.Counter()
+        devnull = open(os.devnull, 'w')
+        stdout = sys.stdout
+        for i in range(self.args.calls):
+            self.rpcs.reset()
+            sys.stdout = devnull
+            try:
+                start = time.time()
+                call(i)
+                latencies.append(time.time() - start)
+            finally:
+                sys.stdout = stdout
+            rpcs.update(self.rpcs.reset())
+        devnull.close()
+        latencies.sort()
+        self.results[name] = (latencies, rpcs)
+
+    def call(self, method_name, request=None, **fields):
+        """Call an endpoint on a fresh ConferenceApi, building its
+        request message from fields unless one is given."""
+        method = getattr(self.api(), method_name)
+        if request is None:
+            request = self.request(
+                getattr(self.conference.ConferenceApi, method_name), **fields)
+        return method(request)
+
+    def run(self):
+        """Call every endpoint and task handler."""
+        from models import ConferenceForm
+        from models import ConferenceQueryForm
+        from models import ConferenceQueryForms
+        from models import ConferenceSearchForm
+        from models import ConferenceSearchRange
+        from models import ProfileMiniForm
+        from protorpc import message_types
+
+        void = message_types.VoidMessage()
+        confs = self.conf_keys
+        sessions = self.session_keys
+        call = self.call
+        conflict = self.conference.ConflictException
+
+        def pick(keys, i):
+            return keys[i % len(keys)]
+
+        def user(i):
+            self.loginAs(i % self.args.users)
+
+        def createConference(i):
+            user(i)
+            call('createConference', ConferenceForm(
+                name='New conference %d' % i, city=random.choice(CITIES),
+                startDate='2016-07-01', maxAttendees=100))
+
+        def queryConferences(i):
+            call('queryConferences', ConferenceQueryForms(filters=[
+                ConferenceQueryForm(field='CITY', operator='EQ',
+                                    value=pick(CITIES, i)),
+                ConferenceQueryForm(field='MONTH', operator='GT',
+                                    value=str(i % 12))]))
+
+        def queryConferencesPlanned(i):
+            call('queryConferences', ConferenceQueryForms(filters=[
+                ConferenceQueryForm(field='MAX_ATTENDEES', operator='GT',
+                                    value=str(i % 200)),
+                ConferenceQueryForm(field='MONTH', operator='GTEQ',
+                                    value=str(i % 12))]))
+
+        def queryConferencesByDates(i):
+            call('queryConferences', ConferenceQueryForms(filters=[
+                ConferenceQueryForm(field='DATES', operator='OVERLAPS',
+                                    value='2016-%02d-02/2016-%02d-20' % (
+                                        i % 12 + 1, i % 12 + 1)),
+                ConferenceQueryForm(field='MAX_ATTENDEES', operator='GT',
+                                    value='10')]))
+
+        def searchConferences(i):
+            call('searchConferences', ConferenceSearchForm(
+                query='conference',
+                filters=[ConferenceQueryForm(field='CITY', operator='NE',
+                                             value=pick(CITIES, i))],
+                ranges=[ConferenceSearchRange(field='MONTH', low=1, high=3),
+                        ConferenceSearchRange(field='MONTH', low=9)],
+                facets=['CITY', 'MONTH']))
+
+        def register(i):
+            user(i)
+            websafe_key = pick(confs, i * 7)
+            try:
+                call('registerForConference',
+                     websafeConferenceKey=websafe_key)
+            except conflict:
+                pass
+            call('unregisterFromConference', websafeConferenceKey=websafe_key)
+
+        def createSession(i):
+            user(0)
+            call('createSession', websafeConferenceKey=pick(confs, i),
+                 name='New session %d' % i, speaker=pick(SPEAKERS, i),
+                 start_time='10:00', duration='45')
+
+        def addSessionToWishlist(i):
+            user(i)
+            try:
+                call('addSessionToWishlist',
+                     websafeSessionKey=pick(sessions, i * 13))
+            except conflict:
+                pass
+
+        measure = self.measure
+        measure('createConference', createConference)
+        measure('getConference', lambda i: call(
+            'getConference', websafeConferenceKey=pick(confs, i)))
+        measure('getConferencesCreated', lambda i: (
+            user(i), call('getConferencesCreated', void)))
+        measure('queryConferences', queryConferences)
+        measure('queryConferences_unfiltered', lambda i: call(
+            'queryConferences', ConferenceQueryForms()))
+        measure('queryConferences_planned', queryConferencesPlanned)
+        measure('queryConferences_dates', queryConferencesByDates)
+        measure('searchConferences', searchConferences)
+        measure('getConferenceStats', lambda i: call(
+            'getConferenceStats', void))
+        measure('getProfile', lambda i: (user(i), call('getProfile', void)))
+        measure('saveProfile', lambda i: (user(i), call(
+            'saveProfile', ProfileMiniForm(displayName='User %d' % i))))
+        measure('registerForConference+unregister', register)
+        measure('getConferencesToAttend', lambda i: (
+            user(i), call('getConferencesToAttend')))
+
+        measure('createSession', createSession)
+        measure('getConferenceSessions', lambda i: call(
+            'getConferenceSessions', websafeConferenceKey=pick(confs, i)))
+        measure('getConferenceSessionsByType', lambda i: call(
+            'getConferenceSessionsByType',
+            websafeConferenceKey=pick(confs, i),
+            typeOfSession=pick(SESSION_TYPES, i)))
+        measure('getSessionsBySpeaker', lambda i: call(
+            'getSessionsBySpeaker', speaker=pick(SPEAKERS, i)))
+        measure('getSessionsBeforeTime', lambda i: call(
+            'getSessionsBeforeTime', excludeType='Workshop',
+            beforeTime='19:00'))
+        if sessions:
+            measure('addSessionToWishlist', addSessionToWishlist)
+        measure('getSessionsInWishlist', lambda i: (
+            user(i), call('getSessionsInWishlist')))
+        measure('getAgenda', lambda i: (user(i), call('getAgenda')))
+        measure('getFeaturedSpeaker', lambda i: call(
+            'getFeaturedSpeaker', websafeConferenceKey=pick(confs, i)))
+        measure('getAnnouncement', lambda i: call('getAnnouncement', void))
+
+        measure('cron:set_announcement', lambda i: self.main.app
+                .get_response('/crons/set_announcement'))
+        measure('tasks:drain', lambda i: self.runTasks())
+
+    def report(self, out=sys.stdout):
+        """Print one line of statistics per endpoint."""
+        out.write('%-36s %8s %9s %9s %9s  %s\n' % (
+            'endpoint', 'calls/s', 'p50 ms', 'p95 ms', 'p99 ms',
+            'RPCs per call'))
+        for name, (latencies, rpcs) in self.results.items():
+            total = sum(latencies)
+            calls = len(latencies)
+            per_call = ', '.join(
+                '%s=%.1f' % (rpc, float(count) / calls)
+                for rpc, count in sorted(rpcs.items()))
+            out.write('%-36s %8.1f %9.2f %9.2f %9.2f  %s\n' % (
+                name, calls / total if total else 0.0,
+                1000 * percentile(latencies, 50),
+                1000 * percentile(latencies, 95),
+                1000 * percentile(latencies, 99),
+                per_call or '-'))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark ConferenceApi against local stubs.')
+    parser.add_argument('--sdk', default=os.environ.get('APPENGINE_SDK'),
+                        help='path of the App Engine Python SDK')
+    parser.add_argument('--conferences', type=int, default=200)
+    parser.add_argument('--sessions', type=int, default=5,
+                        help='sessions per conference')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--calls', type=int, default=100,
+                        help='calls per endpoint')
+    parser.add_argument('--only', type=lambda value: value.split(','),
+                        help='comma separated endpoints to run')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed for the generated data')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    setupSdk(args.sdk)
+    benchmark = Benchmark(args)
+    try:
+        start = time.time()
+        benchmark.seed()
+        sys.stderr.write('seeded %d conferences, %d sessions in %.1fs\n' % (
+            len(benchmark.conf_keys), len(benchmark.session_keys),
+            time.time() - start))
+        benchmark.run()
+        benchmark.report()
+    finally:
+        benchmark.close()
+
+
+if __name__ == '__main__':
+    main()
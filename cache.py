@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+"""cache.py
+
+Udacity conference server-side Python App Engine read-through entity cache
+
+Entities are looked up in an in-process LRU tier, then in memcache and
+only then in the datastore.  Both tiers hold the encoded entity protobuf,
+so every caller gets its own copy and may modify it freely.  Code that
+put()s a cached kind must invalidate the key once the write committed.
+Misses fill memcache with add(), and invalidation deletes with a lock, so
+a reader that fetched the old entity before the write cannot put it back
+after the invalidation.
+
+"""
+
+import collections
+import threading
+import time
+
+from google.appengine.api import memcache
+from google.appengine.datastore import entity_pb
+from google.appengine.ext import ndb
+
+import metrics
+
+from settings import ENTITY_CACHE_TTL
+from settings import LOCAL_CACHE_SIZE
+from settings import LOCAL_CACHE_TTL
+
+MEMCACHE_ENTITY_PREFIX = 'entity:'
+# seconds after an invalidation during which misses do not fill memcache
+INVALIDATION_LOCK_SECONDS = 5
+
+
+class LRUCache(object):
+    """LRUCache -- size bounded in-process cache with per-entry expiry"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value cached for key, or None."""
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.time():
+                return None
+            # re-insert to mark as most recently used
+            self._items[key] = item
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Cache value for key (for ttl seconds, if less than the cache's),
+        evicting the least recently used entry."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (value, time.time() + ttl)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        """Drop key from the cache."""
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._items.clear()
+
+
+class EntityCache(object):
+    """EntityCache -- read-through cache of NDB entities by key"""
+
+    def __init__(self, ttl=ENTITY_CACHE_TTL, local=None):
+        self.ttl = ttl
+        self.local = local or LRUCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL)
+        self.counters = collections.Counter()
+
+    def _count(self, name, value=1):
+        self.counters[name] += value
+        metrics.count('entity_cache_' + name, value)
+
+    @staticmethod
+    def _cacheKey(key):
+        return MEMCACHE_ENTITY_PREFIX + key.urlsafe()
+
+    @staticmethod
+    def _encode(entity):
+        return entity._to_pb().Encode()
+
+    @staticmethod
+    def _decode(data):
+        return ndb.ModelAdapter().pb_to_entity(entity_pb.EntityProto(data))
+
+    def get(self, key):
+        """Return the entity for key, or None if it does not exist."""
+        return self.get_multi([key])[0]
+
+    def get_multi(self, keys):
+        """Return entities for keys (None where missing), in key order."""
+        return self.get_multi_async(keys).get_result()
+
+    @ndb.tasklet
+    def get_async(self, key):
+        """Return a future for the entity for key."""
+        entities = yield self.get_multi_async([key])
+        raise ndb.Return(entities[0])
+
+    @ndb.tasklet
+    def get_multi_async(self, keys):
+        """Return a future for the entities for keys, in key order."""
+        # reads inside a transaction must see the datastore itself
+        if ndb.in_transaction():
+            entities = yield ndb.get_multi_async(keys)
+            raise ndb.Return(entities)
+
+        found = {}
+        for key in set(keys):
+            data = self.local.get(key)
+            if data is not None:
+                found[key] = data
+        self._count('local_hits', len(found))
+
+        missing = [key for key in set(keys) if key not in found]
+        if missing:
+            cached = yield memcache.Client().get_multi_async(
+                [self._cacheKey(key) for key in missing])
+            for key in missing:
+                data = cached.get(self._cacheKey(key))
+                if data is not None:
+                    found[key] = data
+                    self.local.set(key, data)
+                    self._count('memcache_hits')
+
+        missing = [key for key in missing if key not in found]
+        if missing:
+            self._count('misses', len(missing))
+            mapping = {}
+            entities = yield ndb.get_multi_async(missing)
+            for key, entity in zip(missing, entities):
+                if entity is None:
+                    continue
+                data = self._encode(entity)
+                found[key] = data
+                mapping[self._cacheKey(key)] = data
+                self.local.set(key, data)
+            if mapping:
+                # add() leaves entries of concurrent writes alone and
+                # fails while an invalidation lock is held
+                yield memcache.Client().add_multi_async(
+                    mapping, time=self.ttl)
+
+        raise ndb.Return([self._decode(found[key]) if key in found else None
+                          for key in keys])
+
+    def invalidate(self, *keys):
+        """Forget cached copies of the entities for keys."""
+        for key in keys:
+            self.local.delete(key)
+        memcache.delete_multi([self._cacheKey(key) for key in keys],
+                              seconds=INVALIDATION_LOCK_SECONDS)
+
+    def stats(self):
+        """Return hit/miss counters of this process."""
+        stats = dict(self.counters)
+        lookups = sum(self.counters.values())
+        hits = self.counters['local_hits'] + self.counters['memcache_hits']
+        stats['hit_ratio'] = float(hits) / lookups if lookups else 0.0
+        return stats
+
+
+entity_cache = EntityCache()
@@ -1,36 +1,100 @@
 # !/usr/bin/env python
 
+import collections
 from datetime import datetime
+import hashlib
+import httplib
+import json
+import random
+import time
 import endpoints
 from protorpc import messages
 from protorpc import message_types
 from protorpc import remote
+from google.appengine.api import datastore_errors
 from google.appengine.api import memcache
+from google.appengine.api import search
 from google.appengine.api import taskqueue
+from google.appengine.datastore.datastore_query import Cursor
 from google.appengine.ext import ndb
+from models import AgendaDayForm
+from models import AgendaForm
+from models import AgendaSessionForm
+from models import AttendeeForm
+from models import AttendeeForms
+from models import ConferenceAttendee
 from models import ConflictException
+from models import Registration
 from models import Profile
 from models import ProfileMiniForm
 from models import ProfileForm
 from models import StringMessage
+from models import ImportResultForm
+from models import ImportResultForms
 from models import BooleanMessage
 from models import Conference
+from models import SeatShard
+from models import StatCountForm
+from models import StatsRollup
+from models import ConferenceStatsForm
 from models import ConferenceForm
 from models import ConferenceForms
 from models import ConferenceQueryForm
 from models import ConferenceQueryForms
+from models import ConferenceSearchForm
+from models import ConferenceSearchForms
+from models import FacetForm
+from models import FacetValueForm
 from models import TeeShirtSize
 from models import Session
 from models import SessionForm
 from models import SessionForms
+from models import FeaturedSpeaker
 from models import FeaturedSpeakerForms
+from models import Speaker
+from models import SpeakerForm
+from models import SpeakerForms
+from models import SpeakerSessionCount
+from models import WishlistEntry
 
 from settings import WEB_CLIENT_ID
 from settings import ANDROID_CLIENT_ID
 from settings import IOS_CLIENT_ID
 from settings import ANDROID_AUDIENCE
 
+from settings import ENTITY_CACHE_TTL
+from settings import QUERY_CACHE_SETTLE_SECONDS
+from settings import QUERY_CACHE_TTL
+
+from cache import INVALIDATION_LOCK_SECONDS
+from cache import entity_cache
+
+from conference_search import getIndex
+from local_index import ATOM_FIELDS
+from local_index import COMPARISONS
+from local_index import FACET_FIELDS
+from local_index import MAX_SEARCH_OFFSET
+from local_index import NUMBER_FIELDS
+from local_index import SearchQuery
+from local_index import conferenceDocument
+
+from metrics import annotate
+from metrics import instrument
+
 from utils import getUserId
+from utils import normalizeSpeaker
+
+from planner import estimateMatches
+
+from schedule import agendaAlternatives
+from schedule import agendaReach
+from schedule import buildSchedule
+from schedule import calendarWeeks
+from schedule import findConflicts
+from schedule import parseDate
+from schedule import parseDuration
+from schedule import parseTime
+from schedule import weekNumber
 
 import logging
 
@@ -52,7 +116,84 @@ MEMCACHE_ANNOUNCEMENTS_KEY = "recent_announcements"
 ANNOUNCEMENT_TPL = ('Last chance to attend! The following conferences '
                     'are nearly sold out: %s')
 MEMCACHE_SPEAKER_KEY = "featured_speaker"
-SPEAKER_TPL = ('The featured speaker is: ')
+MEMCACHE_CONF_SPEAKER_PREFIX = "featured_speaker:"
+FEATURED_SPEAKER_ID = "featured"
+MEMCACHE_DISPLAY_NAME_PREFIX = "display_name:"
+MEMCACHE_QUERY_GENERATION_KEY = "conference_query_generation"
+MEMCACHE_QUERY_SETTLING_KEY = "conference_query_settling"
+MEMCACHE_QUERY_PREFIX = "conference_query_page:"
+MEMCACHE_PLAN_STATS_KEY = "conference_plan_stats"
+MEMCACHE_DATE_QUERY_PREFIX = "conference_date_query:"
+MEMCACHE_SCHEDULE_PREFIX = "schedule:"
+SPEAKER_TPL = ('The featured speaker is: %s. Sessions: %s')
+# seats of a conference are spread over this many SeatShard entities,
+# and shard totals are folded back into Conference.seatsAvailable at
+# most once per SEAT_SYNC_INTERVAL seconds
+SEAT_SHARDS = 10
+SEAT_SYNC_INTERVAL = 10
+# conferences returned per queryConferences page
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+# sessions re-parsed per session time migration task
+SESSION_MIGRATION_BATCH = 200
+# conferences whose speaker counters are re-keyed per migration task
+SPEAKER_COUNT_MIGRATION_BATCH = 50
+# roster entries renamed per attendee rename task
+RENAME_ATTENDEE_BATCH = 200
+# conferences given calendar weeks per backfill task, and the most
+# weeks (one datastore query each) a DATES filter may span
+CALENDAR_MIGRATION_BATCH = 100
+MAX_DATE_WINDOW_WEEKS = 26
+# speakers returned per getSpeakers prefix lookup
+SPEAKER_LOOKUP_LIMIT = 20
+# sessions counted per side when planning a session time query
+SESSION_COUNT_LIMIT = 1000
+# conferences stored in parallel by the conference import, each in its
+# own cross-group transaction with its SEAT_SHARDS root seat shards (one
+# transaction may span at most 25 entity groups); sessions stored per
+# transaction by the session import
+IMPORT_CONFERENCE_BATCH = 20
+IMPORT_SESSION_BATCH = 100
+# conferences re-indexed per search reindex task
+SEARCH_REINDEX_BATCH = 200
+# rollup counter deltas wait in a pull queue, transactionally with the
+# writes they count, and are folded into the StatsRollup once per window
+# of this many seconds, leased in batches; entities read per batch when
+# rebuilding the counters
+STATS_QUEUE = 'stats-deltas'
+STATS_WINDOW = 10
+STATS_BATCH = 500
+STATS_LEASE = 60
+STATS_SCAN_BATCH = 500
+STATS_ROLLUP_ID = 'totals'
+# bump when the counters change meaning; the rollup is then rebuilt
+STATS_VERSION = 2
+# queries with inequalities on several fields read at most this many
+# conferences, in batches of PLAN_BATCH_SIZE, to fill one page; the
+# statistics they are planned with are cached for PLAN_STATS_TTL seconds
+MAX_PLAN_SCAN = 1000
+PLAN_BATCH_SIZE = 100
+PLAN_STATS_TTL = 60
+# confirmation emails wait in a pull queue and are sent once per
+# window of this many seconds, leased in batches
+CONFIRMATION_EMAIL_QUEUE = 'confirmation-emails'
+CONFIRMATION_EMAIL_WINDOW = 60
+CONFIRMATION_EMAIL_BATCH = 100
+CONFIRMATION_EMAIL_LEASE = 60
+# seconds a conference's new sessions are gathered before its featured
+# speaker is recomputed once
+FEATURED_SPEAKER_DELAY = 5
+# seconds a conference schedule stays in memcache, attempts at adding
+# sessions to it, and seconds a failed update blocks stale rebuilds
+SCHEDULE_CACHE_TTL = 24 * 60 * 60
+SCHEDULE_CAS_ATTEMPTS = 3
+SCHEDULE_LOCK_SECONDS = 10
+# alternatives suggested per conflicting session on an agenda
+AGENDA_ALTERNATIVES = 3
+# conferences with at most this many seats left (but some) are in the
+# announcement; attempts at updating the cached announcement
+NEAR_SOLD_OUT_SEATS = 5
+ANNOUNCEMENT_CAS_ATTEMPTS = 3
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 DEFAULTS = {
@@ -76,6 +217,11 @@ OPERATORS = {
             'NE':   '!='
             }
 
+# queryConferences filter on the days a conference runs; its value is
+# a window of dates such as '2016-07-01/2016-07-31'
+DATE_WINDOW_FIELD = 'DATES'
+DATE_WINDOW_OPERATOR = 'OVERLAPS'
+
 FIELDS = {
             'CITY': 'city',
             'TOPIC': 'topics',
@@ -83,6 +229,8 @@ FIELDS = {
             'MAX_ATTENDEES': 'maxAttendees',
             }
 
+SEARCH_FIELDS = dict(FIELDS, SEATS_AVAILABLE='seatsAvailable')
+
 SESSION_FIELDS = {
             'TYPE': 'typeOfSession',
             'START_TIME': 'start_time',
@@ -101,6 +249,12 @@ CONF_POST_REQUEST = endpoints.ResourceContainer(
 SESSION_GET_REQUEST = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeConferenceKey=messages.StringField(1),
+    select=messages.StringField(2, repeated=True),
+)
+
+SELECT_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    select=messages.StringField(1, repeated=True),
 )
 
 SESSION_POST_REQUEST = endpoints.ResourceContainer(
@@ -108,6 +262,132 @@ SESSION_POST_REQUEST = endpoints.ResourceContainer(
     websafeConferenceKey=messages.StringField(1),
 )
 
+SPEAKER_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKey=messages.StringField(1),
+)
+
+SESSION_IMPORT_REQUEST = endpoints.ResourceContainer(
+    SessionForms,
+    websafeConferenceKey=messages.StringField(1),
+    importId=messages.StringField(2),
+)
+
+PAGE_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    pageSize=messages.IntegerField(1),
+    pageToken=messages.StringField(2),
+)
+
+ATTENDEES_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKey=messages.StringField(1),
+    pageSize=messages.IntegerField(2),
+    pageToken=messages.StringField(3),
+)
+
+WISHLIST_POST_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeSessionKeys=messages.StringField(1, repeated=True),
+)
+
+WISHLIST_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKey=messages.StringField(1),
+    select=messages.StringField(2, repeated=True),
+)
+
+SPEAKER_LOOKUP_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    prefix=messages.StringField(1),
+)
+
+SESSION_TIME_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    excludeType=messages.StringField(1),
+    beforeTime=messages.StringField(2),
+    select=messages.StringField(3, repeated=True),
+)
+
+# - - - Entity to form conversion - - - - - - - - - - - - - -
+
+
+def _formFields(form_class, model_class, converters=None):
+    """Return (field name, converter) pairs for the fields of form_class
+    backed by a property of model_class; built once at import time so
+    copying an entity needs no per-field reflection."""
+    converters = converters or {}
+    return tuple(
+        (field.name, converters.get(field.name))
+        for field in sorted(form_class.all_fields(),
+                            key=lambda field: field.number)
+        if field.name in model_class._properties)
+
+
+def _entityToForm(entity, form_class, fields):
+    """Return a new form_class message copying entity's fields."""
+    form = form_class()
+    for name, convert in fields:
+        value = getattr(entity, name)
+        if convert and value is not None:
+            value = convert(value)
+        setattr(form, name, value)
+    return form
+
+
+def _selectFields(form_class, form_fields, names):
+    """Return the subset of form_fields, and the set of form_class field
+    names, that a request's 'select' parameter asks for: every field if
+    it names none."""
+    all_names = set(field.name for field in form_class.all_fields())
+    if not names:
+        return form_fields, all_names
+    unknown = set(names) - all_names
+    if unknown:
+        raise endpoints.BadRequestException(
+            "Unknown field(s): %s." % ', '.join(sorted(unknown)))
+    names = set(names)
+    return tuple((name, convert) for name, convert in form_fields
+                 if name in names), names
+
+
+def _projection(model_class, fields, exclude=()):
+    """Return the property names of fields if a projection query can
+    return them all, else None. Only indexed, single-valued properties
+    not constrained by an equality filter (those in exclude) can be
+    projected; repeated ones would return a row per value."""
+    projection = []
+    for name, convert in fields:
+        prop = model_class._properties[name]
+        if not prop._indexed or prop._repeated or name in exclude:
+            return None
+        projection.append(name)
+    return tuple(projection) or None
+
+
+# query shapes (whether there is an ancestor, but not which one, the
+# filters, sort orders and projection) the datastore had no index for;
+# these fall back to keys-only queries for the life of the instance
+_unindexed_projections = set()
+
+TEE_SHIRT_SIZES = dict(
+    (name, TeeShirtSize(name)) for name in TeeShirtSize.names())
+
+CONFERENCE_FORM_FIELDS = _formFields(ConferenceForm, Conference, {
+    'startDate': str,
+    'endDate': str,
+})
+PROFILE_FORM_FIELDS = _formFields(ProfileForm, Profile, {
+    'teeShirtSize': TEE_SHIRT_SIZES.get,
+})
+SESSION_FORM_FIELDS = _formFields(SessionForm, Session)
+
+
+class ServiceUnavailableException(endpoints.ServiceException):
+    """ServiceUnavailableException -- a backing service failed; the
+    request may be retried"""
+    http_status = httplib.SERVICE_UNAVAILABLE
+
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 
@@ -120,34 +400,80 @@ SESSION_POST_REQUEST = endpoints.ResourceContainer(
 class ConferenceApi(remote.Service):
     """Conference API v0.1"""
 
+    def __init__(self):
+        super(ConferenceApi, self).__init__()
+        # organizer displayNames resolved during this request
+        self._organizerNames = {}
+
 # - - - Conference objects - - - - - - - - - - - - - - - - -
 
-    def _copyConferenceToForm(self, conf, displayName):
+    def _copyConferenceToForm(self, conf, displayName,
+                              fields=CONFERENCE_FORM_FIELDS):
         """Copy relevant fields from Conference to ConferenceForm."""
-        cf = ConferenceForm()
-        print "cf= ", cf
-        for field in cf.all_fields():
-            if hasattr(conf, field.name):
-                # convert Date to date string; just copy others
-                if field.name.endswith('Date'):
-                    setattr(cf, field.name, str(getattr(conf, field.name)))
-                else:
-                    setattr(cf, field.name, getattr(conf, field.name))
-            elif field.name == "websafeKey":
-                setattr(cf, field.name, conf.key.urlsafe())
+        # dates become date strings; the form has no required fields,
+        # so there is nothing to check_initialized()
+        cf = _entityToForm(conf, ConferenceForm, fields)
+        cf.websafeKey = conf.key.urlsafe()
         if displayName:
-            setattr(cf, 'organizerDisplayName', displayName)
-        cf.check_initialized()
+            cf.organizerDisplayName = displayName
         return cf
 
+    def _copyConferencesToForms(self, confs, names=None,
+                                fields=CONFERENCE_FORM_FIELDS):
+        """Copy fields of Conferences to ConferenceForms, taking
+        organizer displayNames by user ID from names."""
+        # projected conferences have no organizerUserId to look up
+        return ConferenceForms(items=[
+            self._copyConferenceToForm(
+                conf, names and names.get(conf.organizerUserId), fields)
+            for conf in confs])
+
+    @staticmethod
+    def _fetchConferences(q, fields, exclude=()):
+        """Return the conferences of query q with at least fields filled
+        in: from a projection query where an index allows one, else from
+        a keys-only query and the entity cache."""
+        projection = _projection(Conference, fields, exclude)
+        signature = (q.ancestor is not None, repr(q.filters),
+                     repr(q.orders), projection)
+        if projection and signature not in _unindexed_projections:
+            try:
+                return q.fetch(projection=projection)
+            except datastore_errors.NeedIndexError:
+                _unindexed_projections.add(signature)
+        keys = q.fetch(keys_only=True)
+        return [conf for conf in entity_cache.get_multi(keys) if conf]
+
     def _createConferenceObject(self, request):
-        """Create or update Conference object, returning
-        ConferenceForm/request."""
+        """Create Conference object, returning ConferenceForm/request."""
         # preload necessary data items
         user = endpoints.get_current_user()
         if not user:
             raise endpoints.UnauthorizedException('Authorization required')
         user_id = getUserId(user)
+
+        # generate Profile Key based on user ID and Conference
+        # ID based on Profile key get Conference key from ID
+        p_key = ndb.Key(Profile, user_id)
+        c_id = Conference.allocate_ids(size=1, parent=p_key)[0]
+        conf = self._conferenceFromForm(
+            request, user, ndb.Key(Conference, c_id, parent=p_key))
+
+        # create Conference and its seat shards, send email to organizer
+        # confirming creation of Conference & return (modified)
+        # ConferenceForm
+        self._putConferenceAsync(conf).get_result()
+        self._invalidateQueryCache()
+        self._indexConferences([conf])
+
+        self._queueConfirmationEmails([
+            self._confirmationEmailTask(user, request)])
+        return request
+
+    def _conferenceFromForm(self, request, user, c_key):
+        """Return a new Conference with key c_key built from a
+        ConferenceForm, filling in defaults on the form as well."""
+        user_id = c_key.parent().id()
         if not request.name:
             raise endpoints.BadRequestException(
                 "Conference 'name' field required")
@@ -157,7 +483,6 @@ class ConferenceApi(remote.Service):
             field.name: getattr(
                 request, field.name) for field in request.all_fields()}
         del data['websafeKey']
-        del data['organizerDisplayName']
 
         # add default values for those missing
         # (both data model & outbound Message)
@@ -168,42 +493,265 @@ class ConferenceApi(remote.Service):
 
         # convert dates from strings to Date objects;
         # set month based on start_date
-        if data['startDate']:
-            data['startDate'] = datetime.strptime(
-                        data['startDate'][:10],
-                        "%Y-%m-%d").date()
-            data['month'] = data['startDate'].month
-        else:
-            data['month'] = 0
-        if data['endDate']:
-            data['endDate'] = datetime.strptime(
-                        data['endDate'][:10],
-                        "%Y-%m-%d").date()
+        try:
+            if data['startDate']:
+                data['startDate'] = datetime.strptime(
+                            data['startDate'][:10],
+                            "%Y-%m-%d").date()
+                data['month'] = data['startDate'].month
+            else:
+                data['month'] = 0
+            if data['endDate']:
+                data['endDate'] = datetime.strptime(
+                            data['endDate'][:10],
+                            "%Y-%m-%d").date()
+        except ValueError:
+            raise endpoints.BadRequestException(
+                "Conference dates must be given as YYYY-MM-DD.")
+        data['calendarWeeks'] = calendarWeeks(
+            data['startDate'], data['endDate'])
 
         # set seatsAvailable to be same as maxAttendees on creation
         if data["maxAttendees"] > 0:
             data["seatsAvailable"] = data["maxAttendees"]
-        # generate Profile Key based on user ID and Conference
-        # ID based on Profile key get Conference key from ID
-        p_key = ndb.Key(Profile, user_id)
-        c_id = Conference.allocate_ids(size=1, parent=p_key)[0]
-        c_key = ndb.Key(Conference, c_id, parent=p_key)
         data['key'] = c_key
         data['organizerUserId'] = request.organizerUserId = user_id
+        data['organizerDisplayName'] = request.organizerDisplayName = (
+            self._getOrganizerNames([user_id]).get(user_id) or
+            user.nickname())
+        data['seatShards'] = SEAT_SHARDS
+        return Conference(**data)
 
-        # create Conference, send email to organizer confirming
-        # creation of Conference & return (modified) ConferenceForm
-
-        Conference(**data).put()
+    @staticmethod
+    @ndb.transactional_async(xg=True)
+    def _putConferenceAsync(conf):
+        """Store a new conference and its seat shards, queueing its
+        rollup deltas in the same transaction; return a future."""
+        ndb.put_multi([conf] + ConferenceApi._newSeatShards(
+            conf.key, conf.seatsAvailable))
+        ConferenceApi._addStats(ConferenceApi._conferenceStats(conf, 1))
 
-        taskqueue.add(params={
+    @staticmethod
+    def _confirmationEmailTask(user, request):
+        """Return the pull task emailing user about a created conference."""
+        return taskqueue.Task(method='PULL', payload=json.dumps({
                         'email': user.email(),
                         'conferenceInfo': repr(request)
-                            },
-                        url='/tasks/send_confirmation_email')
-        return request
+                            }))
+
+    @staticmethod
+    def _queueConfirmationEmails(tasks):
+        """Queue confirmation email pull tasks and make sure one task
+        sends them at the end of the current window."""
+        ConferenceApi._addTasks(tasks, CONFIRMATION_EMAIL_QUEUE)
+        window = int(time.time()) // CONFIRMATION_EMAIL_WINDOW
+        try:
+            taskqueue.add(
+                name='send-confirmation-emails-%d' % window,
+                url='/tasks/send_confirmation_email',
+                countdown=CONFIRMATION_EMAIL_WINDOW)
+        except (taskqueue.TaskAlreadyExistsError,
+                taskqueue.TombstonedTaskError):
+            # this window's emails will be sent by the pending task
+            pass
+
+    @staticmethod
+    def _leaseConfirmationEmails():
+        """Lease a batch of queued confirmation emails; return the
+        leased tasks and the conferenceInfos of each email address."""
+        queue = taskqueue.Queue(CONFIRMATION_EMAIL_QUEUE)
+        tasks = queue.lease_tasks(
+            CONFIRMATION_EMAIL_LEASE, CONFIRMATION_EMAIL_BATCH)
+        emails = collections.OrderedDict()
+        for task in tasks:
+            data = json.loads(task.payload)
+            emails.setdefault(data['email'], []).append(
+                data['conferenceInfo'])
+        return tasks, emails
+
+    @staticmethod
+    def _deleteConfirmationEmails(tasks):
+        """Drop confirmation email tasks once their emails were sent."""
+        taskqueue.Queue(CONFIRMATION_EMAIL_QUEUE).delete_tasks(tasks)
+
+    @staticmethod
+    def _indexConferences(confs):
+        """Add or replace the search documents of conferences; failures
+        are left to the reindex task."""
+        try:
+            getIndex().put([conferenceDocument(conf) for conf in confs])
+        except search.Error:
+            logging.exception('Could not index %d conferences', len(confs))
+
+    @staticmethod
+    def _reindexConferences(websafe_cursor=None):
+        """Re-index one batch of conferences and enqueue the next batch;
+        used by the search reindex task."""
+        cursor = Cursor(urlsafe=websafe_cursor) if websafe_cursor else None
+        confs, next_cursor, more = Conference.query().fetch_page(
+            SEARCH_REINDEX_BATCH, start_cursor=cursor)
+        ConferenceApi._indexConferences(confs)
+
+        if more and next_cursor:
+            taskqueue.add(params={'cursor': next_cursor.urlsafe()},
+                          url='/tasks/reindex_conferences')
+        return len(confs)
+
+    @staticmethod
+    def _conferenceStats(conf, sign, stats=None):
+        """Add sign times a conference's rollup counters to stats."""
+        stats = {} if stats is None else stats
+        # maxAttendees are counted in power of two buckets; conferences
+        # without a month or maxAttendees are in no bucket of it, as no
+        # datastore filter on it matches them
+        names = ['conferences', 'city:%s' % conf.city]
+        if conf.month is not None:
+            names.append('month:%d' % conf.month)
+        if conf.maxAttendees is not None:
+            names.append('maxAttendees:%d' % conf.maxAttendees.bit_length())
+        names.extend('topic:%s' % topic for topic in set(conf.topics))
+        for name in names:
+            stats[name] = stats.get(name, 0) + sign
+        stats['seats'] = stats.get('seats', 0) + sign * (
+            conf.maxAttendees or 0)
+        return stats
+
+    @staticmethod
+    def _sessionStats(session, sign, stats=None):
+        """Add sign times a session's rollup counters to stats."""
+        stats = {} if stats is None else stats
+        for name in ('sessions', 'sessionType:%s' % session.typeOfSession):
+            stats[name] = stats.get(name, 0) + sign
+        return stats
+
+    @staticmethod
+    def _readStats():
+        """Return the rollup counters."""
+        rollup = ndb.Key(StatsRollup, STATS_ROLLUP_ID).get()
+        return collections.Counter(rollup.counts if rollup else {})
+
+    @staticmethod
+    def _plannerStats():
+        """Return the rollup counters, cached briefly for query planning;
+        empty while there is no rollup of the current STATS_VERSION, as
+        the histograms of an older one may be missing buckets."""
+        stats = memcache.get(MEMCACHE_PLAN_STATS_KEY)
+        if stats is None:
+            rollup = ndb.Key(StatsRollup, STATS_ROLLUP_ID).get()
+            stats = collections.Counter(
+                rollup.counts
+                if rollup and rollup.version == STATS_VERSION else {})
+            memcache.set(MEMCACHE_PLAN_STATS_KEY, stats, time=PLAN_STATS_TTL)
+        return stats
+
+    @staticmethod
+    def _addStats(stats):
+        """Queue deltas of the rollup counters, transactionally if in a
+        transaction, and make sure a task folds them in at the end of
+        the current window. Writes never touch the StatsRollup itself,
+        so they do not contend on it."""
+        stats = dict((name, delta) for name, delta in stats.items() if delta)
+        if not stats:
+            return
+        taskqueue.Queue(STATS_QUEUE).add(
+            taskqueue.Task(method='PULL', payload=json.dumps({
+                'at': time.time(), 'stats': stats})),
+            transactional=ndb.in_transaction())
+        # named tasks cannot be transactional
+        if ndb.in_transaction():
+            ndb.get_context().call_on_commit(ConferenceApi._scheduleStatsFold)
+        else:
+            ConferenceApi._scheduleStatsFold()
+
+    @staticmethod
+    def _scheduleStatsFold():
+        window = int(time.time()) // STATS_WINDOW
+        try:
+            taskqueue.add(name='fold-stats-%d' % window,
+                          url='/tasks/fold_stats', countdown=STATS_WINDOW)
+        except (taskqueue.TaskAlreadyExistsError,
+                taskqueue.TombstonedTaskError):
+            # this window's deltas will be folded by the pending task
+            pass
+
+    @staticmethod
+    def _foldStats():
+        """Fold queued rollup deltas into the StatsRollup, a batch per
+        transaction, until the queue is empty; used by the stats folding
+        task. A batch whose lease ran out before it was deleted is folded
+        again, an error left to the rebuild to correct."""
+        queue = taskqueue.Queue(STATS_QUEUE)
+        rollup = None
+        while True:
+            tasks = queue.lease_tasks(STATS_LEASE, STATS_BATCH)
+            if not tasks:
+                break
+            rollup = ConferenceApi._applyStats(
+                [json.loads(task.payload) for task in tasks])
+            queue.delete_tasks(tasks)
+
+        rollup = rollup or ndb.Key(StatsRollup, STATS_ROLLUP_ID).get()
+        if not rollup or rollup.version != STATS_VERSION:
+            # first counters, or their meaning changed: rebuild once
+            try:
+                taskqueue.add(name='rebuild-stats-%d' % STATS_VERSION,
+                              url='/crons/reconcile_stats')
+            except (taskqueue.TaskAlreadyExistsError,
+                    taskqueue.TombstonedTaskError):
+                pass
 
+    @staticmethod
     @ndb.transactional()
+    def _applyStats(deltas):
+        """Add queued deltas to the StatsRollup, skipping those the last
+        rebuild already counted; return the rollup."""
+        key = ndb.Key(StatsRollup, STATS_ROLLUP_ID)
+        rollup = key.get() or StatsRollup(key=key, counts={})
+        for delta in deltas:
+            if delta['at'] < rollup.rebuiltAt:
+                continue
+            for name, value in delta['stats'].items():
+                rollup.counts[name] = rollup.counts.get(name, 0) + value
+                if not rollup.counts[name]:
+                    del rollup.counts[name]
+        rollup.put()
+        return rollup
+
+    @staticmethod
+    def _reconcileStats():
+        """Rebuild the rollup counters from a scan of all conferences
+        and sessions; used by the stats reconciliation cron job. Deltas
+        queued from the start of the scan on are still folded in after
+        it, so none are lost; a write the scan also saw while it ran is
+        counted twice until the next rebuild."""
+        started = time.time()
+        stats = {}
+        for conf in Conference.query().iter(batch_size=STATS_SCAN_BATCH):
+            ConferenceApi._conferenceStats(conf, 1, stats)
+            # taken seats, as synced from the seat shards
+            stats['seatsSold'] = stats.get('seatsSold', 0) + (
+                (conf.maxAttendees or 0) - (conf.seatsAvailable or 0))
+        stats['sessions'] = Session.query().count()
+        for session in Session.query().iter(
+                batch_size=STATS_SCAN_BATCH,
+                projection=[Session.typeOfSession]):
+            name = 'sessionType:%s' % session.typeOfSession
+            stats[name] = stats.get(name, 0) + 1
+        StatsRollup(
+            key=ndb.Key(StatsRollup, STATS_ROLLUP_ID),
+            counts=dict((name, count) for name, count in stats.items()
+                        if count),
+            rebuiltAt=started, version=STATS_VERSION).put()
+        return stats
+
+    @staticmethod
+    def _addTasks(tasks, queue_name='default'):
+        """Enqueue tasks in as few taskqueue calls as allowed."""
+        queue = taskqueue.Queue(queue_name)
+        for i in range(0, len(tasks), taskqueue.MAX_TASKS_PER_ADD):
+            queue.add(tasks[i:i + taskqueue.MAX_TASKS_PER_ADD])
+
+    @ndb.transactional(xg=True)
     def _updateConferenceObject(self, request):
         user = endpoints.get_current_user()
         if not user:
@@ -230,8 +778,13 @@ class ConferenceApi(remote.Service):
 
         # Not getting all the fields, so don't create a new object; just
         # copy relevant fields from ConferenceForm to Conference object
+        old_max = conf.maxAttendees or 0
+        stats = self._conferenceStats(conf, -1)
         for field in request.all_fields():
             data = getattr(request, field.name)
+            # seat shards own the seat count once they exist
+            if field.name == 'seatsAvailable' and conf.seatShards:
+                continue
             # only copy fields where we get data
             if data not in (None, []):
                 # special handling for dates (convert string to Date)
@@ -241,69 +794,199 @@ class ConferenceApi(remote.Service):
                         conf.month = data.month
                 # write to Conference object
                 setattr(conf, field.name, data)
+        conf.calendarWeeks = calendarWeeks(conf.startDate, conf.endDate)
+
+        # spread added or removed seats over the shards
+        seat_delta = (conf.maxAttendees or 0) - old_max
+        if conf.seatShards and seat_delta:
+            shards = ndb.get_multi(
+                self._seatShardKeys(conf.key, conf.seatShards))
+            ndb.put_multi(self._resizeSeatShards(shards, seat_delta))
+            conf.seatsAvailable = (conf.seatsAvailable or 0) + seat_delta
         conf.put()
-        prof = ndb.Key(Profile, user_id).get()
-        return self._copyConferenceToForm(conf, getattr(prof, 'displayName'))
+        self._addStats(self._conferenceStats(conf, 1, stats))
+        ndb.get_context().call_on_commit(
+            lambda: self._indexConferences([conf]))
+        # seats or the name may have changed the announcement; a sharded
+        # conference's seat total is left to the seat sync
+        if conf.seatShards:
+            ndb.get_context().call_on_commit(
+                lambda: self._scheduleSeatSync(conf.key))
+        else:
+            ndb.get_context().call_on_commit(
+                lambda: self._updateNearSoldOut(
+                    conf, conf.seatsAvailable or 0))
+        names = self._getOrganizerNames([conf])
+        return self._copyConferenceToForm(conf, names.get(user_id))
 
 # createConference
     @endpoints.method(
         ConferenceForm, ConferenceForm, path='conference',
         http_method='POST', name='createConference')
+    @instrument
     def createConference(self, request):
         """Create new conference."""
         return self._createConferenceObject(request)
 
+# importConferences
+    @endpoints.method(
+        ConferenceForms, ImportResultForms, path='conferences/import',
+        http_method='POST', name='importConferences')
+    @instrument
+    def importConferences(self, request):
+        """Create many conferences in one call, reporting each outcome."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        user_id = getUserId(user)
+        results = [ImportResultForm(index=i)
+                   for i in range(len(request.items))]
+        if not request.items:
+            return ImportResultForms()
+
+        # one id range for the whole batch
+        p_key = ndb.Key(Profile, user_id)
+        first_id, _ = Conference.allocate_ids(
+            size=len(request.items), parent=p_key)
+        confs = []
+        for i, form in enumerate(request.items):
+            try:
+                confs.append((i, self._conferenceFromForm(
+                    form, user,
+                    ndb.Key(Conference, first_id + i, parent=p_key))))
+            except endpoints.BadRequestException, e:
+                results[i].error = str(e)
+
+        tasks = []
+        stored = []
+        for start in range(0, len(confs), IMPORT_CONFERENCE_BATCH):
+            batch = confs[start:start + IMPORT_CONFERENCE_BATCH]
+            futures = [self._putConferenceAsync(conf) for i, conf in batch]
+            for (i, conf), future in zip(batch, futures):
+                try:
+                    future.get_result()
+                except datastore_errors.Error, e:
+                    results[i].error = 'Conference not stored: %s' % e
+                    continue
+                results[i].websafeKey = conf.key.urlsafe()
+                stored.append(conf)
+                tasks.append(self._confirmationEmailTask(
+                    user, request.items[i]))
+
+        if tasks:
+            self._invalidateQueryCache()
+            self._indexConferences(stored)
+            self._queueConfirmationEmails(tasks)
+        return ImportResultForms(items=results)
+
 # updateConference
     @endpoints.method(
         CONF_POST_REQUEST, ConferenceForm,
         path='conference/{websafeConferenceKey}',
         http_method='PUT', name='updateConference')
+    @instrument
     def updateConference(self, request):
         """Update conference w/provided fields & return w/updated info."""
-        return self._updateConferenceObject(request)
+        conf_form = self._updateConferenceObject(request)
+        entity_cache.invalidate(ndb.Key(urlsafe=request.websafeConferenceKey))
+        self._invalidateQueryCache()
+        return conf_form
 
 # getConference
     @endpoints.method(
         CONF_GET_REQUEST, ConferenceForm,
         path='conference/{websafeConferenceKey}',
         http_method='GET', name='getConference')
+    @instrument
+    @ndb.synctasklet
     def getConference(self, request):
         """Return requested conference (by websafeConferenceKey)."""
-        # get Conference object from request; bail if not found
-        conf = ndb.Key(urlsafe=request.websafeConferenceKey).get()
+        # get Conference object from request, and its organizer's name
+        # from the parent key at the same time; bail if not found
+        c_key = ndb.Key(urlsafe=request.websafeConferenceKey)
+        conf, names = yield (entity_cache.get_async(c_key),
+                             self._getOrganizerNamesAsync(
+                                 [c_key.parent().id()]))
         if not conf:
             raise endpoints.NotFoundException(
                 'No conference found with key: %s'
                 % request.websafeConferenceKey)
-        prof = conf.key.parent().get()
         # return ConferenceForm
-        return self._copyConferenceToForm(conf, getattr(prof, 'displayName'))
+        raise ndb.Return(self._copyConferenceToForm(
+            conf, conf.organizerDisplayName or
+            names.get(conf.organizerUserId)))
 
 # getConferencesCreated
     @endpoints.method(
-        message_types.VoidMessage, ConferenceForms,
+        SELECT_GET_REQUEST, ConferenceForms,
         path='getConferencesCreated',
         http_method='POST', name='getConferencesCreated')
+    @instrument
     def getConferencesCreated(self, request):
-        """Return conferences created by user."""
+        """Return conferences created by user, with the requested
+        fields."""
         # make sure user is authed
         user = endpoints.get_current_user()
         if not user:
             raise endpoints.UnauthorizedException('Authorization required')
         user_id = getUserId(user)
+        fields, wanted = _selectFields(
+            ConferenceForm, CONFERENCE_FORM_FIELDS, request.select)
 
         # create ancestor query for all key matches for this user
-        confs = Conference.query(ancestor=ndb.Key(Profile, user_id))
-        prof = ndb.Key(Profile, user_id).get()
+        confs = self._fetchConferences(
+            Conference.query(ancestor=ndb.Key(Profile, user_id)), fields)
+        names = None
+        if 'organizerDisplayName' in wanted:
+            names = self._getOrganizerNames(confs)
         # return set of ConferenceForm objects per Conference
-        return ConferenceForms(
-            items=[self._copyConferenceToForm(
-                conf, getattr(prof, 'displayName')) for conf in confs])
-
-    def _getQuery(self, request):
-        """Return formatted query from the submitted filters."""
+        return self._copyConferencesToForms(confs, names, fields)
+
+    def _getOrganizerNames(self, confs):
+        """Return organizer displayNames by user ID for conferences (or
+        organizer user IDs), resolving each organizer once per request."""
+        return self._getOrganizerNamesAsync(confs).get_result()
+
+    @ndb.tasklet
+    def _getOrganizerNamesAsync(self, confs):
+        """Return a future for the result of _getOrganizerNames."""
+        names = self._organizerNames
+        user_ids = set()
+        for conf in confs:
+            if isinstance(conf, basestring):
+                user_ids.add(conf)
+                continue
+            user_ids.add(conf.organizerUserId)
+            # prefer the name copied onto the conference
+            if conf.organizerDisplayName:
+                names.setdefault(
+                    conf.organizerUserId, conf.organizerDisplayName)
+
+        # then the name-only memcache entries, then the profiles
+        missing = [user_id for user_id in user_ids
+                   if user_id and user_id not in names]
+        if missing:
+            cached = yield memcache.Client().get_multi_async(
+                missing, key_prefix=MEMCACHE_DISPLAY_NAME_PREFIX)
+            names.update(cached)
+            missing = [user_id for user_id in missing if user_id not in names]
+        if missing:
+            profiles = yield entity_cache.get_multi_async(
+                [ndb.Key(Profile, user_id) for user_id in missing])
+            fetched = dict((prof.key.id(), prof.displayName)
+                           for prof in profiles if prof)
+            # add() fails while a rename holds its delete lock, so a name
+            # read before the rename is not cached again
+            yield memcache.Client().add_multi_async(
+                fetched, key_prefix=MEMCACHE_DISPLAY_NAME_PREFIX,
+                time=ENTITY_CACHE_TTL)
+            names.update(fetched)
+        raise ndb.Return(names)
+
+    def _getQuery(self, inequality_filter, filters):
+        """Return the datastore query of formatted filters, which may have
+        inequalities on inequality_filter only."""
         q = Conference.query()
-        inequality_filter, filters = self._formatFilters(request.filters)
 
         # If exists, sort on inequality filter first
         if not inequality_filter:
@@ -311,19 +994,21 @@ class ConferenceApi(remote.Service):
         else:
             q = q.order(ndb.GenericProperty(inequality_filter))
             q = q.order(Conference.name)
+        # an NE filter makes this a multi-query, which only produces
+        # cursors when the key is the last sort order
+        q = q.order(Conference.key)
 
         for filtr in filters:
-            if filtr["field"] in ["month", "maxAttendees"]:
-                filtr["value"] = int(filtr["value"])
             formatted_query = ndb.query.FilterNode(
                 filtr["field"], filtr["operator"], filtr["value"])
             q = q.filter(formatted_query)
         return q
 
     def _formatFilters(self, filters):
-        """Parse, check validity and format user supplied filters."""
+        """Parse, check validity and format user supplied filters;
+        return the fields with inequalities, in order, and the filters."""
         formatted_filters = []
-        inequality_field = None
+        inequality_fields = []
 
         for f in filters:
             filtr = {
@@ -335,67 +1020,538 @@ class ConferenceApi(remote.Service):
             except KeyError:
                 raise endpoints.BadRequestException(
                     "Filter contains invalid field or operator.")
-
-            # Every operation except "=" is an inequality
-            if filtr["operator"] != "=":
-                # Check if inequality operation has been
-                # used in previous filters
-
-                # Disallow the filter if inequality was
-                # performed on a different field before
-
-                # Track the field on which the inequality
-                # operation is performed
-                if inequality_field and inequality_field != filtr["field"]:
+            if filtr["field"] in ["month", "maxAttendees"]:
+                try:
+                    filtr["value"] = int(filtr["value"])
+                except (TypeError, ValueError):
                     raise endpoints.BadRequestException(
-                        "Inequality filter is allowed on only one field.")
-                else:
-                    inequality_field = filtr["field"]
+                        "Filter on %s needs an integer value."
+                        % filtr["field"])
+
+            # Every operation except "=" is an inequality; the datastore
+            # allows them on one field per query, so _planQuery picks it
+            if (filtr["operator"] != "=" and
+                    filtr["field"] not in inequality_fields):
+                inequality_fields.append(filtr["field"])
 
             formatted_filters.append(filtr)
-        return (inequality_field, formatted_filters)
+        return (inequality_fields, formatted_filters)
 
     @endpoints.method(
         ConferenceQueryForms, ConferenceForms,
         path='queryConferences', http_method='POST',
         name='queryConferences')
+    @instrument
+    @ndb.synctasklet
     def queryConferences(self, request):
-        """Query for conferences."""
-        conferences = self._getQuery(request)
+        """Query for conferences, one page at a time, with the
+        requested fields."""
+        fields, wanted = _selectFields(
+            ConferenceForm, CONFERENCE_FORM_FIELDS, request.select)
+        window, filters = self._dateWindow(request.filters)
+        if window:
+            keys, next_page_token, plan, conferences = (
+                self._getDateWindowPage(request, window, filters))
+        else:
+            keys, next_page_token, plan, conferences = (
+                self._getQueryPage(request))
+
+        # fetch the page, unless filtering it in memory already read it,
+        # and, if wanted, its organiser displayNames (organizers are the
+        # key parents) at the same time, batched across the page; the
+        # cached key page and entity cache beat a projection query, so
+        # the selector only trims the forms
+        names_future = None
+        if 'organizerDisplayName' in wanted:
+            names_future = self._getOrganizerNamesAsync(
+                [key.parent().id() for key in keys])
+        if conferences is None:
+            conferences = yield entity_cache.get_multi_async(keys)
+        names = (yield names_future) if names_future else None
+        conferences = [conf for conf in conferences if conf]
+
+        # return individual ConferenceForm object per Conference
+        conf_forms = self._copyConferencesToForms(conferences, names, fields)
+        conf_forms.nextPageToken = next_page_token
+        conf_forms.queryPlan = plan
+        raise ndb.Return(conf_forms)
 
-        # need to fetch organiser displayName from profiles
-        # get all keys and use get_multi for speed
-        organisers = [(ndb.Key(
-            Profile, conf.organizerUserId)) for conf in conferences]
-        profiles = ndb.get_multi(organisers)
+    @staticmethod
+    def _pageSize(request):
+        """Return the page size of a paged request."""
+        page_size = min(request.pageSize or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        if page_size < 1:
+            raise endpoints.BadRequestException(
+                "'pageSize' must be positive.")
+        return page_size
 
-        # put display names in a dict for easier fetching
-        names = {}
-        for profile in profiles:
-            names[profile.key.id()] = profile.displayName
+    @staticmethod
+    def _pageArgs(request):
+        """Return the page size and start cursor of a paged request."""
+        page_size = ConferenceApi._pageSize(request)
+        try:
+            cursor = (Cursor(urlsafe=request.pageToken)
+                      if request.pageToken else None)
+        except datastore_errors.BadValueError:
+            raise endpoints.BadRequestException("Invalid 'pageToken'.")
+        return page_size, cursor
+
+    def _getQueryPage(self, request):
+        """Return (keys, nextPageToken, query plan, conferences) for one
+        page of a query, caching all but the conferences under the
+        canonical filter signature; conferences is None unless the page
+        was just read to filter it in memory."""
+        page_size = self._pageSize(request)
+        inequality_fields, filters = self._formatFilters(request.filters)
+        annotate(filters=self._describeFilters(filters))
+        # filters are ANDed, so their order does not matter
+        signature = repr((
+            sorted(set((filtr["field"], filtr["operator"], filtr["value"])
+                       for filtr in filters)),
+            page_size, request.pageToken))
+        generation = self._queryGeneration()
+        cache_key = '%s%s:%s' % (MEMCACHE_QUERY_PREFIX, generation,
+                                 hashlib.sha1(signature).hexdigest())
+
+        page = memcache.get(cache_key)
+        conferences = None
+        if page is None:
+            # a planned query keeps its plan across pages: the chosen
+            # field leads its page tokens, as cursors only fit the query
+            # they came from
+            token = request.pageToken or ''
+            field = None
+            if len(inequality_fields) > 1 and token:
+                field, _, token = token.partition(':')
+                if field not in inequality_fields:
+                    raise endpoints.BadRequestException(
+                        "Invalid 'pageToken'.")
+            try:
+                cursor = Cursor(urlsafe=token) if token else None
+            except datastore_errors.BadValueError:
+                raise endpoints.BadRequestException("Invalid 'pageToken'.")
+
+            field, memory_filters, plan = self._planQuery(
+                inequality_fields, filters, field)
+            q = self._getQuery(field, [
+                filtr for filtr in filters if filtr not in memory_filters])
+            if memory_filters:
+                conferences, next_cursor = self._scanPage(
+                    q, memory_filters, page_size, cursor)
+                keys = [conf.key for conf in conferences]
+                next_page_token = next_cursor and '%s:%s' % (
+                    field, next_cursor.urlsafe())
+            else:
+                # run the query once, fetching only the requested page
+                keys, next_cursor, more = q.fetch_page(
+                    page_size, start_cursor=cursor, keys_only=True)
+                next_page_token = (next_cursor.urlsafe()
+                                   if more and next_cursor else None)
+            page = (keys, next_page_token, plan)
+            if not self._queryCacheSettling():
+                memcache.set(cache_key, page, time=QUERY_CACHE_TTL)
+
+        annotate(plan=page[2])
+        return page + (conferences,)
 
-        # return individual ConferenceForm object per Conference
-        return ConferenceForms(
-                items=[self._copyConferenceToForm(
-                    conf, names[conf.organizerUserId]) for
-                    conf in conferences])
+    @staticmethod
+    def _describeFilters(filters):
+        """Return formatted filters as one readable condition."""
+        return ' AND '.join(
+            '%s %s %r' % (filtr["field"], filtr["operator"], filtr["value"])
+            for filtr in filters)
+
+    def _planQuery(self, inequality_fields, filters, field=None):
+        """Return the field the datastore query has inequalities on, the
+        filters left to apply in memory and a description of the plan.
+        With inequalities on several fields the datastore takes the one
+        the rollup statistics expect the fewest conferences to pass,
+        unless field, the choice made for earlier pages, is given."""
+        if len(inequality_fields) < 2:
+            field = inequality_fields[0] if inequality_fields else None
+            return field, [], 'datastore: %s' % (
+                self._describeFilters(filters) or 'all conferences')
+
+        stats = self._plannerStats()
+        if not stats:
+            # no statistics to plan with (yet): take the first field
+            field = field or inequality_fields[0]
+        estimates = dict(
+            (name, estimateMatches(stats, name, [
+                filtr for filtr in filters if filtr["field"] == name]))
+            for name in inequality_fields)
+        if field is None:
+            # min() keeps the first of equally selective fields
+            field = min(inequality_fields, key=estimates.get)
+        memory_filters = [
+            filtr for filtr in filters
+            if filtr["operator"] != "=" and filtr["field"] != field]
+        datastore_filters = [
+            filtr for filtr in filters if filtr not in memory_filters]
+        plan = 'datastore: %s; in memory: %s; estimates of %d: %s' % (
+            self._describeFilters(datastore_filters),
+            self._describeFilters(memory_filters),
+            stats['conferences'],
+            ', '.join('%s %d' % (name, estimates[name])
+                      for name in inequality_fields)
+            if stats else 'none, statistics are being rebuilt')
+        return field, memory_filters, plan
+
+    def _scanPage(self, q, memory_filters, page_size, cursor):
+        """Return the next page_size conferences of query q, from cursor
+        on, that pass memory_filters, and the cursor after the last
+        conference read if there may be more. Conferences are read in
+        batches and filtered as they stream in; after MAX_PLAN_SCAN
+        reads the page is returned short."""
+        it = q.iter(start_cursor=cursor, produce_cursors=True,
+                    batch_size=PLAN_BATCH_SIZE)
+        confs = []
+        scanned = 0
+        for conf in it:
+            scanned += 1
+            if self._matchesFilters(conf, memory_filters):
+                confs.append(conf)
+                if len(confs) == page_size:
+                    break
+            if scanned >= MAX_PLAN_SCAN:
+                break
+        else:
+            return confs, None
+        return confs, it.cursor_after() if it.probably_has_next() else None
+
+    @staticmethod
+    def _dateWindow(filters):
+        """Split the DATES filter, if any, off query filters: return the
+        (first day, last day) window it asks for, or None, and the other
+        filters."""
+        window, others = None, []
+        for filtr in filters:
+            if filtr.field != DATE_WINDOW_FIELD:
+                others.append(filtr)
+                continue
+            if window:
+                raise endpoints.BadRequestException(
+                    "Only one %s filter is allowed." % DATE_WINDOW_FIELD)
+            if filtr.operator != DATE_WINDOW_OPERATOR:
+                raise endpoints.BadRequestException(
+                    "%s filters take the %s operator."
+                    % (DATE_WINDOW_FIELD, DATE_WINDOW_OPERATOR))
+            first, _, last = (filtr.value or '').partition('/')
+            first, last = parseDate(first), parseDate(last or first)
+            if not first or not last or first > last:
+                raise endpoints.BadRequestException(
+                    "%s filter needs a window of dates such as "
+                    "2016-07-01/2016-07-31." % DATE_WINDOW_FIELD)
+            if weekNumber(last) - weekNumber(first) >= MAX_DATE_WINDOW_WEEKS:
+                raise endpoints.BadRequestException(
+                    "%s filter may span at most %d weeks."
+                    % (DATE_WINDOW_FIELD, MAX_DATE_WINDOW_WEEKS))
+            window = (first, last)
+        return window, others
+
+    def _getDateWindowPage(self, request, window, filters):
+        """Return (keys, nextPageToken, query plan, conferences) for one
+        page, in name order, of the conferences running during window
+        that match filters; conferences is None unless the matches were
+        just read. Every
+        calendar week of the window is an equality lookup on
+        calendarWeeks; the lookups run in parallel and are merged, and
+        the exact dates and any inequality filters checked, in memory.
+        The matches are cached as a whole, so page tokens are offsets."""
+        page_size = self._pageSize(request)
+        try:
+            offset = int(request.pageToken or 0)
+        except ValueError:
+            raise endpoints.BadRequestException("Invalid 'pageToken'.")
+        first, last = window
+        inequality_fields, filters = self._formatFilters(filters)
+        weeks = calendarWeeks(first, last)
+        annotate(filters=' AND '.join(filter(None, [
+            '%s %s %s/%s' % (DATE_WINDOW_FIELD, DATE_WINDOW_OPERATOR,
+                             first, last),
+            self._describeFilters(filters)])))
+        plan = 'datastore: %s; in memory: %s' % (
+            ' AND '.join(filter(None, [
+                '%d calendarWeeks lookups' % len(weeks),
+                self._describeFilters([filtr for filtr in filters
+                                       if filtr["operator"] == "="])])),
+            ' AND '.join(filter(None, [
+                'dates %s to %s' % (first, last),
+                self._describeFilters([filtr for filtr in filters
+                                       if filtr["operator"] != "="])])))
+        annotate(plan=plan)
+        signature = repr((
+            window, sorted(set((filtr["field"], filtr["operator"],
+                                filtr["value"]) for filtr in filters))))
+        generation = self._queryGeneration()
+        cache_key = '%s%s:%s' % (MEMCACHE_DATE_QUERY_PREFIX, generation,
+                                 hashlib.sha1(signature).hexdigest())
+
+        keys = memcache.get(cache_key)
+        confs = None
+        if keys is None:
+            q = Conference.query()
+            for filtr in filters:
+                if filtr["operator"] == "=":
+                    q = q.filter(ndb.query.FilterNode(
+                        filtr["field"], filtr["operator"], filtr["value"]))
+            futures = [
+                q.filter(Conference.calendarWeeks == week).fetch_async(
+                    keys_only=True)
+                for week in weeks]
+            found = set()
+            for future in futures:
+                found.update(future.get_result())
+            confs = [
+                conf for conf in entity_cache.get_multi(list(found))
+                if conf and conf.startDate and conf.startDate <= last and
+                (conf.endDate or conf.startDate) >= first and
+                self._matchesFilters(conf, filters)]
+            confs.sort(key=lambda conf: (conf.name, conf.key))
+            keys = [conf.key for conf in confs]
+            if not self._queryCacheSettling():
+                memcache.set(cache_key, keys, time=QUERY_CACHE_TTL)
+
+        next_offset = offset + page_size
+        return (keys[offset:next_offset],
+                str(next_offset) if next_offset < len(keys) else None, plan,
+                confs and confs[offset:next_offset])
+
+    @staticmethod
+    def _matchesFilters(conf, filters):
+        """Return whether conf passes every formatted query filter; a
+        filter on a repeated property passes if any value does."""
+        for filtr in filters:
+            values = getattr(conf, filtr["field"])
+            if not isinstance(values, list):
+                values = [values]
+            compare = COMPARISONS[filtr["operator"]]
+            if not any(value is not None and compare(value, filtr["value"])
+                       for value in values):
+                return False
+        return True
+
+    @staticmethod
+    def _migrateCalendarWeeks(websafe_cursor=None):
+        """Fill in the calendar weeks of one batch of conferences and
+        enqueue the next batch; used by the calendar backfill task."""
+        cursor = Cursor(urlsafe=websafe_cursor) if websafe_cursor else None
+        confs, next_cursor, more = Conference.query().fetch_page(
+            CALENDAR_MIGRATION_BATCH, start_cursor=cursor)
+
+        # re-read each stale conference in its own transaction, so
+        # concurrent seat syncs and updates are not overwritten
+        stale = [conf.key for conf in confs
+                 if conf.calendarWeeks !=
+                 calendarWeeks(conf.startDate, conf.endDate)]
+        ndb.Future.wait_all(
+            [ConferenceApi._setCalendarWeeks(c_key) for c_key in stale])
+        if stale:
+            entity_cache.invalidate(*stale)
+            ConferenceApi._invalidateQueryCache()
+
+        if more and next_cursor:
+            taskqueue.add(params={'cursor': next_cursor.urlsafe()},
+                          url='/tasks/migrate_calendar_weeks')
+        return len(stale)
+
+    @staticmethod
+    @ndb.transactional_tasklet
+    def _setCalendarWeeks(c_key):
+        conf = yield c_key.get_async()
+        weeks = calendarWeeks(conf.startDate, conf.endDate)
+        if conf.calendarWeeks != weeks:
+            conf.calendarWeeks = weeks
+            yield conf.put_async()
+
+    @staticmethod
+    def _invalidateQueryCache():
+        """Retire all cached query pages after a Conference write."""
+        # set first, so no page read before the new generation is cached
+        # under it
+        memcache.set(MEMCACHE_QUERY_SETTLING_KEY, True,
+                     time=QUERY_CACHE_SETTLE_SECONDS)
+        memcache.incr(MEMCACHE_QUERY_GENERATION_KEY,
+                      initial_value=ConferenceApi._newQueryGeneration())
+
+    @staticmethod
+    def _queryCacheSettling():
+        """Return whether a Conference write was made too recently for
+        queries to be sure to see it, so their pages must not be
+        cached."""
+        return memcache.get(MEMCACHE_QUERY_SETTLING_KEY) is not None
+
+    @staticmethod
+    def _queryGeneration():
+        """Return the generation cached query pages are keyed under."""
+        generation = memcache.get(MEMCACHE_QUERY_GENERATION_KEY)
+        if generation is None:
+            # add() so that of concurrent readers the first one wins
+            memcache.add(MEMCACHE_QUERY_GENERATION_KEY,
+                         ConferenceApi._newQueryGeneration())
+            generation = memcache.get(MEMCACHE_QUERY_GENERATION_KEY)
+        return generation
+
+    @staticmethod
+    def _newQueryGeneration():
+        """Return a generation to restart from once the counter was
+        evicted: the time in microseconds, which is past any generation
+        counted up before, so no page cached under one is served."""
+        return int(time.time() * 1000000)
+
+# getConferenceStats
+
+    @endpoints.method(
+        message_types.VoidMessage, ConferenceStatsForm,
+        path='conferences/stats', http_method='GET',
+        name='getConferenceStats')
+    @instrument
+    def getConferenceStats(self, request):
+        """Return conference, seat and session counts, overall and by
+        city, month, topic and session type."""
+        stats = self._readStats()
+
+        def counts(prefix):
+            return sorted(
+                (StatCountForm(name=name[len(prefix):], count=count)
+                 for name, count in stats.items()
+                 if name.startswith(prefix) and count),
+                key=lambda form: (-form.count, form.name))
+
+        return ConferenceStatsForm(
+            conferences=stats['conferences'],
+            seats=stats['seats'],
+            seatsSold=stats['seatsSold'],
+            sessions=stats['sessions'],
+            conferencesByCity=counts('city:'),
+            conferencesByMonth=counts('month:'),
+            conferencesByTopic=counts('topic:'),
+            sessionsByType=counts('sessionType:'))
+
+# searchConferences
+
+    @endpoints.method(
+        ConferenceSearchForm, ConferenceSearchForms,
+        path='conferences/search', http_method='POST',
+        name='searchConferences')
+    @instrument
+    @ndb.synctasklet
+    def searchConferences(self, request):
+        """Search conferences by words of their name and description or
+        a whole city or topic, with any number of filters and ranges,
+        and facet counts."""
+        query = self._searchQuery(request)
+        annotate(filters=repr(query))
+        try:
+            result = getIndex().search(query)
+        except search.QueryError, e:
+            raise endpoints.BadRequestException('Invalid search: %s' % e)
+        except search.Error:
+            logging.exception('Search failed: %r', query)
+            raise ServiceUnavailableException(
+                'Search is unavailable, try again later.')
+
+        keys = [ndb.Key(urlsafe=websafe_key) for websafe_key in result.ids]
+        conferences, names = yield (
+            entity_cache.get_multi_async(keys),
+            self._getOrganizerNamesAsync(
+                [key.parent().id() for key in keys]))
+        conf_forms = self._copyConferencesToForms(
+            [conf for conf in conferences if conf], names)
+
+        # report facets under the names filters use
+        field_names = dict(
+            (field, name) for name, field in SEARCH_FIELDS.items())
+        facets = [FacetForm(field=field_names[field], values=[
+            FacetValueForm(value=unicode(value), count=count)
+            for value, count in values])
+            for field, values in sorted(result.facets.items())]
+
+        offset = query.offset + len(result.ids)
+        next_page_token = None
+        if result.ids and offset < min(result.total, MAX_SEARCH_OFFSET):
+            next_page_token = str(offset)
+        raise ndb.Return(ConferenceSearchForms(
+            items=conf_forms.items, facets=facets, total=result.total,
+            nextPageToken=next_page_token))
+
+    def _searchQuery(self, request):
+        """Return the SearchQuery of a ConferenceSearchForm."""
+        page_size = min(request.pageSize or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        if page_size < 1:
+            raise endpoints.BadRequestException(
+                "'pageSize' must be positive.")
+        try:
+            offset = int(request.pageToken or 0)
+        except ValueError:
+            offset = -1
+        if not 0 <= offset < MAX_SEARCH_OFFSET:
+            raise endpoints.BadRequestException("Invalid 'pageToken'.")
+
+        filters = []
+        for f in request.filters:
+            field = self._searchField(f.field)
+            operator = OPERATORS.get(f.operator)
+            if not operator:
+                raise endpoints.BadRequestException(
+                    "Filter contains invalid field or operator.")
+            if field in ATOM_FIELDS and operator not in ('=', '!='):
+                raise endpoints.BadRequestException(
+                    "Only EQ and NE filters apply to %s." % f.field)
+            filters.append((field, operator,
+                            self._searchValue(field, f.value)))
+
+        ranges = {}
+        for r in request.ranges:
+            field = self._searchField(r.field)
+            if field not in NUMBER_FIELDS:
+                raise endpoints.BadRequestException(
+                    "Ranges apply to numeric fields only.")
+            if r.low is None and r.high is None:
+                raise endpoints.BadRequestException(
+                    "A range needs a 'low' or a 'high' end.")
+            ranges.setdefault(field, []).append((r.low, r.high))
+
+        facets = []
+        for name in request.facets:
+            field = SEARCH_FIELDS.get(name)
+            if field not in FACET_FIELDS:
+                raise endpoints.BadRequestException(
+                    "Cannot count facet %s." % name)
+            facets.append(field)
+
+        return SearchQuery(request.query or u'', filters, ranges, facets,
+                           page_size, offset)
+
+    @staticmethod
+    def _searchField(name):
+        """Return the search field of a filter field name."""
+        try:
+            return SEARCH_FIELDS[name]
+        except KeyError:
+            raise endpoints.BadRequestException(
+                "Filter contains invalid field or operator.")
+
+    @staticmethod
+    def _searchValue(field, value):
+        """Return a filter value converted for its search field."""
+        if field in NUMBER_FIELDS:
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                raise endpoints.BadRequestException(
+                    "Filter on %s needs an integer value." % field)
+        if not value:
+            raise endpoints.BadRequestException(
+                "Filter on %s needs a value." % field)
+        return value
 
 # Profile objects
 
     def _copyProfileToForm(self, prof):
         """Copy relevant fields from Profile to ProfileForm."""
-        # copy relevant fields from Profile to ProfileForm
-        pf = ProfileForm()
-        for field in pf.all_fields():
-            if hasattr(prof, field.name):
-                # convert t-shirt string to Enum; just copy others
-                if field.name == 'teeShirtSize':
-                    setattr(pf, field.name, getattr(
-                        TeeShirtSize, getattr(prof, field.name)))
-                else:
-                    setattr(pf, field.name, getattr(prof, field.name))
-        pf.check_initialized()
-        return pf
+        # t-shirt size strings become Enum values
+        return _entityToForm(prof, ProfileForm, PROFILE_FORM_FIELDS)
 
     def _getProfileFromUser(self):
         """Return user Profile from datastore,
@@ -408,7 +1564,7 @@ class ConferenceApi(remote.Service):
         # get Profile from datastore
         user_id = getUserId(user)
         p_key = ndb.Key(Profile, user_id)
-        profile = p_key.get()
+        profile = entity_cache.get(p_key)
         # create new Profile if not there
         if not profile:
             profile = Profile(
@@ -423,23 +1579,87 @@ class ConferenceApi(remote.Service):
     def _doProfile(self, save_request=None):
         """Get user Profile and return to user, possibly updating it first."""
         # get user Profile
-        prof = self._getProfileFromUser()
+        prof = self._getRegistrationProfile()
 
         # if saveProfile(), process user-modifyable fields
         if save_request:
-            for field in ('displayName', 'teeShirtSize'):
-                if hasattr(save_request, field):
-                    val = getattr(save_request, field)
-                    if val:
-                        setattr(prof, field, str(val))
-                        prof.put()
+            prof, old_name = self._updateProfile(prof.key, save_request)
+            entity_cache.invalidate(prof.key)
+
+            # refresh the name copied onto the user's conferences
+            if prof.displayName != old_name:
+                memcache.delete(
+                    MEMCACHE_DISPLAY_NAME_PREFIX + prof.key.id(),
+                    seconds=INVALIDATION_LOCK_SECONDS)
+                entity_cache.invalidate(*self._renameOrganizer(
+                    prof.key, prof.displayName))
+                taskqueue.add(params={'profile': prof.key.urlsafe()},
+                              url='/tasks/rename_attendee')
+
+        # return ProfileForm, listing the conferences registered for
+        pf = self._copyProfileToForm(prof)
+        pf.conferenceKeysToAttend = [
+            key.id() for key in
+            Registration.query(ancestor=prof.key).fetch(keys_only=True)]
+        return pf
 
-        # return ProfileForm
-        return self._copyProfileToForm(prof)
+    @staticmethod
+    @ndb.transactional()
+    def _updateProfile(p_key, save_request):
+        """Copy the user-modifyable fields of a saveProfile request onto
+        the stored Profile; return it and its previous displayName."""
+        # the cached Profile may be stale, so it is read again here
+        prof = p_key.get()
+        old_name = prof.displayName
+        for field in ('displayName', 'teeShirtSize'):
+            if hasattr(save_request, field):
+                val = getattr(save_request, field)
+                if val:
+                    setattr(prof, field, str(val))
+        prof.put()
+        return prof, old_name
+
+    @staticmethod
+    @ndb.transactional()
+    def _renameOrganizer(p_key, display_name):
+        """Copy a new displayName onto an organizer's conferences and
+        return their keys."""
+        confs = Conference.query(ancestor=p_key).fetch()
+        for conf in confs:
+            conf.organizerDisplayName = display_name
+        ndb.put_multi(confs)
+        return [conf.key for conf in confs]
+
+    @staticmethod
+    def _renameAttendee(websafe_profile_key, websafe_cursor=None):
+        """Copy a user's current displayName onto one batch of their
+        roster entries and enqueue the next batch; used by the attendee
+        rename task."""
+        p_key = ndb.Key(urlsafe=websafe_profile_key)
+        # read the name when the task runs, so that of two quick renames
+        # the later one wins whichever task finishes last
+        display_name = p_key.get().displayName
+        cursor = Cursor(urlsafe=websafe_cursor) if websafe_cursor else None
+        attendees, next_cursor, more = ConferenceAttendee.query(
+            ConferenceAttendee.profile == p_key).fetch_page(
+                RENAME_ATTENDEE_BATCH, start_cursor=cursor)
+
+        changed = [attendee for attendee in attendees
+                   if attendee.displayName != display_name]
+        for attendee in changed:
+            attendee.displayName = display_name
+        ndb.put_multi(changed)
+
+        if more and next_cursor:
+            taskqueue.add(params={'profile': websafe_profile_key,
+                                  'cursor': next_cursor.urlsafe()},
+                          url='/tasks/rename_attendee')
+        return len(changed)
 
     @endpoints.method(
         message_types.VoidMessage, ProfileForm,
         path='profile', http_method='GET', name='getProfile')
+    @instrument
     def getProfile(self, request):
         """Return user profile."""
         return self._doProfile()
@@ -447,6 +1667,7 @@ class ConferenceApi(remote.Service):
     @endpoints.method(
         ProfileMiniForm, ProfileForm,
         path='profile', http_method='POST', name='saveProfile')
+    @instrument
     def saveProfile(self, request):
         """Update & return user profile."""
         return self._doProfile(request)
@@ -457,32 +1678,195 @@ class ConferenceApi(remote.Service):
     def _cacheAnnouncement():
         """Create Announcement & assign to memcache; used by
         memcache cron job & putAnnouncement().
+
+        Registrations keep the cached set of nearly sold out conferences
+        up to date, so this only rebuilds it from the datastore when it
+        is missing or to repair drift.
         """
         confs = Conference.query(ndb.AND(
-            Conference.seatsAvailable <= 5,
+            Conference.seatsAvailable <= NEAR_SOLD_OUT_SEATS,
             Conference.seatsAvailable > 0)
         ).fetch(projection=[Conference.name])
 
+        cached = ConferenceApi._announcementFor(
+            dict((conf.key.urlsafe(), conf.name) for conf in confs))
+        memcache.set(MEMCACHE_ANNOUNCEMENTS_KEY, cached)
+        return cached['announcement']
+
+    @staticmethod
+    def _announcementFor(confs):
+        """Return the cached announcement of nearly sold out conferences,
+        given as a dict of conference names by websafe key."""
         if confs:
             # If there are almost sold out conferences,
-            # format announcement and set it in memcache
+            # format announcement
             announcement = ANNOUNCEMENT_TPL % (
-                ', '.join(conf.name for conf in confs))
-            memcache.set(MEMCACHE_ANNOUNCEMENTS_KEY, announcement)
+                ', '.join(sorted(confs.values())))
         else:
-            # If there are no sold out conferences,
-            # delete the memcache announcements entry
             announcement = ""
-            memcache.delete(MEMCACHE_ANNOUNCEMENTS_KEY)
+        return {'conferences': confs, 'announcement': announcement}
 
-        return announcement
+    @staticmethod
+    def _getAnnouncement():
+        """Return the announcement, rebuilding it if not cached."""
+        cached = memcache.get(MEMCACHE_ANNOUNCEMENTS_KEY)
+        if cached is None:
+            return ConferenceApi._cacheAnnouncement()
+        return cached['announcement']
 
     @staticmethod
-    def _setFeaturedSpeaker(session_speaker, session_name, conf_key):
-        """Set featured speaker in memcache"""
+    def _updateNearSoldOut(conf, seats):
+        """Add a conference to or remove it from the cached announcement
+        when its seat total crossed the nearly sold out threshold, or
+        rename it there."""
+        websafe_conference_key = conf.key.urlsafe()
+        near = 0 < seats <= NEAR_SOLD_OUT_SEATS
+        client = memcache.Client()
+        for attempt in range(ANNOUNCEMENT_CAS_ATTEMPTS):
+            cached = client.gets(MEMCACHE_ANNOUNCEMENTS_KEY)
+            if cached is None:
+                ConferenceApi._cacheAnnouncement()
+                continue
+            confs = dict(cached['conferences'])
+            if confs.get(websafe_conference_key) == (conf.name if near
+                                                     else None):
+                # no threshold crossed
+                return
+            if near:
+                confs[websafe_conference_key] = conf.name
+            else:
+                del confs[websafe_conference_key]
+            if client.cas(MEMCACHE_ANNOUNCEMENTS_KEY,
+                          ConferenceApi._announcementFor(confs)):
+                return
+        # contended: drop it so the next reader rebuilds it
+        client.delete(MEMCACHE_ANNOUNCEMENTS_KEY)
 
-        featured = SPEAKER_TPL + session_speaker
-        memcache.set(MEMCACHE_SPEAKER_KEY, featured)
+    @staticmethod
+    def _seatTotal(conf):
+        """Return the seats left in all shards of a sharded conference."""
+        shards = ndb.get_multi(
+            ConferenceApi._seatShardKeys(conf.key, conf.seatShards))
+        return sum(shard.seats for shard in shards if shard)
+
+    @staticmethod
+    def _seatShardKeys(c_key, num_shards):
+        """Return the keys of the SeatShards of a conference."""
+        return [ndb.Key(SeatShard, '%s-%d' % (c_key.urlsafe(), i))
+                for i in range(num_shards)]
+
+    @staticmethod
+    def _resizeSeatShards(shards, seat_delta):
+        """Add seat_delta seats to SeatShards: added seats evenly, removed
+        seats from the shards with the most free seats, so none goes
+        negative; return the shards. Raise ConflictException if fewer
+        seats are free than are removed."""
+        if seat_delta > 0:
+            per_shard, extra = divmod(seat_delta, len(shards))
+            for i, shard in enumerate(shards):
+                shard.seats += per_shard + (1 if i < extra else 0)
+            return shards
+
+        free = sum(shard.seats for shard in shards)
+        if free < -seat_delta:
+            raise ConflictException(
+                "Cannot remove %d seats, only %d are not taken."
+                % (-seat_delta, free))
+        remove = -seat_delta
+        for shard in sorted(shards, key=lambda shard: -shard.seats):
+            taken = min(shard.seats, remove)
+            shard.seats -= taken
+            remove -= taken
+        return shards
+
+    @staticmethod
+    def _newSeatShards(c_key, seats):
+        """Return new SeatShards splitting seats evenly for a conference."""
+        per_shard, extra = divmod(seats or 0, SEAT_SHARDS)
+        return [SeatShard(key=shard_key,
+                          seats=per_shard + (1 if i < extra else 0))
+                for i, shard_key in enumerate(
+                    ConferenceApi._seatShardKeys(c_key, SEAT_SHARDS))]
+
+    @staticmethod
+    @ndb.transactional(xg=True)
+    def _shardConferenceSeats(c_key):
+        """Move seatsAvailable of an unsharded conference into shards."""
+        conf = c_key.get()
+        if not conf.seatShards:
+            conf.seatShards = SEAT_SHARDS
+            ndb.put_multi([conf] + ConferenceApi._newSeatShards(
+                c_key, conf.seatsAvailable))
+        return conf
+
+    @staticmethod
+    def _scheduleSeatSync(c_key):
+        """Enqueue one seat aggregation task per conference and interval."""
+        interval = int(time.time()) // SEAT_SYNC_INTERVAL
+        try:
+            taskqueue.add(
+                name='sync-seats-%s-%d' % (c_key.urlsafe(), interval),
+                params={'websafeConferenceKey': c_key.urlsafe()},
+                url='/tasks/sync_seats',
+                countdown=SEAT_SYNC_INTERVAL)
+        except (taskqueue.TaskAlreadyExistsError,
+                taskqueue.TombstonedTaskError):
+            # a sync for this interval is already pending
+            pass
+
+    @staticmethod
+    def _syncSeatsAvailable(websafe_conference_key):
+        """Fold the seat shard totals into Conference.seatsAvailable;
+        used by the seat sync task queue job.
+        """
+        c_key = ndb.Key(urlsafe=websafe_conference_key)
+        conf = c_key.get()
+        if not conf or not conf.seatShards:
+            return None
+        seats = ConferenceApi._seatTotal(conf)
+        if conf.seatsAvailable != seats:
+            ConferenceApi._setSeatsAvailable(c_key, seats)
+            conf.seatsAvailable = seats
+            ConferenceApi._indexConferences([conf])
+        entity_cache.invalidate(c_key)
+        ConferenceApi._updateNearSoldOut(conf, seats)
+        return seats
+
+    @staticmethod
+    @ndb.transactional()
+    def _setSeatsAvailable(c_key, seats):
+        """Store an aggregated seat count on a conference."""
+        conf = c_key.get()
+        if conf.seatsAvailable != seats:
+            conf.seatsAvailable = seats
+            conf.put()
+
+    @staticmethod
+    def _setFeaturedSpeaker(websafe_conference_key):
+        """Feature the conference's speaker with several sessions whose
+        session counter changed last; used by the featured speaker task,
+        which runs once for a burst of new sessions."""
+        c_key = ndb.Key(urlsafe=websafe_conference_key)
+        # counters still keyed by a raw speaker name are left to the
+        # speaker counter migration
+        counters = [counter for counter in
+                    SpeakerSessionCount.query(ancestor=c_key)
+                    if counter.count > 1 and
+                    counter.key.id() == normalizeSpeaker(counter.key.id())]
+        if not counters:
+            return None
+        counter = max(counters, key=lambda counter: (
+            counter.updated, counter.count))
+
+        FeaturedSpeaker(
+            key=ndb.Key(FeaturedSpeaker, FEATURED_SPEAKER_ID, parent=c_key),
+            speaker=counter.speaker,
+            sessionNames=counter.sessionNames).put()
+        featured = SPEAKER_TPL % (
+            counter.speaker, ', '.join(counter.sessionNames))
+        memcache.set_multi({
+            MEMCACHE_SPEAKER_KEY: featured,
+            MEMCACHE_CONF_SPEAKER_PREFIX + websafe_conference_key: featured})
 
         return featured
 
@@ -490,94 +1874,220 @@ class ConferenceApi(remote.Service):
         message_types.VoidMessage, StringMessage,
         path='conference/announcement/get',
         http_method='GET', name='getAnnouncement')
+    @instrument
     def getAnnouncement(self, request):
         """Return Announcement from memcache."""
-        return StringMessage(
-            data=memcache.get(MEMCACHE_ANNOUNCEMENTS_KEY) or "")
+        return StringMessage(data=self._getAnnouncement())
 
 # Registration
 
-    @ndb.transactional(xg=True)
     def _conferenceRegistration(self, request, reg=True):
         """Register or unregister user for selected conference."""
-        retval = None
-        prof = self._getProfileFromUser()  # get user Profile
+        prof = self._getRegistrationProfile()  # get user Profile
 
         # check if conf exists given websafeConfKey
         # get conference; check that it exists
         websafe_conference_key = request.websafeConferenceKey
-        conf = ndb.Key(urlsafe=websafe_conference_key).get()
+        conf = entity_cache.get(ndb.Key(urlsafe=websafe_conference_key))
         if not conf:
             raise endpoints.NotFoundException(
                 'No conference found with key: %s' % websafe_conference_key)
+        if not conf.seatShards:
+            conf = self._shardConferenceSeats(conf.key)
+            entity_cache.invalidate(conf.key)
+
+        # neither the Conference nor the Profile entity is written here,
+        # so registrations only contend on the user's registration, one
+        # seat shard and the roster entry
+        retval = self._updateRegistration(prof, conf, reg)
+        if retval:
+            # the seat sync folds the shards into one total and updates
+            # the announcement from it; reading every shard here, in or
+            # out of the transaction, would cost each registration
+            self._scheduleSeatSync(conf.key)
+        return BooleanMessage(data=retval)
+
+    @staticmethod
+    def _registrationKey(p_key, c_key):
+        """Return the key of a user's Registration for a conference."""
+        return ndb.Key(Registration, c_key.urlsafe(), parent=p_key)
+
+    @staticmethod
+    def _attendeeKey(c_key, p_key):
+        """Return the key of a user's entry in a conference roster."""
+        return ndb.Key(ConferenceAttendee,
+                       '%s:%s' % (c_key.urlsafe(), p_key.id()))
+
+    @ndb.transactional(xg=True)
+    def _updateRegistration(self, prof, conf, reg):
+        """Move one seat between a conference's shards and a profile's
+        Registration, mirrored in the conference roster."""
+        reg_key = self._registrationKey(prof.key, conf.key)
+        attendee_key = self._attendeeKey(conf.key, prof.key)
+        registration = reg_key.get()
+        shard_keys = self._seatShardKeys(conf.key, conf.seatShards)
+        random.shuffle(shard_keys)
 
         # register
         if reg:
             # check if user already registered otherwise add
-            if websafe_conference_key in prof.conferenceKeysToAttend:
+            if registration:
                 raise ConflictException(
                     "You have already registered for this conference")
 
-            # check if seats avail
-            if conf.seatsAvailable <= 0:
+            # take the seat from the first non-empty shard; the
+            # conference is only sold out once every shard read empty
+            for shard_key in shard_keys:
+                shard = shard_key.get()
+                if shard and shard.seats > 0:
+                    break
+            else:
                 raise ConflictException(
                     "There are no seats available.")
 
             # register user, take away one seat
-            prof.conferenceKeysToAttend.append(websafe_conference_key)
-            conf.seatsAvailable -= 1
-            retval = True
+            shard.seats -= 1
+            self._addStats({'seatsSold': 1})
+            ndb.put_multi([
+                shard,
+                Registration(key=reg_key, conference=conf.key),
+                ConferenceAttendee(key=attendee_key, conference=conf.key,
+                                   profile=prof.key,
+                                   displayName=prof.displayName)])
 
         # unregister
         else:
             # check if user already registered
-            if websafe_conference_key in prof.conferenceKeysToAttend:
-
-                # unregister user, add back one seat
-                prof.conferenceKeysToAttend.remove(websafe_conference_key)
-                conf.seatsAvailable += 1
-                retval = True
-            else:
-                retval = False
+            if not registration:
+                return False
+
+            # unregister user, add back one seat
+            shard = shard_keys[0].get()
+            shard.seats += 1
+            shard.put()
+            self._addStats({'seatsSold': -1})
+            ndb.delete_multi([reg_key, attendee_key])
+
+        return True
+
+    def _getRegistrationProfile(self):
+        """Return the user's Profile with its registrations in
+        Registration children, moving a legacy conferenceKeysToAttend
+        list over first."""
+        prof = self._getProfileFromUser()
+        if prof.conferenceKeysToAttend:
+            self._migrateRegistrations(prof.key)
+            entity_cache.invalidate(prof.key)
+            prof.conferenceKeysToAttend = []
+        return prof
+
+    def _migrateRegistrations(self, p_key):
+        """Move conferenceKeysToAttend of a Profile to Registration
+        children and the conference rosters, one conference at a time."""
+        # the cached Profile may be stale, so the list is read from the
+        # datastore and every key is checked again in its transaction
+        for websafe_conference_key in p_key.get().conferenceKeysToAttend:
+            self._moveRegistration(p_key, websafe_conference_key)
 
-        # write things back to the datastore & return
-        prof.put()
-        conf.put()
-        return BooleanMessage(data=retval)
+    @ndb.transactional(xg=True)
+    def _moveRegistration(self, p_key, websafe_conference_key):
+        """Replace one conferenceKeysToAttend entry of a Profile by a
+        Registration and a roster entry; a key another request already
+        moved or unregistered is left alone."""
+        prof = p_key.get()
+        if websafe_conference_key not in prof.conferenceKeysToAttend:
+            return
+        prof.conferenceKeysToAttend.remove(websafe_conference_key)
+        try:
+            c_key = ndb.Key(urlsafe=websafe_conference_key)
+        except Exception:
+            logging.warning('Dropping bad registration key %s of %s',
+                            websafe_conference_key, p_key.id())
+            prof.put()
+            return
+        ndb.put_multi([
+            prof,
+            Registration(key=self._registrationKey(p_key, c_key),
+                         conference=c_key),
+            ConferenceAttendee(key=self._attendeeKey(c_key, p_key),
+                               conference=c_key, profile=p_key,
+                               displayName=prof.displayName)])
 
     @endpoints.method(
-        message_types.VoidMessage, ConferenceForms,
+        PAGE_GET_REQUEST, ConferenceForms,
         path='conferences/attending',
         http_method='GET', name='getConferencesToAttend')
+    @instrument
+    @ndb.synctasklet
     def getConferencesToAttend(self, request):
-        """Get list of conferences that user has registered for."""
-        prof = self._getProfileFromUser()  # get user Profile
-        conf_keys = [ndb.Key(
-            urlsafe=websafe_conference_key) for websafe_conference_key
-            in prof.conferenceKeysToAttend]
-        conferences = ndb.get_multi(conf_keys)
-
-        # get organizers
-        organisers = [ndb.Key(
-            Profile, conf.organizerUserId) for conf in conferences]
-        profiles = ndb.get_multi(organisers)
-
-        # put display names in a dict for easier fetching
-        names = {}
-        for profile in profiles:
-            names[profile.key.id()] = profile.displayName
+        """Get list of conferences that user has registered for, one
+        page at a time."""
+        prof = self._getRegistrationProfile()  # get user Profile
+        page_size, cursor = self._pageArgs(request)
+
+        # registrations are keyed by websafe conference key, so a
+        # keys-only ancestor query is all that is needed
+        reg_keys, next_cursor, more = yield Registration.query(
+            ancestor=prof.key).fetch_page_async(
+                page_size, start_cursor=cursor, keys_only=True)
+        conf_keys = [ndb.Key(urlsafe=key.id()) for key in reg_keys]
+
+        # get conferences and organizer displayNames at the same time
+        conferences, names = yield (
+            entity_cache.get_multi_async(conf_keys),
+            self._getOrganizerNamesAsync(
+                [key.parent().id() for key in conf_keys]))
 
         # return set of ConferenceForm objects per Conference
-        return ConferenceForms(
-            items=[
-                self._copyConferenceToForm(
-                    conf, names[conf.organizerUserId])
-                for conf in conferences])
+        conf_forms = self._copyConferencesToForms(
+            [conf for conf in conferences if conf], names)
+        if more and next_cursor:
+            conf_forms.nextPageToken = next_cursor.urlsafe()
+        raise ndb.Return(conf_forms)
+
+    @endpoints.method(
+        ATTENDEES_GET_REQUEST, AttendeeForms,
+        path='conference/{websafeConferenceKey}/attendees',
+        http_method='GET', name='getConferenceAttendees')
+    @instrument
+    @ndb.synctasklet
+    def getConferenceAttendees(self, request):
+        """Return the attendees of a conference, one page at a time, and
+        their number; for the conference's organizer only."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        c_key = ndb.Key(urlsafe=request.websafeConferenceKey)
+        conf = entity_cache.get(c_key)
+        if not conf:
+            raise endpoints.NotFoundException(
+                'No conference found with key: %s'
+                % request.websafeConferenceKey)
+        if getUserId(user) != conf.organizerUserId:
+            raise endpoints.ForbiddenException(
+                'Only the owner can list the attendees.')
+        page_size, cursor = self._pageArgs(request)
+
+        # the roster entries carry the displayNames, so no profiles are
+        # read; taken seats give the count
+        attendees, next_cursor, more = yield ConferenceAttendee.query(
+            ConferenceAttendee.conference == c_key).fetch_page_async(
+                page_size, start_cursor=cursor)
+        seats = (self._seatTotal(conf) if conf.seatShards
+                 else conf.seatsAvailable or 0)
+        raise ndb.Return(AttendeeForms(
+            items=[AttendeeForm(displayName=attendee.displayName,
+                                registered=str(attendee.registered))
+                   for attendee in attendees],
+            attendeeCount=(conf.maxAttendees or 0) - seats,
+            nextPageToken=(next_cursor.urlsafe()
+                           if more and next_cursor else None)))
 
     @endpoints.method(
         CONF_GET_REQUEST, BooleanMessage,
         path='conference/{websafeConferenceKey}',
         http_method='POST', name='registerForConference')
+    @instrument
     def registerForConference(self, request):
         """Register user for selected conference."""
         return self._conferenceRegistration(request)
@@ -586,52 +2096,58 @@ class ConferenceApi(remote.Service):
         CONF_GET_REQUEST, BooleanMessage,
         path='conference/{websafeConferenceKey}',
         http_method='DELETE', name='unregisterFromConference')
+    @instrument
     def unregisterFromConference(self, request):
         """Unregister user for selected conference."""
         return self._conferenceRegistration(request, reg=False)
 
 # Task 3 Query 1:
     @endpoints.method(
-        message_types.VoidMessage, ConferenceForms,
+        SELECT_GET_REQUEST, ConferenceForms,
         path='queryProblem1',
         http_method='GET', name='queryProblem1')
+    @instrument
     def queryProblem1(self, request):
         """queryProblem1"""
 
         q = Conference.query().\
             filter(Conference.city == "Palo Alto").\
             filter(Conference.topics == "Web Technologies")
+        fields, wanted = _selectFields(
+            ConferenceForm, CONFERENCE_FORM_FIELDS, request.select)
 
-        return ConferenceForms(
-            items=[self._copyConferenceToForm(conf, "") for conf in q])
+        return self._copyConferencesToForms(
+            self._fetchConferences(q, fields, exclude=('city', 'topics')),
+            fields=fields)
 
 # Task 3 Query 2:
     @endpoints.method(
-        message_types.VoidMessage, ConferenceForms,
+        SELECT_GET_REQUEST, ConferenceForms,
         path='queryProblem2',
         http_method='GET', name='queryProblem2')
+    @instrument
     def queryProblem2(self, request):
         """queryProblem2"""
 
         q = Conference.query()
         q = q.filter(Conference.maxAttendees > 10)
+        fields, wanted = _selectFields(
+            ConferenceForm, CONFERENCE_FORM_FIELDS, request.select)
 
-        return ConferenceForms(
-            items=[self._copyConferenceToForm(conf, "") for conf in q]
-        )
+        return self._copyConferencesToForms(
+            self._fetchConferences(q, fields), fields=fields)
 
     @endpoints.method(
         message_types.VoidMessage, ConferenceForms,
         path='filterPlayground',
         http_method='GET', name='filterPlayground')
+    @instrument
     def filterPlayground(self, request):
         """Filter Playground"""
 
         # This section is used to test out various queries
 
-        return ConferenceForms(
-            items=[self._copyConferenceToForm(conf, "") for conf in q]
-        )
+        return self._copyConferencesToForms(q)
 
 # Task 1: Add Sessions to a Conference
 
@@ -640,17 +2156,36 @@ class ConferenceApi(remote.Service):
         SESSION_POST_REQUEST, SessionForm,
         path='conference/{websafeConferenceKey}/sessions',
         http_method='POST', name='createSession')
+    @instrument
     def createSession(self, request):
         """Task 1.4: Given a conference, create new session"""
         return self._createSessionObject(request)
 
     def _createSessionObject(self, request):
-        """Create or update session object, returning SessionForm/request."""
+        """Create session object, returning SessionForm."""
         user = endpoints.get_current_user()
         if not user:
             raise endpoints.UnauthorizedException('Authorization required')
-        user_id = getUserId(user)
 
+        # generate Conference Key based on websafeConferenceKey
+        # allocate session id based on conference key
+        # generate Session key based on session id and session's parent key
+        c_key = ndb.Key(urlsafe=request.websafeConferenceKey)
+        s_id = Session.allocate_ids(size=1, parent=c_key)[0]
+        session = self._sessionFromForm(
+            request, ndb.Key(Session, s_id, parent=c_key))
+
+        # Course Task 4:
+        # When a session is added, count it for its speaker; the
+        # transaction adds a featured speaker task for repeat speakers
+        self._putSessionsAndCountSpeakers(c_key, [session])
+        self._addToSchedule(c_key, [session])
+
+        return self._copySessionToForm(session)
+
+    def _sessionFromForm(self, request, s_key):
+        """Return a new Session with key s_key built from a SessionForm,
+        filling in defaults on the form as well."""
         if not request.name:
             raise endpoints.BadRequestException(
                 "Session 'name' field required")
@@ -669,98 +2204,509 @@ class ConferenceApi(remote.Service):
                 setattr(request, df, SESSION_DEFAULTS[df])
 
         del data['websafeKey']
-        del data['websafeConferenceKey']
-
-        # generate Conference Key based on websafeConferenceKey
-        # allocate session id based on conference key
-        # generate Session key based on session id and session's parent key
-        c_key = ndb.Key(urlsafe=request.websafeConferenceKey)
-        s_id = Session.allocate_ids(size=1, parent=c_key)[0]
-        s_key = ndb.Key(Session, s_id, parent=c_key)
+        data.pop('websafeConferenceKey', None)
+        # filled in on the way out only, not a Session property
+        data.pop('conferenceName', None)
+
+        # store the parsed, indexable forms of the time fields
+        times = self._parseSessionTimes(
+            data['start_time'], data['date'], data['duration'])
+        for field, parsed in (('start_time', 'startMinutes'),
+                              ('date', 'sessionDate'),
+                              ('duration', 'durationMinutes')):
+            if data[field] and times[parsed] is None:
+                raise endpoints.BadRequestException(
+                    "Session '%s' field could not be parsed." % field)
+        data.update(times)
+        data['speakerKey'] = self._speakerKey(data['speaker'])
 
         data['key'] = s_key
-        session = Session(**data)
-        session.put()
+        return Session(**data)
 
-        # Course Task 4:
-        # When a session is added, add a task to check for featured speaker
+    @ndb.transactional()
+    def _putSessionsAndCountSpeakers(self, c_key, sessions, retry=False):
+        """Store new sessions of a conference and count them for their
+        speakers there, featuring every speaker with several sessions;
+        return the sessions stored. If retry, sessions whose key already
+        exists were stored by an earlier attempt and are skipped."""
+        if retry:
+            sessions = [session for session, stored in zip(
+                sessions, ndb.get_multi([session.key for session in sessions]))
+                if not stored]
+            if not sessions:
+                return sessions
+        ndb.put_multi(sessions)
+        stats = {}
+        for session in sessions:
+            self._sessionStats(session, 1, stats)
+        self._addStats(stats)
+
+        # counters are keyed by normalized speaker name
+        by_speaker = collections.OrderedDict()
+        for session in sessions:
+            if session.speakerKey:
+                by_speaker.setdefault(
+                    session.speakerKey.id(), []).append(session)
+        counter_keys = [ndb.Key(SpeakerSessionCount, speaker, parent=c_key)
+                        for speaker in by_speaker]
+        counters = ndb.get_multi(counter_keys)
+
+        featured = []
+        for counter_key, counter in zip(counter_keys, counters):
+            speaker = counter_key.id()
+            if not counter:
+                # first count for this speaker here; start from the
+                # sessions stored before counters existed (the queries do
+                # not see the sessions put in this transaction)
+                earlier = self._earlierSpeakerSessions(
+                    c_key, by_speaker[speaker])
+                counter = SpeakerSessionCount(
+                    key=counter_key,
+                    speaker=self._speakerName(by_speaker[speaker][0].speaker),
+                    count=len(earlier),
+                    sessionNames=[sess.name for sess in earlier])
+            counter.count += len(by_speaker[speaker])
+            counter.sessionNames.extend(
+                sess.name for sess in by_speaker[speaker])
+            counter.put()
+            if counter.count > 1:
+                featured.append(speaker)
+
+        # add a task adding the sessions to their speakers' session
+        # lists, and once committed a set_featured_speaker task shared
+        # by every session added to the conference meanwhile (named
+        # tasks cannot be transactional)
+        if by_speaker:
+            taskqueue.add(
+                params={'websafeSessionKey': [
+                    session.key.urlsafe() for session in sessions
+                    if session.speakerKey]},
+                url='/tasks/index_speakers', transactional=True)
+        if featured:
+            ndb.get_context().call_on_commit(
+                lambda: self._scheduleFeaturedSpeaker(c_key))
+        return sessions
+
+    @staticmethod
+    def _earlierSpeakerSessions(c_key, sessions):
+        """Return the stored sessions of a conference by the speaker of
+        sessions: those with its speakerKey, plus sessions from before
+        speakerKey existed that have one of the same speaker spellings."""
+        earlier = collections.OrderedDict(
+            (sess.key, sess) for sess in Session.query(
+                Session.speakerKey == sessions[0].speakerKey,
+                ancestor=c_key))
+        for name in set(session.speaker for session in sessions):
+            for sess in Session.query(Session.speaker == name,
+                                      ancestor=c_key):
+                earlier.setdefault(sess.key, sess)
+        return earlier.values()
+
+    @staticmethod
+    def _migrateSpeakerCounts(websafe_cursor=None):
+        """Re-key the speaker counters of one batch of conferences by
+        normalized speaker name and enqueue the next batch; used by the
+        speaker counter migration task."""
+        cursor = Cursor(urlsafe=websafe_cursor) if websafe_cursor else None
+        c_keys, next_cursor, more = Conference.query().fetch_page(
+            SPEAKER_COUNT_MIGRATION_BATCH, start_cursor=cursor,
+            keys_only=True)
+
+        merged = sum(ConferenceApi._mergeSpeakerCounts(c_key)
+                     for c_key in c_keys)
+
+        if more and next_cursor:
+            taskqueue.add(params={'cursor': next_cursor.urlsafe()},
+                          url='/tasks/migrate_speaker_counts')
+        return merged
 
-        q = Session.query().filter(Session.speaker == data['speaker']).count()
+    @staticmethod
+    @ndb.transactional()
+    def _mergeSpeakerCounts(c_key):
+        """Fold the counters of a conference that are keyed by a raw
+        speaker name into counters keyed by the normalized name."""
+        counters = SpeakerSessionCount.query(ancestor=c_key).fetch()
+        legacy = [counter for counter in counters
+                  if counter.key.id() != normalizeSpeaker(counter.key.id())]
+        if not legacy:
+            return 0
+        # a normalized counter was started from every earlier session of
+        # its speaker, so it already counts the legacy counter's sessions
+        current = set(counter.key.id() for counter in counters)
+        merged = {}
+        for old in legacy:
+            speaker = normalizeSpeaker(old.key.id())
+            if not speaker or speaker in current:
+                continue
+            counter = merged.get(speaker)
+            if not counter:
+                counter = merged[speaker] = SpeakerSessionCount(
+                    key=ndb.Key(SpeakerSessionCount, speaker, parent=c_key),
+                    speaker=ConferenceApi._speakerName(old.speaker or u''))
+            counter.count += old.count
+            counter.sessionNames.extend(old.sessionNames)
+        ndb.put_multi(merged.values())
+        ndb.delete_multi([old.key for old in legacy])
+        return len(legacy)
 
-        if q > 1:
-            # add set_featured_speaker task to task queue
+    @staticmethod
+    def _scheduleFeaturedSpeaker(c_key):
+        """Enqueue one featured speaker task per conference and
+        FEATURED_SPEAKER_DELAY seconds."""
+        window = int(time.time()) // FEATURED_SPEAKER_DELAY
+        try:
             taskqueue.add(
-                params={
-                    'session_speaker': session.speaker,
-                    'session_name': session.name,
-                    'c_key': session.key.parent().urlsafe()},
-                url='/tasks/set_featured_speaker')
+                name='featured-speaker-%s-%d' % (c_key.urlsafe(), window),
+                params={'websafeConferenceKey': c_key.urlsafe()},
+                url='/tasks/set_featured_speaker',
+                countdown=FEATURED_SPEAKER_DELAY)
+        except (taskqueue.TaskAlreadyExistsError,
+                taskqueue.TombstonedTaskError):
+            # a recompute for this window is already pending
+            pass
 
-        return self._copySessionToForm(session)
+    @staticmethod
+    def _speakerKey(speaker):
+        """Return the key of the Speaker of a speaker name, or None."""
+        name = normalizeSpeaker(speaker)
+        return ndb.Key(Speaker, name) if name else None
 
-    def _copySessionToForm(self, session):
+    @staticmethod
+    def _speakerName(speaker):
+        """Return a speaker name as displayed, with whitespace tidied."""
+        return u' '.join(speaker.split())
+
+    @staticmethod
+    def _indexSpeakerSessions(websafe_session_keys):
+        """Add sessions to their speakers' session lists; used by the
+        speaker index task."""
+        sessions = ndb.get_multi(
+            [ndb.Key(urlsafe=key) for key in websafe_session_keys])
+        ConferenceApi._addSpeakerSessions(
+            [session for session in sessions if session])
+
+    @staticmethod
+    def _addSpeakerSessions(sessions):
+        """Add sessions to the session lists of their Speakers,
+        creating Speakers as needed."""
+        by_speaker = collections.OrderedDict()
+        for session in sessions:
+            if session.speakerKey:
+                by_speaker.setdefault(session.speakerKey, []).append(session)
+        for speaker_key, speaker_sessions in by_speaker.items():
+            ConferenceApi._addToSpeaker(
+                speaker_key,
+                ConferenceApi._speakerName(speaker_sessions[0].speaker),
+                [session.key for session in speaker_sessions])
+        if by_speaker:
+            entity_cache.invalidate(*by_speaker.keys())
+
+    @staticmethod
+    @ndb.transactional()
+    def _addToSpeaker(speaker_key, name, session_keys):
+        """Add session keys missing from a Speaker's session list."""
+        speaker = speaker_key.get() or Speaker(key=speaker_key, name=name)
+        known = set(speaker.sessionKeys)
+        added = [key for key in session_keys if key not in known]
+        if added:
+            speaker.sessionKeys.extend(added)
+            speaker.put()
+
+    @staticmethod
+    def _migrateSessionSpeakers(websafe_cursor=None):
+        """Fill in speakerKey of one batch of sessions, index them by
+        speaker and enqueue the next batch; used by the session speaker
+        migration task."""
+        cursor = Cursor(urlsafe=websafe_cursor) if websafe_cursor else None
+        sessions, next_cursor, more = Session.query().fetch_page(
+            SESSION_MIGRATION_BATCH, start_cursor=cursor)
+
+        changed = []
+        for session in sessions:
+            speaker_key = ConferenceApi._speakerKey(session.speaker)
+            if session.speakerKey != speaker_key:
+                session.speakerKey = speaker_key
+                changed.append(session)
+        ndb.put_multi(changed)
+        ConferenceApi._addSpeakerSessions(sessions)
+
+        if more and next_cursor:
+            taskqueue.add(params={'cursor': next_cursor.urlsafe()},
+                          url='/tasks/migrate_session_speakers')
+        return len(changed)
+
+    @staticmethod
+    def _parseSessionTimes(start_time, date, duration):
+        """Return the indexed Session time fields parsed from their
+        free-form string values (None where a value does not parse)."""
+        return {
+            'startMinutes': parseTime(start_time),
+            'sessionDate': parseDate(date),
+            'durationMinutes': parseDuration(duration),
+        }
+
+    @staticmethod
+    def _migrateSessionTimes(websafe_cursor=None):
+        """Fill in the parsed time fields of one batch of sessions and
+        enqueue the next batch; used by the session migration task."""
+        cursor = Cursor(urlsafe=websafe_cursor) if websafe_cursor else None
+        sessions, next_cursor, more = Session.query().fetch_page(
+            SESSION_MIGRATION_BATCH, start_cursor=cursor)
+
+        changed = []
+        for session in sessions:
+            times = ConferenceApi._parseSessionTimes(
+                session.start_time, session.date, session.duration)
+            if any(getattr(session, name) != value
+                   for name, value in times.items()):
+                session.populate(**times)
+                changed.append(session)
+        ndb.put_multi(changed)
+
+        if more and next_cursor:
+            taskqueue.add(params={'cursor': next_cursor.urlsafe()},
+                          url='/tasks/migrate_session_times')
+        return len(changed)
+
+    def _copySessionToForm(self, session, fields=SESSION_FORM_FIELDS):
         """Copy relevant fields from Session to SessionForm."""
-        sf = SessionForm()
-        for field in sf.all_fields():
-            if hasattr(session, field.name):
-                setattr(sf, field.name, getattr(session, field.name))
-            elif field.name == "websafeKey":
-                setattr(sf, field.name, session.key.urlsafe())
-        sf.check_initialized()
+        sf = _entityToForm(session, SessionForm, fields)
+        sf.websafeKey = session.key.urlsafe()
         return sf
 
+    def _copySessionsToForms(self, sessions, fields=SESSION_FORM_FIELDS):
+        """Copy fields of Sessions to SessionForms."""
+        return SessionForms(items=[
+            self._copySessionToForm(session, fields) for session in sessions])
+
+# Bulk session import
+    @endpoints.method(
+        SESSION_IMPORT_REQUEST, ImportResultForms,
+        path='conference/{websafeConferenceKey}/sessions/import',
+        http_method='POST', name='importSessions')
+    @instrument
+    def importSessions(self, request):
+        """Create many sessions of a conference in one call, reporting
+        each outcome. Every IMPORT_SESSION_BATCH sessions are stored, and
+        counted for their speakers, in one transaction, so a failed
+        import may be partly stored; retrying it with the same importId
+        and items stores only the sessions still missing."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        c_key = ndb.Key(urlsafe=request.websafeConferenceKey)
+        if not entity_cache.get(c_key):
+            raise endpoints.NotFoundException(
+                'No conference found with key: %s'
+                % request.websafeConferenceKey)
+        results = [ImportResultForm(index=i)
+                   for i in range(len(request.items))]
+        if not request.items:
+            return ImportResultForms()
+
+        # with an importId every item has the same key on every attempt,
+        # otherwise one id range for the whole batch
+        if request.importId:
+            s_keys = [ndb.Key(Session, '%s:%d' % (request.importId, i),
+                              parent=c_key)
+                      for i in range(len(request.items))]
+        else:
+            first_id, _ = Session.allocate_ids(
+                size=len(request.items), parent=c_key)
+            s_keys = [ndb.Key(Session, first_id + i, parent=c_key)
+                      for i in range(len(request.items))]
+        sessions = []
+        for i, form in enumerate(request.items):
+            try:
+                sessions.append((i, self._sessionFromForm(form, s_keys[i])))
+            except endpoints.BadRequestException, e:
+                results[i].error = str(e)
+
+        for start in range(0, len(sessions), IMPORT_SESSION_BATCH):
+            batch = sessions[start:start + IMPORT_SESSION_BATCH]
+            try:
+                stored = self._putSessionsAndCountSpeakers(
+                    c_key, [session for i, session in batch],
+                    retry=bool(request.importId))
+            except datastore_errors.Error, e:
+                for i, session in batch:
+                    results[i].error = 'Session not stored: %s' % e
+                continue
+            for i, session in batch:
+                results[i].websafeKey = session.key.urlsafe()
+            if stored:
+                self._addToSchedule(c_key, stored)
+
+        return ImportResultForms(items=results)
+
 # Task 1.2 Get conference sessions
 
     @endpoints.method(
         SESSION_GET_REQUEST, SessionForms,
         path='conference/{websafeConferenceKey}/sessions',
         http_method='GET', name='getConferenceSessions')
+    @instrument
     def getConferenceSessions(self, request):
         """Task 1.1: Given a conference, return all sessions"""
-        # create ancestor query for all key matches for this user
-        sessions = Session.query(
-            ancestor=ndb.Key(urlsafe=request.websafeConferenceKey))
-        # return individual SessionForm object per Session
-        return SessionForms(
-            items=[self._copySessionToForm(session) for session in sessions])
+        fields, wanted = _selectFields(
+            SessionForm, SESSION_FORM_FIELDS, request.select)
+        # served from the conference's cached schedule
+        schedule = self._getSchedule(
+            ndb.Key(urlsafe=request.websafeConferenceKey))
+        return self._scheduleToForms(schedule['sessions'], fields)
 
 # Task 1.3 Get sessions by type
 
     @endpoints.method(endpoints.ResourceContainer(
             message_types.VoidMessage,
             websafeConferenceKey=messages.StringField(1),
-            typeOfSession=messages.StringField(2)), SessionForms,
+            typeOfSession=messages.StringField(2),
+            select=messages.StringField(3, repeated=True)), SessionForms,
             path='conference/{websafeConferenceKey}/sessions/type',
             http_method='GET', name='getConferenceSessionsByType')
+    @instrument
     def getConferenceSessionsByType(self, request):
         """Task 1.2: Given a conference and a session type, return all sessions of a
          specified type (eg lecture, keynote, workshop)
         """
-        sessions = Session.query(
-            ancestor=ndb.Key(urlsafe=request.websafeConferenceKey))
-        sessions = sessions.filter(
-            Session.typeOfSession == request.typeOfSession)
+        fields, wanted = _selectFields(
+            SessionForm, SESSION_FORM_FIELDS, request.select)
+        schedule = self._getSchedule(
+            ndb.Key(urlsafe=request.websafeConferenceKey))
+        entries = schedule['sessions']
+        return self._scheduleToForms(
+            [entries[i] for i in schedule['byType'].get(
+                request.typeOfSession, [])], fields)
 
-        # return individual SessionForm object per Session
-        return SessionForms(
-            items=[self._copySessionToForm(session) for session in sessions])
+# Conference schedules
+
+    @staticmethod
+    def _scheduleEntry(session):
+        """Return the schedule entry (a dict of SessionForm values plus
+        the parsed times) of a session."""
+        entry = dict((name, getattr(session, name))
+                     for name, convert in SESSION_FORM_FIELDS)
+        entry['websafeKey'] = session.key.urlsafe()
+        entry['startMinutes'] = session.startMinutes
+        entry['durationMinutes'] = session.durationMinutes
+        entry['day'] = (session.sessionDate.isoformat()
+                        if session.sessionDate else None)
+        return entry
+
+    @staticmethod
+    def _getSchedule(c_key):
+        """Return the cached schedule of a conference, building it from
+        an ancestor query on a cache miss."""
+        return ConferenceApi._getSchedules([c_key])[c_key]
+
+    @staticmethod
+    def _getSchedules(c_keys):
+        """Return the schedules of conferences by key, with one memcache
+        lookup for all of the cached ones and the ancestor queries of the
+        missing ones run in parallel."""
+        schedules = memcache.get_multi([c_key.urlsafe() for c_key in c_keys],
+                                       key_prefix=MEMCACHE_SCHEDULE_PREFIX)
+        missing = [c_key for c_key in c_keys
+                   if c_key.urlsafe() not in schedules]
+        futures = [Session.query(ancestor=c_key).fetch_async()
+                   for c_key in missing]
+        built = {}
+        for c_key, future in zip(missing, futures):
+            built[c_key.urlsafe()] = buildSchedule(
+                [ConferenceApi._scheduleEntry(session)
+                 for session in future.get_result()])
+        if built:
+            # add() fails while _addToSchedule holds a lock, so a
+            # schedule missing a just added session is not cached
+            memcache.add_multi(built, key_prefix=MEMCACHE_SCHEDULE_PREFIX,
+                               time=SCHEDULE_CACHE_TTL)
+            schedules.update(built)
+
+        result = {}
+        for c_key in c_keys:
+            schedule = schedules[c_key.urlsafe()]
+            # schedules cached before byKey and byTypeDay existed lack them
+            if 'byTypeDay' not in schedule:
+                schedule = buildSchedule(schedule['sessions'])
+            result[c_key] = schedule
+        return result
+
+    @staticmethod
+    def _addToSchedule(c_key, sessions):
+        """Add newly stored sessions to the cached schedule of their
+        conference, if it is cached."""
+        cache_key = MEMCACHE_SCHEDULE_PREFIX + c_key.urlsafe()
+        client = memcache.Client()
+        for attempt in range(SCHEDULE_CAS_ATTEMPTS):
+            schedule = client.gets(cache_key)
+            if schedule is None:
+                break
+            schedule = buildSchedule(
+                schedule['sessions'] +
+                [ConferenceApi._scheduleEntry(session)
+                 for session in sessions])
+            if client.cas(cache_key, schedule, time=SCHEDULE_CACHE_TTL):
+                return
+        # not cached or contended: drop it, and keep a concurrent
+        # rebuild from caching a schedule without these sessions
+        client.delete(cache_key, seconds=SCHEDULE_LOCK_SECONDS)
+
+    def _scheduleToForms(self, entries, fields=SESSION_FORM_FIELDS):
+        """Return SessionForms of fields of schedule entries."""
+        return SessionForms(items=[
+            self._scheduleEntryToForm(entry, fields) for entry in entries])
+
+    @staticmethod
+    def _scheduleEntryToForm(entry, fields=SESSION_FORM_FIELDS):
+        """Return a SessionForm of fields of a schedule entry."""
+        return SessionForm(websafeKey=entry['websafeKey'], **dict(
+            (name, entry[name]) for name, convert in fields))
 
 # Task 1.4 Get sessions by speaker
     @endpoints.method(endpoints.ResourceContainer(
             message_types.VoidMessage,
-            speaker=messages.StringField(1)),
+            speaker=messages.StringField(1),
+            select=messages.StringField(2, repeated=True)),
             SessionForms, path='sessions/speaker',
             http_method='GET', name='getSessionsBySpeaker')
+    @instrument
     def getSessionsBySpeaker(self, request):
         """Task 1.3: Given a speaker, retrun all sessions given by
         this particular speaker, across all conferences"""
-        sessions = Session.query()
-        sessions = sessions.filter(
-            Session.speaker == request.speaker)
+        fields, wanted = _selectFields(
+            SessionForm, SESSION_FORM_FIELDS, request.select)
+        # the Speaker holds the keys of all of the speaker's sessions,
+        # whatever the spacing or case of the name
+        speaker_key = self._speakerKey(request.speaker)
+        speaker = entity_cache.get(speaker_key) if speaker_key else None
+        if not speaker:
+            return SessionForms()
+        sessions = ndb.get_multi(speaker.sessionKeys)
 
         # return individual SessionForm object per Session
-        return SessionForms(
-            items=[self._copySessionToForm(session) for session in sessions])
+        return self._copySessionsToForms(
+            (session for session in sessions if session), fields)
+
+    @endpoints.method(SPEAKER_LOOKUP_REQUEST, SpeakerForms,
+                      path='speakers', http_method='GET',
+                      name='getSpeakers')
+    @instrument
+    def getSpeakers(self, request):
+        """Return speakers whose name starts with prefix, ignoring
+        case and spacing."""
+        q = Speaker.query()
+        prefix = normalizeSpeaker(request.prefix)
+        if prefix:
+            # Speakers are keyed by normalized name, so a prefix is a
+            # key range
+            q = q.filter(Speaker.key >= ndb.Key(Speaker, prefix),
+                         Speaker.key < ndb.Key(Speaker, prefix + u'\ufffd'))
+        speakers = q.order(Speaker.key).fetch(SPEAKER_LOOKUP_LIMIT)
+        return SpeakerForms(items=[
+            SpeakerForm(name=speaker.name,
+                        sessionCount=len(speaker.sessionKeys),
+                        websafeKey=speaker.key.urlsafe())
+            for speaker in speakers])
 
 # Task 2: Add Sessions to User Wishlist
 
@@ -771,86 +2717,289 @@ class ConferenceApi(remote.Service):
             websafeSessionKey=messages.StringField(1)), BooleanMessage,
             path='wishlist',
             http_method='POST', name='addSessionToWishlist')
+    @instrument
     def addSessionToWishlist(self, request):
         """Task 2.1: Add the session to the user's list of
         sessions they are interested in attending"""
-        return self._updateWishlist(request)
+        prof = self._getWishlistProfile()
+        session_keys = self._getWishlistSessionKeys(
+            [request.websafeSessionKey])
+        self._addToWishlist(prof.key, session_keys, unique=True)
+        return BooleanMessage(data=True)
 
-    @ndb.transactional
-    def _updateWishlist(self, request, reg=True):
-        """add session to wishlist"""
+    @endpoints.method(WISHLIST_POST_REQUEST, BooleanMessage,
+                      path='wishlist/add',
+                      http_method='POST', name='addSessionsToWishlist')
+    @instrument
+    def addSessionsToWishlist(self, request):
+        """Add several sessions to the user's wishlist; sessions already
+        on it are left alone."""
+        prof = self._getWishlistProfile()
+        session_keys = self._getWishlistSessionKeys(
+            request.websafeSessionKeys)
+        self._addToWishlist(prof.key, session_keys)
+        return BooleanMessage(data=True)
 
-        # check to see if user is authoroized
-        user = endpoints.get_current_user()
-        if not user:
-            raise endpoints.UnauthorizedException('Authorization required')
-        user_id = getUserId(user)
-        profile_key = ndb.Key(Profile, user_id).get()
+    @endpoints.method(WISHLIST_POST_REQUEST, BooleanMessage,
+                      path='wishlist/remove',
+                      http_method='POST', name='removeSessionsFromWishlist')
+    @instrument
+    def removeSessionsFromWishlist(self, request):
+        """Remove several sessions from the user's wishlist."""
+        prof = self._getWishlistProfile()
+        session_keys = self._getWishlistSessionKeys(
+            request.websafeSessionKeys, check=False)
+        ndb.delete_multi([self._wishlistEntryKey(prof.key, key)
+                          for key in session_keys])
+        return BooleanMessage(data=True)
 
-        # check to see if session exists
-        websafe_session_key = request.websafeSessionKey
-        try:
-            session = ndb.Key(urlsafe=websafe_session_key).get()
-        except Exception, e:
-            print "\n", "e.__class__.__name__= ", e.__class__.__name__, "\n"
-            if e.__class__.__name__ == 'ProtocolBufferDecodeError':
-                raise endpoints.NotFoundException('session does not exist')
-
-        # check to see if session is already on the wishlist
-        if reg and websafe_session_key in profile_key.sessionKeysToAttend:
-            raise ConflictException(
-                "session has already been added to wishlist")
+    @staticmethod
+    def _wishlistEntryKey(p_key, session_key):
+        """Return the key of the WishlistEntry of a session."""
+        return ndb.Key(WishlistEntry, session_key.urlsafe(), parent=p_key)
 
-        profile_key.sessionKeysToAttend.append(websafe_session_key)
+    def _getWishlistProfile(self):
+        """Return the user's Profile with its wishlist in WishlistEntry
+        children, moving a legacy sessionKeysToAttend list over first."""
+        prof = self._getProfileFromUser()
+        if prof.sessionKeysToAttend:
+            self._migrateWishlist(prof.key)
+            entity_cache.invalidate(prof.key)
+        return prof
 
-        # write things back to the datastore & return
-        profile_key.put()
-        return BooleanMessage(data=True)
+    @ndb.transactional()
+    def _migrateWishlist(self, p_key):
+        """Move sessionKeysToAttend of a Profile to WishlistEntry
+        children; profile and entries share one entity group."""
+        prof = p_key.get()
+        session_keys = []
+        for websafe_session_key in prof.sessionKeysToAttend:
+            try:
+                session_keys.append(ndb.Key(urlsafe=websafe_session_key))
+            except Exception:
+                logging.warning('Dropping bad wishlist key %s of %s',
+                                websafe_session_key, p_key.id())
+        entries = [WishlistEntry(key=self._wishlistEntryKey(p_key, key),
+                                 session=key, conference=key.parent())
+                   for key in session_keys]
+        prof.sessionKeysToAttend = []
+        ndb.put_multi(entries + [prof])
+
+    def _getWishlistSessionKeys(self, websafe_session_keys, check=True):
+        """Return Session keys for websafe keys, raising NotFound for
+        keys that are malformed or (if check) whose session is gone."""
+        session_keys = []
+        for websafe_session_key in websafe_session_keys:
+            try:
+                key = ndb.Key(urlsafe=websafe_session_key)
+            except Exception:
+                key = None
+            if key is None or key.kind() != 'Session':
+                raise endpoints.NotFoundException(
+                    'No session found with key: %s' % websafe_session_key)
+            session_keys.append(key)
+        if check:
+            # sessions live in other entity groups, so look them up
+            # before the wishlist transaction
+            for key, session in zip(session_keys,
+                                    ndb.get_multi(session_keys)):
+                if not session:
+                    raise endpoints.NotFoundException(
+                        'No session found with key: %s' % key.urlsafe())
+        return session_keys
+
+    @ndb.transactional()
+    def _addToWishlist(self, p_key, session_keys, unique=False):
+        """Add WishlistEntry children for sessions not yet on the
+        wishlist; with unique, any session already on it is a conflict."""
+        entry_keys = [self._wishlistEntryKey(p_key, key)
+                      for key in session_keys]
+        present = set(entry.key for entry in ndb.get_multi(entry_keys)
+                      if entry)
+        if unique and present:
+            raise ConflictException(
+                "session has already been added to wishlist")
+        ndb.put_multi([
+            WishlistEntry(key=entry_key, session=key,
+                          conference=key.parent())
+            for entry_key, key in zip(entry_keys, session_keys)
+            if entry_key not in present])
 
 
 # Task 2.2 query for all the sessions in a conference
 # that the user is interested in
 
     @endpoints.method(
-        message_types.VoidMessage, SessionForms,
+        WISHLIST_GET_REQUEST, SessionForms,
         path='wishlist', http_method='GET',
         name='getSessionsInWishlist')
+    @instrument
+    @ndb.synctasklet
     def getSessionsInWishlist(self, request):
         """Task 2.2: query for all the sessions in a session
-        that the user is interested in"""
-        prof = self._getProfileFromUser()  # get user Profile
-        session_keys = [ndb.Key(
-            urlsafe=websafe_session_key)
-            for websafe_session_key in prof.sessionKeysToAttend]
-        sessions = ndb.get_multi(session_keys)
+        that the user is interested in, optionally only those of the
+        conference websafeConferenceKey"""
+        fields, wanted = _selectFields(
+            SessionForm, SESSION_FORM_FIELDS, request.select)
+        prof = self._getWishlistProfile()  # get user Profile
+        q = self._wishlistQuery(prof.key, request.websafeConferenceKey)
+
+        # entries are keyed by websafe session key: a keys-only query
+        # is all that is needed to find the sessions
+        entry_keys = yield q.fetch_async(keys_only=True)
+        session_keys = [ndb.Key(urlsafe=key.id()) for key in entry_keys]
+
+        # get sessions and, if their names are wanted, their parent
+        # conferences at the same time
+        if 'conferenceName' in wanted:
+            sessions, conferences = yield (
+                ndb.get_multi_async(session_keys),
+                entity_cache.get_multi_async(
+                    [key.parent() for key in session_keys]))
+        else:
+            sessions = yield ndb.get_multi_async(session_keys)
+            conferences = [None] * len(sessions)
 
         # return individual SessionForm object per Session
-        return SessionForms(
-            items=[self._copySessionToForm(session) for session in sessions]
-        )
+        items = []
+        for session, conf in zip(sessions, conferences):
+            if session:
+                sf = self._copySessionToForm(session, fields)
+                sf.conferenceName = getattr(conf, 'name', None)
+                items.append(sf)
+        raise ndb.Return(SessionForms(items=items))
+
+    @staticmethod
+    def _wishlistQuery(p_key, websafe_conference_key=None):
+        """Return the query for the wishlist entries of a profile,
+        optionally only those of one conference."""
+        q = WishlistEntry.query(ancestor=p_key)
+        if websafe_conference_key:
+            try:
+                c_key = ndb.Key(urlsafe=websafe_conference_key)
+            except Exception:
+                raise endpoints.NotFoundException(
+                    'No conference found with key: %s'
+                    % websafe_conference_key)
+            q = q.filter(WishlistEntry.conference == c_key)
+        return q
+
+# Personal agenda
+
+    @endpoints.method(
+        WISHLIST_GET_REQUEST, AgendaForm,
+        path='agenda', http_method='GET',
+        name='getAgenda')
+    @instrument
+    def getAgenda(self, request):
+        """Return the sessions in the user's wishlist (optionally only
+        those of the conference websafeConferenceKey) by conference and
+        day in start time order, flagging overlapping sessions and
+        suggesting alternatives of the same type."""
+        fields, wanted = _selectFields(
+            SessionForm, SESSION_FORM_FIELDS, request.select)
+        prof = self._getWishlistProfile()  # get user Profile
+        entry_keys = self._wishlistQuery(
+            prof.key, request.websafeConferenceKey).fetch(keys_only=True)
+        session_keys = [ndb.Key(urlsafe=key.id()) for key in entry_keys]
+
+        # sessions come from their conferences' cached schedules
+        c_keys = sorted(set(key.parent() for key in session_keys))
+        schedules = self._getSchedules(c_keys)
+        names = dict((conf.key, conf.name)
+                     for conf in entity_cache.get_multi(c_keys) if conf)
+
+        agenda = AgendaForm(conflictCount=0)
+        days = {}
+        for s_key in session_keys:
+            schedule = schedules[s_key.parent()]
+            i = schedule['byKey'].get(s_key.urlsafe())
+            if i is None:
+                continue
+            entry = schedule['sessions'][i]
+            if entry['day'] is None or entry['startMinutes'] is None:
+                agenda.unscheduled.append(
+                    self._scheduleEntryToForm(entry, fields))
+            else:
+                days.setdefault((s_key.parent(), entry['day']), []).append(
+                    entry)
+
+        for (c_key, day), entries in sorted(
+                days.items(),
+                key=lambda item: (item[0][1], names.get(item[0][0]))):
+            conflicts = findConflicts(entries)
+            reach = agendaReach(entries) if any(conflicts) else None
+            day_form = AgendaDayForm(
+                websafeConferenceKey=c_key.urlsafe(),
+                conferenceName=names.get(c_key), day=day)
+            for i, entry in enumerate(entries):
+                item = AgendaSessionForm(
+                    session=self._scheduleEntryToForm(entry, fields),
+                    conflictsWith=[entries[j]['websafeKey']
+                                   for j in conflicts[i]])
+                if conflicts[i]:
+                    item.alternatives = [
+                        self._scheduleEntryToForm(alt, fields)
+                        for alt in agendaAlternatives(
+                            schedules[c_key], entries, reach, i,
+                            AGENDA_ALTERNATIVES)]
+                day_form.sessions.append(item)
+            agenda.conflictCount += sum(len(c) for c in conflicts) // 2
+            agenda.days.append(day_form)
+        return agenda
 
 # Task 3 query problem: filter playground for sessions
     @endpoints.method(
         message_types.VoidMessage, SessionForms,
         path='filterPlayground_session',
         http_method='GET', name='filterPlayground_session')
+    @instrument
     def filterPlayground_session(self, request):
         """Filter Playground for sessions"""
+        # non-workshop sessions starting before 7 pm
+        sessions = self._getSessionsBeforeTime("Workshop", 19 * 60)
+        return self._copySessionsToForms(sessions)
 
-        q = Session.query().filter(Session.typeOfSession != "Workshop")
-        items_modified = []
-        items = [self._copySessionToForm(sess) for sess in q]
-        s2 = "start_time"
-        for x in range(0, len(items)):
-            string = str(items[x])
-            offset = str(items[x]).find(s2)+14
-            length = 2
-            sliced = string[offset:offset+length]
-            if sliced.isdigit() == True:
-                if int(sliced) < 19:
-                    items_modified.append(items[x])
-
-        return SessionForms(items=items_modified)
+    @endpoints.method(
+        SESSION_TIME_GET_REQUEST, SessionForms,
+        path='sessions/before',
+        http_method='GET', name='getSessionsBeforeTime')
+    @instrument
+    def getSessionsBeforeTime(self, request):
+        """Return sessions not of type excludeType that start before
+        beforeTime"""
+        before = parseTime(request.beforeTime)
+        if before is None:
+            raise endpoints.BadRequestException(
+                "'beforeTime' must be a time of day such as 19:00.")
+        fields, wanted = _selectFields(
+            SessionForm, SESSION_FORM_FIELDS, request.select)
+        sessions = self._getSessionsBeforeTime(request.excludeType, before)
+        return self._copySessionsToForms(sessions, fields)
+
+    def _getSessionsBeforeTime(self, exclude_type, before):
+        """Return sessions not of exclude_type starting before minute
+        before. Only one inequality fits in a datastore query, so the
+        side matching fewer sessions is scanned and the other condition
+        is applied in memory."""
+        annotate(filters='typeOfSession != %r AND startMinutes < %d' % (
+            exclude_type, before))
+        by_time = Session.query(Session.startMinutes < before)
+        if not exclude_type:
+            return by_time.fetch()
+        by_type = Session.query(Session.typeOfSession != exclude_type)
+
+        # keys only counts, capped, of both sides
+        time_count, type_count = [
+            future.get_result() for future in (
+                by_time.count_async(SESSION_COUNT_LIMIT),
+                by_type.count_async(SESSION_COUNT_LIMIT))]
+        if time_count <= type_count:
+            return [sess for sess in by_time
+                    if sess.typeOfSession != exclude_type]
+        return [sess for sess in by_type
+                if sess.startMinutes is not None and
+                sess.startMinutes < before]
 
 # Memcache
 
@@ -858,17 +3007,33 @@ class ConferenceApi(remote.Service):
         message_types.VoidMessage, StringMessage,
         path='conference/announcement/get',
         http_method='GET', name='getAnnouncement')
+    @instrument
     def getAnnouncement(self, request):
         """Return Announcement from memcache."""
-        return StringMessage(
-            data=memcache.get(MEMCACHE_ANNOUNCEMENTS_KEY) or "")
+        return StringMessage(data=self._getAnnouncement())
 
     @endpoints.method(
-        message_types.VoidMessage, StringMessage,
+        SPEAKER_GET_REQUEST, StringMessage,
         path='speaker',
         http_method='GET', name='getFeaturedSpeaker')
+    @instrument
     def getFeaturedSpeaker(self, request):
-        """Return featured speaker and session name from memcache."""
-        return StringMessage(data=memcache.get(MEMCACHE_SPEAKER_KEY) or "")
+        """Return featured speaker and session names from memcache, for
+        the given conference or else the most recently featured one."""
+        if not request.websafeConferenceKey:
+            return StringMessage(
+                data=memcache.get(MEMCACHE_SPEAKER_KEY) or "")
+
+        cache_key = MEMCACHE_CONF_SPEAKER_PREFIX + request.websafeConferenceKey
+        featured = memcache.get(cache_key)
+        if featured is None:
+            record = ndb.Key(
+                FeaturedSpeaker, FEATURED_SPEAKER_ID,
+                parent=ndb.Key(urlsafe=request.websafeConferenceKey)).get()
+            featured = SPEAKER_TPL % (
+                record.speaker, ', '.join(record.sessionNames)
+            ) if record else ""
+            memcache.set(cache_key, featured)
+        return StringMessage(data=featured)
 
 api = endpoints.api_server([ConferenceApi])  # register API
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+"""conference_search.py
+
+Udacity conference server-side Python App Engine conference search
+
+SearchApiIndex keeps the conference documents of local_index.py in the
+App Engine Search API.  getIndex() returns it, or the in-process
+LocalIndex with the same behaviour when settings.SEARCH_BACKEND is
+'local'.
+
+"""
+
+from google.appengine.api import search
+
+from local_index import ATOM_FIELDS
+from local_index import LocalIndex
+from local_index import MAX_SEARCH_OFFSET
+from local_index import NUMBER_FIELDS
+from local_index import SearchResult
+from local_index import tokenize
+from settings import SEARCH_BACKEND
+
+CONFERENCE_INDEX_NAME = 'conferences'
+
+
+class SearchApiIndex(object):
+    """SearchApiIndex -- conference documents in an App Engine Search
+    API index"""
+
+    def __init__(self, name=CONFERENCE_INDEX_NAME):
+        self.index = search.Index(name=name)
+
+    @staticmethod
+    def _document(doc):
+        fields = [
+            search.TextField(name='name', value=doc['name']),
+            search.TextField(name='description', value=doc['description']),
+            search.AtomField(name='city', value=doc['city']),
+        ]
+        fields.extend(search.AtomField(name='topics', value=topic)
+                      for topic in doc['topics'])
+        fields.extend(search.NumberField(name=field, value=doc[field])
+                      for field in NUMBER_FIELDS)
+        facets = [search.AtomFacet(name='month', value=str(doc['month']))]
+        if doc['city']:
+            facets.append(search.AtomFacet(name='city', value=doc['city']))
+        facets.extend(search.AtomFacet(name='topics', value=topic)
+                      for topic in doc['topics'] if topic)
+        return search.Document(doc_id=doc['id'], fields=fields,
+                               facets=facets)
+
+    def put(self, docs):
+        """Add or replace documents."""
+        docs = [self._document(doc) for doc in docs]
+        for i in range(0, len(docs),
+                       search.MAXIMUM_DOCUMENTS_PER_PUT_REQUEST):
+            self.index.put(
+                docs[i:i + search.MAXIMUM_DOCUMENTS_PER_PUT_REQUEST])
+
+    def delete(self, doc_ids):
+        """Remove documents by id."""
+        doc_ids = list(doc_ids)
+        for i in range(0, len(doc_ids),
+                       search.MAXIMUM_DOCUMENTS_PER_PUT_REQUEST):
+            self.index.delete(
+                doc_ids[i:i + search.MAXIMUM_DOCUMENTS_PER_PUT_REQUEST])
+
+    @staticmethod
+    def _quote(value):
+        return u'"%s"' % unicode(value).replace(u'"', u' ')
+
+    @staticmethod
+    def _comparison(field, op, value):
+        if field in ATOM_FIELDS:
+            value = SearchApiIndex._quote(value)
+        if op == '!=':
+            return u'NOT %s = %s' % (field, value)
+        return u'%s %s %s' % (field, op, value)
+
+    def _queryString(self, query):
+        terms = [self._quote(token) for token in tokenize(query.text)]
+        terms.extend(self._comparison(*filtr) for filtr in query.filters)
+        for field, ranges in sorted(query.ranges.items()):
+            alternatives = []
+            for low, high in ranges:
+                bounds = []
+                if low is not None:
+                    bounds.append(self._comparison(field, '>=', low))
+                if high is not None:
+                    bounds.append(self._comparison(field, '<=', high))
+                alternatives.append(u'(%s)' % u' AND '.join(bounds))
+            terms.append(u'(%s)' % u' OR '.join(alternatives))
+        return u' '.join(terms)
+
+    def search(self, query):
+        """Return the SearchResult of a SearchQuery."""
+        options = search.QueryOptions(
+            limit=query.limit,
+            offset=query.offset,
+            ids_only=True,
+            number_found_accuracy=MAX_SEARCH_OFFSET,
+            sort_options=search.SortOptions(expressions=[
+                search.SortExpression(
+                    expression='name', default_value='',
+                    direction=search.SortExpression.ASCENDING)]))
+        results = self.index.search(search.Query(
+            query_string=self._queryString(query), options=options,
+            return_facets=list(query.facets)))
+
+        facets = {}
+        for facet in results.facets:
+            values = [(value.label, value.count) for value in facet.values]
+            if facet.name == 'month':
+                values = [(int(label), count) for label, count in values]
+            facets[facet.name] = values
+        return SearchResult([doc.doc_id for doc in results.results],
+                            results.number_found, facets)
+
+
+_index = None
+
+
+def getIndex():
+    """Return the conference index selected by settings.SEARCH_BACKEND."""
+    global _index
+    if _index is None:
+        _index = LocalIndex() if SEARCH_BACKEND == 'local' \
+            else SearchApiIndex()
+    return _index
+
+
+def setIndex(index):
+    """Use index as the conference index, e.g. a LocalIndex in tests."""
+    global _index
+    _index = index
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+"""local_index.py
+
+Udacity conference server-side Python App Engine conference search
+documents, queries and in-process index
+
+Conferences are indexed as documents with their text (name, description),
+exact-match fields (city, topics) and numbers (month, maxAttendees,
+seatsAvailable).  A free text term matches a word of the text or a whole
+city or topic, as in the Search API.  A search ANDs free text terms,
+comparisons on any number of fields and, per field, an OR of ranges, and
+can count matches per facet value.  LocalIndex is an in-process inverted
+index with the behaviour of the Search API backend in conference_search.py,
+for tests and the benchmark.
+
+"""
+
+import collections
+import operator
+import re
+import threading
+
+# fields matched as whole values, and numeric fields
+ATOM_FIELDS = ('city', 'topics')
+NUMBER_FIELDS = ('month', 'maxAttendees', 'seatsAvailable')
+FACET_FIELDS = ('city', 'topics', 'month')
+# the Search API returns at most this many results past the offset
+MAX_SEARCH_OFFSET = 1000
+
+TOKEN_RE = re.compile(r'\w+', re.U)
+
+COMPARISONS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+
+class SearchQuery(collections.namedtuple(
+        'SearchQuery', 'text filters ranges facets limit offset')):
+    """SearchQuery -- text to match, (field, operator, value) filters,
+    {field: [(low, high), ...]} ranges (one end may be None), facet
+    fields to count, and the page to return"""
+    __slots__ = ()
+
+
+class SearchResult(collections.namedtuple(
+        'SearchResult', 'ids total facets')):
+    """SearchResult -- websafe conference keys of the page in name order,
+    total matches and {field: [(value, count), ...]}"""
+    __slots__ = ()
+
+
+def tokenize(text):
+    """Return the lower case words of text."""
+    return TOKEN_RE.findall((text or u'').lower())
+
+
+def conferenceDocument(conf):
+    """Return the searchable fields of a Conference as a dict."""
+    return {
+        'id': conf.key.urlsafe(),
+        'name': conf.name or u'',
+        'description': conf.description or u'',
+        'city': conf.city or u'',
+        'topics': list(conf.topics or []),
+        'month': conf.month or 0,
+        'maxAttendees': conf.maxAttendees or 0,
+        'seatsAvailable': conf.seatsAvailable or 0,
+    }
+
+
+class LocalIndex(object):
+    """LocalIndex -- in-process inverted index of conference documents"""
+
+    def __init__(self):
+        self._docs = {}
+        self._postings = collections.defaultdict(set)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _tokens(doc):
+        # atom fields are not split into words: only their whole
+        # values match
+        words = set(tokenize(u' '.join([doc['name'], doc['description']])))
+        words.update(value.lower() for value in [doc['city']] + doc['topics']
+                     if value)
+        return words
+
+    def put(self, docs):
+        """Add or replace documents."""
+        with self._lock:
+            for doc in docs:
+                self._remove(doc['id'])
+                self._docs[doc['id']] = doc
+                for token in self._tokens(doc):
+                    self._postings[token].add(doc['id'])
+
+    def delete(self, doc_ids):
+        """Remove documents by id."""
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        doc = self._docs.pop(doc_id, None)
+        if doc:
+            for token in self._tokens(doc):
+                self._postings[token].discard(doc_id)
+                if not self._postings[token]:
+                    del self._postings[token]
+
+    @staticmethod
+    def _values(doc, field):
+        value = doc[field]
+        if field in ATOM_FIELDS:
+            values = value if isinstance(value, list) else [value]
+            return [v.lower() for v in values]
+        return [value]
+
+    def _matches(self, doc, query):
+        for field, op, value in query.filters:
+            if field in ATOM_FIELDS:
+                value = value.lower()
+            values = self._values(doc, field)
+            if op == '!=':
+                # NOT field = value excludes a document if any of its
+                # values is equal
+                if value in values:
+                    return False
+                continue
+            compare = COMPARISONS[op]
+            if not any(compare(v, value) for v in values):
+                return False
+        for field, ranges in query.ranges.items():
+            if not any((low is None or v >= low) and
+                       (high is None or v <= high)
+                       for v in self._values(doc, field)
+                       for low, high in ranges):
+                return False
+        return True
+
+    def search(self, query):
+        """Return the SearchResult of a SearchQuery."""
+        with self._lock:
+            ids = None
+            for token in set(tokenize(query.text)):
+                postings = self._postings.get(token, set())
+                ids = postings.copy() if ids is None else ids & postings
+            if ids is None:
+                ids = set(self._docs)
+            docs = [self._docs[doc_id] for doc_id in ids
+                    if self._matches(self._docs[doc_id], query)]
+
+        docs.sort(key=lambda doc: (doc['name'], doc['id']))
+        facets = {}
+        for field in query.facets:
+            counts = collections.Counter()
+            for doc in docs:
+                counts.update(set(
+                    value for value in (doc[field]
+                                        if isinstance(doc[field], list)
+                                        else [doc[field]])
+                    if value != u''))
+            facets[field] = sorted(
+                counts.items(), key=lambda item: (-item[1], item[0]))
+        page = docs[query.offset:query.offset + query.limit]
+        return SearchResult([doc['id'] for doc in page], len(docs), facets)
@@ -1,7 +1,9 @@
+import json
 import webapp2
 from google.appengine.api import app_identity
 from google.appengine.api import mail
 from conference import ConferenceApi
+import metrics
 
 # !/usr/bin/env python
 
@@ -18,41 +20,189 @@ created by wesc on 2014 may 24
 __author__ = 'wesc+api@google.com (Wesley Chun)'
 
 
-class SetAnnouncementHandler(webapp2.RequestHandler):
+class InstrumentedHandler(webapp2.RequestHandler):
+    def dispatch(self):
+        """Record metrics of the request under the handler's name."""
+        with metrics.record(self.__class__.__name__):
+            return super(InstrumentedHandler, self).dispatch()
+
+
+class MetricsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Return this instance's request metrics as JSON."""
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(metrics.snapshot(), indent=2))
+
+    def post(self):
+        """Reset this instance's request metrics."""
+        metrics.registry.reset()
+        self.response.set_status(204)
+
+
+class SetAnnouncementHandler(InstrumentedHandler):
     def get(self):
         """Set Announcement in Memcache."""
         ConferenceApi._cacheAnnouncement()
         self.response.set_status(204)
 
 
-class SendConfirmationEmailHandler(webapp2.RequestHandler):
+class ReconcileStatsHandler(InstrumentedHandler):
+    def get(self):
+        """Rebuild the conference statistics rollups."""
+        ConferenceApi._reconcileStats()
+        self.response.set_status(204)
+
+    def post(self):
+        """Rebuild the conference statistics rollups, as a task."""
+        self.get()
+
+
+class FoldStatsHandler(InstrumentedHandler):
+    def post(self):
+        """Fold queued deltas into the conference statistics rollups."""
+        ConferenceApi._foldStats()
+        self.response.set_status(204)
+
+
+class SendConfirmationEmailHandler(InstrumentedHandler):
     def post(self):
-        """Send email confirming Conference creation."""
+        """Send the emails confirming Conference creation queued in
+        this window, one email per organizer and batch."""
+        while True:
+            tasks, emails = ConferenceApi._leaseConfirmationEmails()
+            if not tasks:
+                break
+            for email, conference_infos in emails.items():
+                self.sendConfirmationEmail(email, conference_infos)
+            ConferenceApi._deleteConfirmationEmails(tasks)
+        self.response.set_status(204)
+
+    @staticmethod
+    def sendConfirmationEmail(email, conference_infos):
+        """Send email confirming the creation of conferences."""
+        if len(conference_infos) == 1:
+            subject = 'You created a new Conference!'
+            body = 'Hi, you have created a following conference:'
+        else:
+            subject = 'You created %d new Conferences!' % (
+                len(conference_infos))
+            body = 'Hi, you have created the following conferences:'
         mail.send_mail(
             'noreply@%s.appspotmail.com' % (
                 app_identity.get_application_id()),     # from
-            self.request.get('email'),                  # to
-            'You created a new Conference!',            # subj
-            'Hi, you have created a following '         # body
-            'conference:\r\n\r\n%s' % self.request.get(
-                'conferenceInfo')
+            email,                                      # to
+            subject,                                    # subj
+            '%s\r\n\r\n%s' % (                          # body
+                body, '\r\n\r\n'.join(conference_infos))
         )
 
 
-class SetFeaturedSpeakerHandler(webapp2.RequestHandler):
+class SetFeaturedSpeakerHandler(InstrumentedHandler):
     def post(self):
-        """Set Announcement in Memcache."""
-        session_speaker = self.request.get('session_speaker')
-        session_name = self.request.get('session_name')
-        conf_key = self.request.get('conf_key')
+        """Set Featured Speaker of a Conference in Memcache."""
         ConferenceApi._setFeaturedSpeaker(
-            session_speaker, session_name, conf_key)
+            self.request.get('websafeConferenceKey'))
+        self.response.set_status(204)
+
+
+class SyncSeatsAvailableHandler(InstrumentedHandler):
+    def post(self):
+        """Fold seat shard totals into Conference.seatsAvailable."""
+        ConferenceApi._syncSeatsAvailable(
+            self.request.get('websafeConferenceKey'))
+        self.response.set_status(204)
+
+
+class RenameAttendeeHandler(InstrumentedHandler):
+    def post(self):
+        """Copy a user's displayName onto the next batch of rosters."""
+        ConferenceApi._renameAttendee(self.request.get('profile'),
+                                      self.request.get('cursor'))
+        self.response.set_status(204)
+
+
+class MigrateSessionTimesHandler(InstrumentedHandler):
+    def get(self):
+        """Start parsing the time fields of existing sessions."""
+        ConferenceApi._migrateSessionTimes()
+        self.response.set_status(204)
+
+    def post(self):
+        """Parse the time fields of the next batch of sessions."""
+        ConferenceApi._migrateSessionTimes(self.request.get('cursor'))
+        self.response.set_status(204)
+
+
+class MigrateCalendarWeeksHandler(InstrumentedHandler):
+    def get(self):
+        """Start filling in the calendar weeks of existing conferences."""
+        ConferenceApi._migrateCalendarWeeks()
+        self.response.set_status(204)
+
+    def post(self):
+        """Fill in the calendar weeks of the next batch of conferences."""
+        ConferenceApi._migrateCalendarWeeks(self.request.get('cursor'))
+        self.response.set_status(204)
+
+
+class IndexSpeakersHandler(InstrumentedHandler):
+    def post(self):
+        """Add new sessions to their speakers' session lists."""
+        ConferenceApi._indexSpeakerSessions(
+            self.request.get_all('websafeSessionKey'))
+        self.response.set_status(204)
+
+
+class MigrateSessionSpeakersHandler(InstrumentedHandler):
+    def get(self):
+        """Start indexing existing sessions by speaker."""
+        ConferenceApi._migrateSessionSpeakers()
+        self.response.set_status(204)
+
+    def post(self):
+        """Index the next batch of sessions by speaker."""
+        ConferenceApi._migrateSessionSpeakers(self.request.get('cursor'))
+        self.response.set_status(204)
+
+
+class MigrateSpeakerCountsHandler(InstrumentedHandler):
+    def get(self):
+        """Start re-keying speaker counters by normalized name."""
+        ConferenceApi._migrateSpeakerCounts()
+        self.response.set_status(204)
+
+    def post(self):
+        """Re-key the speaker counters of the next batch of conferences."""
+        ConferenceApi._migrateSpeakerCounts(self.request.get('cursor'))
+        self.response.set_status(204)
+
+
+class ReindexConferencesHandler(InstrumentedHandler):
+    def get(self):
+        """Start rebuilding the conference search index."""
+        ConferenceApi._reindexConferences()
+        self.response.set_status(204)
+
+    def post(self):
+        """Re-index the next batch of conferences."""
+        ConferenceApi._reindexConferences(self.request.get('cursor'))
         self.response.set_status(204)
 
 
 app = webapp2.WSGIApplication([
     ('/crons/set_announcement', SetAnnouncementHandler),
+    ('/crons/reconcile_stats', ReconcileStatsHandler),
     ('/tasks/send_confirmation_email', SendConfirmationEmailHandler),
+    ('/tasks/fold_stats', FoldStatsHandler),
     ('/tasks/set_featured_speaker', SetFeaturedSpeakerHandler),
+    ('/tasks/sync_seats', SyncSeatsAvailableHandler),
+    ('/tasks/rename_attendee', RenameAttendeeHandler),
+    ('/tasks/migrate_session_times', MigrateSessionTimesHandler),
+    ('/tasks/migrate_calendar_weeks', MigrateCalendarWeeksHandler),
+    ('/tasks/index_speakers', IndexSpeakersHandler),
+    ('/tasks/migrate_session_speakers', MigrateSessionSpeakersHandler),
+    ('/tasks/migrate_speaker_counts', MigrateSpeakerCountsHandler),
+    ('/tasks/reindex_conferences', ReindexConferencesHandler),
+    ('/admin/metrics', MetricsHandler),
 
 ], debug=True)
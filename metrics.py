@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+"""metrics.py
+
+Udacity conference server-side Python App Engine request metrics
+
+Endpoint methods wrapped in @instrument and task handlers run under
+record() measure their wall time, API RPCs by service, datastore entities
+fetched and memcache and entity cache hits.  apiproxy hooks attribute
+RPCs to the request running on the current thread.  Totals, latency
+histograms and a log of slow requests, with the query filters they ran,
+are kept in memory per instance; snapshot() returns them for the admin
+metrics handler.
+
+"""
+
+import bisect
+import collections
+import contextlib
+import functools
+import threading
+import time
+
+from google.appengine.api import apiproxy_stub_map
+
+from settings import SLOW_LOG_SIZE
+from settings import SLOW_REQUEST_MS
+
+# upper bounds, in milliseconds, of the latency histogram buckets; the
+# last bucket holds everything slower
+HISTOGRAM_BOUNDS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class RequestMetrics(object):
+    """RequestMetrics -- what one request did"""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.time()
+        self.elapsed_ms = None
+        self.rpcs = collections.Counter()
+        self.counts = collections.Counter()
+        self.annotations = {}
+
+
+class Registry(object):
+    """Registry -- in-memory totals of finished requests by name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._requests = collections.defaultdict(lambda: {
+                'calls': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'histogram': [0] * (len(HISTOGRAM_BOUNDS_MS) + 1),
+                'rpcs': collections.Counter(),
+                'counts': collections.Counter(),
+            })
+            self._slow = collections.deque(maxlen=SLOW_LOG_SIZE)
+
+    def add(self, metrics):
+        """Add a finished request."""
+        with self._lock:
+            totals = self._requests[metrics.name]
+            totals['calls'] += 1
+            totals['total_ms'] += metrics.elapsed_ms
+            totals['max_ms'] = max(totals['max_ms'], metrics.elapsed_ms)
+            totals['histogram'][bisect.bisect_left(
+                HISTOGRAM_BOUNDS_MS, metrics.elapsed_ms)] += 1
+            totals['rpcs'].update(metrics.rpcs)
+            totals['counts'].update(metrics.counts)
+            if metrics.elapsed_ms >= SLOW_REQUEST_MS:
+                self._slow.append({
+                    'name': metrics.name,
+                    'start': metrics.start,
+                    'ms': round(metrics.elapsed_ms, 1),
+                    'rpcs': dict(metrics.rpcs),
+                    'counts': dict(metrics.counts),
+                    'annotations': metrics.annotations,
+                })
+
+    def snapshot(self):
+        """Return the totals by request name and the slow request log."""
+        with self._lock:
+            requests = {}
+            for name, totals in self._requests.items():
+                counts = totals['counts']
+                requests[name] = {
+                    'calls': totals['calls'],
+                    'mean_ms': round(
+                        totals['total_ms'] / totals['calls'], 1),
+                    'max_ms': round(totals['max_ms'], 1),
+                    'histogram': self._histogram(totals['histogram']),
+                    'rpcs_per_call': dict(
+                        (rpc, float(count) / totals['calls'])
+                        for rpc, count in totals['rpcs'].items()),
+                    'entities_per_call': (
+                        float(counts['entities']) / totals['calls']),
+                    'memcache_hit_ratio': _ratio(
+                        counts['memcache_hits'], counts['memcache_misses']),
+                    'entity_cache_hit_ratio': _ratio(
+                        counts['entity_cache_local_hits'] +
+                        counts['entity_cache_memcache_hits'],
+                        counts['entity_cache_misses']),
+                }
+            return {'requests': requests, 'slow': list(self._slow)}
+
+    @staticmethod
+    def _histogram(buckets):
+        labels = ['<=%d' % bound for bound in HISTOGRAM_BOUNDS_MS]
+        labels.append('>%d' % HISTOGRAM_BOUNDS_MS[-1])
+        return collections.OrderedDict(zip(labels, buckets))
+
+
+def _ratio(hits, misses):
+    return float(hits) / (hits + misses) if hits + misses else None
+
+
+registry = Registry()
+_local = threading.local()
+_hooks_lock = threading.Lock()
+_hooks_installed = False
+
+
+def current():
+    """Return the RequestMetrics of this thread's request, or None."""
+    return getattr(_local, 'metrics', None)
+
+
+def count(name, value=1):
+    """Add value to a counter of the current request."""
+    metrics = current()
+    if metrics:
+        metrics.counts[name] += value
+
+
+def annotate(**fields):
+    """Attach fields, such as query filters, to the current request; they
+    are shown in the slow request log."""
+    metrics = current()
+    if metrics:
+        metrics.annotations.update(fields)
+
+
+def _preCall(service, call, request, response):
+    metrics = current()
+    if metrics:
+        metrics.rpcs['%s.%s' % (service, call)] += 1
+
+
+def _postCall(service, call, request, response):
+    metrics = current()
+    if not metrics:
+        return
+    if service == 'datastore_v3':
+        if call == 'Get':
+            metrics.counts['entities'] += sum(
+                1 for entity in response.entity_list()
+                if entity.has_entity())
+        elif call in ('RunQuery', 'Next'):
+            metrics.counts['entities'] += response.result_size()
+    elif service == 'memcache' and call == 'Get':
+        hits = response.item_size()
+        metrics.counts['memcache_hits'] += hits
+        metrics.counts['memcache_misses'] += request.key_size() - hits
+
+
+def installHooks():
+    """Attribute API calls to requests; safe to call more than once."""
+    global _hooks_installed
+    with _hooks_lock:
+        if not _hooks_installed:
+            apiproxy = apiproxy_stub_map.apiproxy
+            apiproxy.GetPreCallHooks().Append('metrics', _preCall)
+            apiproxy.GetPostCallHooks().Append('metrics', _postCall)
+            _hooks_installed = True
+
+
+@contextlib.contextmanager
+def record(name):
+    """Measure the code run in the block as the request name; nested
+    blocks count towards the outer request."""
+    if current():
+        yield current()
+        return
+    installHooks()
+    metrics = _local.metrics = RequestMetrics(name)
+    try:
+        yield metrics
+    finally:
+        metrics.elapsed_ms = (time.time() - metrics.start) * 1000
+        _local.metrics = None
+        registry.add(metrics)
+
+
+def instrument(func):
+    """Decorator recording every call of an endpoint method."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with record(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def snapshot():
+    """Return the metrics recorded by this instance."""
+    return registry.snapshot()
@@ -30,8 +30,9 @@ class Profile(ndb.Model):
     displayName = ndb.StringProperty()
     mainEmail = ndb.StringProperty()
     teeShirtSize = ndb.StringProperty(default='NOT_SPECIFIED')
+    # legacy registrations; moved to Registration children on first use
     conferenceKeysToAttend = ndb.StringProperty(repeated=True)
-    # wishlist information
+    # legacy wishlist; moved to WishlistEntry children on first use
     sessionKeysToAttend = ndb.StringProperty(repeated=True)
 
 
@@ -47,7 +48,7 @@ class ProfileForm(messages.Message):
     mainEmail = messages.StringField(2)
     teeShirtSize = messages.EnumField('TeeShirtSize', 3)
     conferenceKeysToAttend = messages.StringField(4, repeated=True)
-    # new --- Wishlist
+    # legacy wishlist, empty once migrated -- see getSessionsInWishlist
     sessionKeysToAttend = messages.StringField(5, repeated=True)
 
 
@@ -68,6 +69,9 @@ class Conference(ndb.Model):
     name = ndb.StringProperty(required=True)
     description = ndb.StringProperty()
     organizerUserId = ndb.StringProperty()
+    # copy of the organizer's Profile.displayName, kept current by
+    # saveProfile so listings need not fetch the organizer
+    organizerDisplayName = ndb.StringProperty(indexed=False)
     topics = ndb.StringProperty(repeated=True)
     city = ndb.StringProperty()
     startDate = ndb.DateProperty()
@@ -75,6 +79,48 @@ class Conference(ndb.Model):
     endDate = ndb.DateProperty()
     maxAttendees = ndb.IntegerProperty()
     seatsAvailable = ndb.IntegerProperty()
+    # utils.weekNumber of every calendar week from startDate through
+    # endDate, so date window queries are equality lookups
+    calendarWeeks = ndb.IntegerProperty(repeated=True)
+    # number of SeatShard entities holding this conference's seats;
+    # 0 until the seats have been sharded
+    seatShards = ndb.IntegerProperty(default=0)
+
+
+class SeatShard(ndb.Model):
+    """SeatShard -- one slice of a Conference's available seats"""
+    seats = ndb.IntegerProperty(default=0, indexed=False)
+
+
+class StatsRollup(ndb.Model):
+    """StatsRollup -- rollup counters of conferences, seats and sessions;
+    a single entity, written only by the stats folding and rebuild
+    tasks"""
+    counts = ndb.JsonProperty(indexed=False)
+    # time.time() the last rebuild started at; it counted older deltas
+    rebuiltAt = ndb.FloatProperty(indexed=False, default=0.0)
+    # STATS_VERSION of the rebuild that wrote the counters
+    version = ndb.IntegerProperty(indexed=False, default=0)
+
+
+class StatCountForm(messages.Message):
+    """StatCountForm -- count of one city, month, topic or type"""
+    name = messages.StringField(1)
+    count = messages.IntegerField(2)
+
+
+class ConferenceStatsForm(messages.Message):
+    """ConferenceStatsForm -- conference statistics outbound message"""
+    conferences = messages.IntegerField(1)
+    seats = messages.IntegerField(2)
+    seatsSold = messages.IntegerField(3)
+    sessions = messages.IntegerField(4)
+    conferencesByCity = messages.MessageField(StatCountForm, 5, repeated=True)
+    conferencesByMonth = messages.MessageField(
+        StatCountForm, 6, repeated=True)
+    conferencesByTopic = messages.MessageField(
+        StatCountForm, 7, repeated=True)
+    sessionsByType = messages.MessageField(StatCountForm, 8, repeated=True)
 
 
 class ConferenceForm(messages.Message):
@@ -96,6 +142,52 @@ class ConferenceForm(messages.Message):
 class ConferenceForms(messages.Message):
     """ConferenceForms -- multiple Conference outbound form message"""
     items = messages.MessageField(ConferenceForm, 1, repeated=True)
+    # opaque cursor of the next page, if there may be one
+    nextPageToken = messages.StringField(2)
+    # how queryConferences ran the query, for debugging
+    queryPlan = messages.StringField(3)
+
+
+class Registration(ndb.Model):
+    """Registration -- a Profile's seat at a Conference; child of the
+    Profile keyed by the websafe Conference key"""
+    conference = ndb.KeyProperty(kind='Conference', indexed=False)
+    registered = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+
+
+class ConferenceAttendee(ndb.Model):
+    """ConferenceAttendee -- roster copy of a Registration; a root entity
+    keyed by conference and user, so registering does not write to the
+    Conference entity group"""
+    conference = ndb.KeyProperty(kind='Conference')
+    profile = ndb.KeyProperty(kind='Profile')
+    displayName = ndb.StringProperty(indexed=False)
+    registered = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+
+
+class AttendeeForm(messages.Message):
+    """AttendeeForm -- ConferenceAttendee outbound form message"""
+    displayName = messages.StringField(1)
+    registered = messages.StringField(2)
+
+
+class AttendeeForms(messages.Message):
+    """AttendeeForms -- one page of a Conference's attendees"""
+    items = messages.MessageField(AttendeeForm, 1, repeated=True)
+    attendeeCount = messages.IntegerField(2)
+    nextPageToken = messages.StringField(3)
+
+
+class ImportResultForm(messages.Message):
+    """ImportResultForm -- outcome of one item of a bulk import"""
+    index = messages.IntegerField(1)
+    websafeKey = messages.StringField(2)
+    error = messages.StringField(3)
+
+
+class ImportResultForms(messages.Message):
+    """ImportResultForms -- per item outcomes of a bulk import"""
+    items = messages.MessageField(ImportResultForm, 1, repeated=True)
 
 
 class TeeShirtSize(messages.Enum):
@@ -128,6 +220,50 @@ class ConferenceQueryForms(messages.Message):
     """ConferenceQueryForms -- multiple ConferenceQueryForm
      inbound form message"""
     filters = messages.MessageField(ConferenceQueryForm, 1, repeated=True)
+    pageSize = messages.IntegerField(2)
+    # nextPageToken of the previous page
+    pageToken = messages.StringField(3)
+    # ConferenceForm fields to return; all of them if empty
+    select = messages.StringField(4, repeated=True)
+
+
+class ConferenceSearchRange(messages.Message):
+    """ConferenceSearchRange -- inclusive range of a numeric field;
+    either end may be left out"""
+    field = messages.StringField(1)
+    low = messages.IntegerField(2)
+    high = messages.IntegerField(3)
+
+
+class ConferenceSearchForm(messages.Message):
+    """ConferenceSearchForm -- Conference search inbound form message"""
+    query = messages.StringField(1)
+    filters = messages.MessageField(ConferenceQueryForm, 2, repeated=True)
+    # ranges on the same field are ORed, all else is ANDed
+    ranges = messages.MessageField(ConferenceSearchRange, 3, repeated=True)
+    facets = messages.StringField(4, repeated=True)
+    pageSize = messages.IntegerField(5)
+    pageToken = messages.StringField(6)
+
+
+class FacetValueForm(messages.Message):
+    """FacetValueForm -- matches with one value of a facet"""
+    value = messages.StringField(1)
+    count = messages.IntegerField(2)
+
+
+class FacetForm(messages.Message):
+    """FacetForm -- match counts per value of a facet"""
+    field = messages.StringField(1)
+    values = messages.MessageField(FacetValueForm, 2, repeated=True)
+
+
+class ConferenceSearchForms(messages.Message):
+    """ConferenceSearchForms -- Conference search outbound form message"""
+    items = messages.MessageField(ConferenceForm, 1, repeated=True)
+    facets = messages.MessageField(FacetForm, 2, repeated=True)
+    total = messages.IntegerField(3)
+    nextPageToken = messages.StringField(4)
 
 # Session models
 
@@ -141,6 +277,12 @@ class Session(ndb.Model):
     typeOfSession = ndb.StringProperty()
     date = ndb.StringProperty()
     start_time = ndb.StringProperty()
+    # parsed forms of start_time, date and duration
+    startMinutes = ndb.IntegerProperty()
+    sessionDate = ndb.DateProperty()
+    durationMinutes = ndb.IntegerProperty(indexed=False)
+    # canonical Speaker of the speaker field
+    speakerKey = ndb.KeyProperty(kind='Speaker')
 
 
 class SessionForm(messages.Message):
@@ -153,6 +295,7 @@ class SessionForm(messages.Message):
     date = messages.StringField(6)
     start_time = messages.StringField(7)
     websafeKey = messages.StringField(8)
+    conferenceName = messages.StringField(9)
 
 
 class SessionForms(messages.Message):
@@ -160,6 +303,32 @@ class SessionForms(messages.Message):
     items = messages.MessageField(SessionForm, 1, repeated=True)
 
 
+class AgendaSessionForm(messages.Message):
+    """AgendaSessionForm -- a wishlisted session on a user's agenda"""
+    session = messages.MessageField(SessionForm, 1)
+    # websafe keys of the agenda sessions it overlaps
+    conflictsWith = messages.StringField(2, repeated=True)
+    # sessions of the same type and day that would not overlap
+    alternatives = messages.MessageField(SessionForm, 3, repeated=True)
+
+
+class AgendaDayForm(messages.Message):
+    """AgendaDayForm -- a user's sessions on one day of a conference"""
+    websafeConferenceKey = messages.StringField(1)
+    conferenceName = messages.StringField(2)
+    day = messages.StringField(3)
+    sessions = messages.MessageField(AgendaSessionForm, 4, repeated=True)
+
+
+class AgendaForm(messages.Message):
+    """AgendaForm -- a user's wishlist as an agenda outbound message"""
+    days = messages.MessageField(AgendaDayForm, 1, repeated=True)
+    # wishlisted sessions without a day or start time
+    unscheduled = messages.MessageField(SessionForm, 2, repeated=True)
+    # pairs of overlapping sessions
+    conflictCount = messages.IntegerField(3)
+
+
 class SessionQueryForm(messages.Message):
     """SessionQueryForm -- Session query inbound form message"""
     field = messages.StringField(1)
@@ -171,12 +340,50 @@ class SessionQueryForms(messages.Message):
     """SessionQueryForms -- multiple SessionQueryForm inbound form message"""
     filters = messages.MessageField(SessionQueryForm, 1, repeated=True)
 
+
+class WishlistEntry(ndb.Model):
+    """WishlistEntry -- one wishlisted Session; child of the Profile
+    keyed by the websafe Session key"""
+    session = ndb.KeyProperty(kind='Session', indexed=False)
+    conference = ndb.KeyProperty(kind='Conference')
+    added = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+
 # Speaker models
 
 
+class Speaker(ndb.Model):
+    """Speaker object -- keyed by normalized speaker name, with the
+    keys of the speaker's sessions across all conferences"""
+    name = ndb.StringProperty(indexed=False)
+    sessionKeys = ndb.KeyProperty(kind='Session', repeated=True,
+                                  indexed=False)
+
+
+class SpeakerForm(messages.Message):
+    """SpeakerForm -- Speaker outbound form message"""
+    name = messages.StringField(1)
+    sessionCount = messages.IntegerField(2)
+    websafeKey = messages.StringField(3)
+
+
+class SpeakerForms(messages.Message):
+    """SpeakerForms -- multiple Speaker outbound form message"""
+    items = messages.MessageField(SpeakerForm, 1, repeated=True)
+
+
 class FeaturedSpeaker(ndb.Model):
-    """FeaturedSpeaker object"""
+    """FeaturedSpeaker object -- child of its Conference"""
     speaker = ndb.StringProperty()
+    sessionNames = ndb.StringProperty(repeated=True, indexed=False)
+
+
+class SpeakerSessionCount(ndb.Model):
+    """SpeakerSessionCount -- sessions of one speaker at a Conference;
+    child of the Conference keyed by speaker name"""
+    speaker = ndb.StringProperty(indexed=False)
+    count = ndb.IntegerProperty(default=0, indexed=False)
+    sessionNames = ndb.StringProperty(repeated=True, indexed=False)
+    updated = ndb.DateTimeProperty(auto_now=True, indexed=False)
 
 
 class FeaturedSpeakerForm(messages.Message):
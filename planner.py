@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+"""planner.py
+
+Udacity conference server-side Python App Engine query planning estimates
+
+queryConferences plans a query with inequalities on several fields by
+asking the rollup statistics how many conferences could pass each
+field's filters.  The rollup counts conferences per value (or, for
+maxAttendees, per power of two bucket) of each filter field; these
+helpers turn those histograms into estimates.
+
+"""
+
+# prefixes of the rollup counters holding the distribution of each
+# filter field over conferences, used to plan queries
+STATS_HISTOGRAMS = {
+    'city': 'city:',
+    'topics': 'topic:',
+    'month': 'month:',
+    'maxAttendees': 'maxAttendees:',
+}
+
+
+def estimateMatches(stats, field, filters):
+    """Return how many conferences the rollup statistics say may pass
+    the filters on field: the conferences in every histogram bucket
+    of the field that could hold a match."""
+    total = stats['conferences']
+    prefix = STATS_HISTOGRAMS.get(field)
+    if not prefix:
+        return total
+    matches = 0
+    for name, count in stats.items():
+        if not name.startswith(prefix):
+            continue
+        value = name[len(prefix):]
+        if field == 'maxAttendees':
+            bits = int(value)
+            low, high = 2 ** bits // 2, 2 ** bits - 1
+        elif field == 'month':
+            low = high = int(value)
+        else:
+            low = high = value
+        if all(couldMatch(low, high, filtr["operator"], filtr["value"])
+               for filtr in filters):
+            matches += count
+    # conferences with several topics are counted once per topic
+    return min(matches, total)
+
+
+def couldMatch(low, high, op, value):
+    """Return whether a value from low through high could satisfy
+    'op value'."""
+    if op == '=':
+        return low <= value <= high
+    if op == '!=':
+        return not low == high == value
+    if op == '>':
+        return high > value
+    if op == '>=':
+        return high >= value
+    if op == '<':
+        return low < value
+    return low <= value
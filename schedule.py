@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+"""schedule.py
+
+Udacity conference server-side Python App Engine session time and
+agenda helpers
+
+Sessions keep the free-form start time, duration and date strings users
+enter; these helpers parse them into minutes and dates, and number the
+calendar weeks conferences run in.  A conference schedule is its sessions
+as dicts (entries) sorted by day and start time and indexed by type, day
+and key; a personal agenda is checked against it for overlapping sessions
+and alternatives.
+
+"""
+
+import bisect
+import heapq
+import re
+from datetime import datetime
+
+TIME_RE = re.compile(
+    r'^\s*(\d{1,2})(?::(\d{2}))?\s*(?:([ap])\.?m\.?)?\s*$', re.I)
+DURATION_RE = re.compile(
+    r'^\s*(?:(\d+)\s*h(?:(?:ou)?rs?)?)?\s*(?:(\d+)\s*m(?:in(?:ute)?s?)?)?\s*$',
+    re.I)
+
+
+def parseTime(value):
+    """Return minutes after midnight for a time of day such as '13:00',
+    '9:30', '2pm' or '2:30 p.m.', or None if value is not one."""
+    match = TIME_RE.match(value or '')
+    if not match:
+        return None
+    hour, minute, meridiem = match.groups()
+    if minute is None and meridiem is None:
+        # a bare number is too ambiguous to be a time of day
+        return None
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem.lower() == 'p' else 0)
+    if hour > 23 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+
+def parseDuration(value):
+    """Return the length in minutes of a duration such as '90', '1:30',
+    '2h' or '1h 30min', or None if value is not one."""
+    value = (value or '').strip()
+    if value.isdigit():
+        return int(value)
+    if ':' in value:
+        hours, _, minutes = value.partition(':')
+        if hours.isdigit() and minutes.isdigit() and int(minutes) < 60:
+            return int(hours) * 60 + int(minutes)
+        return None
+    match = DURATION_RE.match(value)
+    if not value or not match or not any(match.groups()):
+        return None
+    hours, minutes = match.groups()
+    return int(hours or 0) * 60 + int(minutes or 0)
+
+
+def weekNumber(day):
+    """Return the number of the Monday to Sunday calendar week holding
+    date day."""
+    return (day.toordinal() - 1) // 7
+
+
+def calendarWeeks(start, end=None):
+    """Return the numbers of the calendar weeks from date start through
+    date end, or [] without a start."""
+    if not start:
+        return []
+    return range(weekNumber(start), weekNumber(max(end or start, start)) + 1)
+
+
+def parseDate(value):
+    """Return the date of a 'YYYY-MM-DD' string, or None if it is not one."""
+    try:
+        return datetime.strptime((value or '')[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def buildSchedule(entries):
+    """Return a schedule of entries sorted by day and start time,
+    with the entry indexes of each session type, day, (type, day)
+    pair and websafe session key."""
+    entries = sorted(entries, key=lambda entry: (
+        entry['day'] or '',
+        entry['startMinutes'] if entry['startMinutes'] is not None
+        else 24 * 60,
+        entry['name']))
+    by_type = {}
+    by_day = {}
+    by_type_day = {}
+    by_key = {}
+    for i, entry in enumerate(entries):
+        by_type.setdefault(entry['typeOfSession'], []).append(i)
+        by_day.setdefault(entry['day'], []).append(i)
+        by_type_day.setdefault(
+            (entry['typeOfSession'], entry['day']), []).append(i)
+        by_key[entry['websafeKey']] = i
+    return {'sessions': entries, 'byType': by_type, 'byDay': by_day,
+            'byTypeDay': by_type_day, 'byKey': by_key}
+
+
+def sessionEnd(entry):
+    """Return the minute a schedule entry ends; every session takes
+    at least the minute it starts in."""
+    return entry['startMinutes'] + max(entry['durationMinutes'] or 0, 1)
+
+
+def findConflicts(entries):
+    """Sort the schedule entries of one day by start time and return,
+    for each, the indexes of the entries it overlaps. An interval
+    sweep keeps the sessions still running in a heap by end time, so
+    this is O(n log n) plus the number of overlaps."""
+    entries.sort(key=lambda entry: (entry['startMinutes'], entry['name']))
+    conflicts = [[] for entry in entries]
+    running = []
+    for i, entry in enumerate(entries):
+        while running and running[0][0] <= entry['startMinutes']:
+            heapq.heappop(running)
+        for end, j in running:
+            conflicts[i].append(j)
+            conflicts[j].append(i)
+        heapq.heappush(running, (sessionEnd(entry), i))
+    return conflicts
+
+
+def agendaReach(entries):
+    """Return the start times of a day's agenda entries, which are
+    sorted by start time, their websafe keys, and for each prefix of
+    them the latest end time with its index and the second latest
+    end time, so the latest end of a prefix without any one entry is
+    read in O(1)."""
+    starts = []
+    latest = []
+    first, second = (0, None), 0
+    for j, entry in enumerate(entries):
+        end = sessionEnd(entry)
+        if end > first[0]:
+            first, second = (end, j), first[0]
+        elif end > second:
+            second = end
+        starts.append(entry['startMinutes'])
+        latest.append((first, second))
+    return {'starts': starts, 'latest': latest,
+            'chosen': set(entry['websafeKey'] for entry in entries)}
+
+
+def agendaAlternatives(schedule, entries, reach, i, limit):
+    """Return up to limit schedule entries of the type
+    and day of entries[i] that overlap none of the day's other
+    agenda entries; reach is the agendaReach of entries. Each
+    candidate costs one bisect, O(log n)."""
+    entry = entries[i]
+    alternatives = []
+    for k in schedule['byTypeDay'].get(
+            (entry['typeOfSession'], entry['day']), []):
+        alt = schedule['sessions'][k]
+        if (alt['startMinutes'] is None or
+                alt['websafeKey'] in reach['chosen']):
+            continue
+        # only agenda sessions starting before alt ends can overlap
+        # it, and one does if the latest of them, other than
+        # entries[i], ends after alt starts
+        before_end = bisect.bisect_left(reach['starts'], sessionEnd(alt))
+        if before_end:
+            (end, j), second = reach['latest'][before_end - 1]
+            if (second if j == i else end) > alt['startMinutes']:
+                continue
+        alternatives.append(alt)
+        if len(alternatives) == limit:
+            break
+    return alternatives
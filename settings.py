@@ -17,3 +17,29 @@ WEB_CLIENT_ID = '615693265950\
 ANDROID_CLIENT_ID = 'replace with Android client ID'
 IOS_CLIENT_ID = 'replace with iOS client ID'
 ANDROID_AUDIENCE = WEB_CLIENT_ID
+
+# Entity cache: seconds an entity stays in memcache, and size and
+# seconds of the per-instance tier (kept short since other instances
+# cannot invalidate it)
+ENTITY_CACHE_TTL = 600
+LOCAL_CACHE_SIZE = 1000
+LOCAL_CACHE_TTL = 5
+
+# Seconds a cached queryConferences result page stays in memcache; pages
+# read within QUERY_CACHE_SETTLE_SECONDS of a Conference write are not
+# cached, as the eventually consistent queries may not see the write yet
+QUERY_CACHE_TTL = 300
+QUERY_CACHE_SETTLE_SECONDS = 5
+
+# Longest time, in seconds, an OAuth token's user ID stays cached; tokens
+# expiring sooner are cached only until they expire
+TOKEN_CACHE_TTL = 3600
+
+# Conference search index: 'search_api' for the App Engine Search API,
+# 'local' for an in-process index (tests)
+SEARCH_BACKEND = 'search_api'
+
+# Requests taking at least this many milliseconds go to the slow request
+# log, which keeps the last SLOW_LOG_SIZE of them
+SLOW_REQUEST_MS = 500
+SLOW_LOG_SIZE = 50
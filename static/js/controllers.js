@@ -261,6 +261,13 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
 
     $scope.selectedTab = 'ALL';
 
+    /**
+     * The conference fields the list shows; the API leaves out the rest.
+     * @type {Array}
+     */
+    var LIST_FIELDS = ['websafeKey', 'name', 'city', 'startDate',
+        'organizerDisplayName', 'maxAttendees', 'seatsAvailable'];
+
     /**
      * Holds the filters that will be applied when queryConferencesAll is invoked.
      * @type {Array}
@@ -295,6 +302,18 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
      */
     $scope.conferences = [];
 
+    /**
+     * Holds the token of the next page of conferences, if the API may have more.
+     * @type {string}
+     */
+    $scope.nextPageToken = '';
+
+    /**
+     * Holds the queryConferences request of the conferences displayed, to fetch more of them.
+     * @type {Object}
+     */
+    var lastQuery = null;
+
     /**
      * Holds the state if offcanvas is enabled.
      *
@@ -416,6 +435,7 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
      */
     $scope.queryConferences = function () {
         $scope.submitted = false;
+        $scope.nextPageToken = '';
         if ($scope.selectedTab == 'ALL') {
             $scope.queryConferencesAll();
         } else if ($scope.selectedTab == 'YOU_HAVE_CREATED') {
@@ -425,22 +445,40 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
         }
     };
 
+    /**
+     * Appends the next page of the conferences queried.
+     */
+    $scope.loadMoreConferences = function () {
+        if ($scope.nextPageToken && $scope.selectedTab == 'ALL') {
+            $scope.queryConferencesAll(true);
+        }
+    };
+
     /**
      * Invokes the conference.queryConferences API.
+     *
+     * @param more if the next page of the last query should be appended to the conferences.
      */
-    $scope.queryConferencesAll = function () {
+    $scope.queryConferencesAll = function (more) {
         var sendFilters = {
-            filters: []
+            filters: [],
+            select: LIST_FIELDS
         }
-        for (var i = 0; i < $scope.filters.length; i++) {
-            var filter = $scope.filters[i];
-            if (filter.field && filter.operator && filter.value) {
-                sendFilters.filters.push({
-                    field: filter.field.enumValue,
-                    operator: filter.operator.enumValue,
-                    value: filter.value
-                });
+        if (more && lastQuery) {
+            sendFilters = angular.extend({}, lastQuery, {pageToken: $scope.nextPageToken});
+        } else {
+            more = false;
+            for (var i = 0; i < $scope.filters.length; i++) {
+                var filter = $scope.filters[i];
+                if (filter.field && filter.operator && filter.value) {
+                    sendFilters.filters.push({
+                        field: filter.field.enumValue,
+                        operator: filter.operator.enumValue,
+                        value: filter.value
+                    });
+                }
             }
+            lastQuery = sendFilters;
         }
         $scope.loading = true;
         gapi.client.conference.queryConferences(sendFilters).
@@ -460,7 +498,10 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
                         $scope.alertStatus = 'success';
                         $log.info($scope.messages);
 
-                        $scope.conferences = [];
+                        if (!more) {
+                            $scope.conferences = [];
+                        }
+                        $scope.nextPageToken = resp.nextPageToken || '';
                         angular.forEach(resp.items, function (conference) {
                             $scope.conferences.push(conference);
                         });
@@ -475,7 +516,9 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
      */
     $scope.getConferencesCreated = function () {
         $scope.loading = true;
-        gapi.client.conference.getConferencesCreated().
+        gapi.client.conference.getConferencesCreated({
+            select: LIST_FIELDS
+        }).
             execute(function (resp) {
                 $scope.$apply(function () {
                     $scope.loading = false;
@@ -0,0 +1,58 @@
+"""App Engine testbed set up for the tests that need the SDK.
+
+Those tests are skipped when dev_appserver cannot be imported; set
+APPENGINE_SDK to the google_appengine directory if it is not on the path.
+"""
+
+import os
+import unittest
+
+from benchmark import setupSdk
+
+try:
+    setupSdk(os.environ.get('APPENGINE_SDK'))
+    HAVE_SDK = True
+except ImportError:
+    HAVE_SDK = False
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@unittest.skipUnless(HAVE_SDK, 'App Engine SDK not found')
+class TestbedTestCase(unittest.TestCase):
+    """TestbedTestCase -- runs each test against fresh API stubs, signed
+    in as user@example.com"""
+
+    def setUp(self):
+        from google.appengine.datastore import datastore_stub_util
+        from google.appengine.ext import ndb
+        from google.appengine.ext import testbed
+
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub(
+            consistency_policy=datastore_stub_util.
+            PseudoRandomHRConsistencyPolicy(probability=1))
+        self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub(root_path=ROOT_PATH)
+        self.testbed.init_app_identity_stub()
+        self.testbed.init_mail_stub()
+        self.testbed.init_search_stub()
+        self.testbed.init_urlfetch_stub()
+        self.testbed.init_user_stub()
+        ndb.get_context().clear_cache()
+        self.loginAs('user@example.com')
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    @staticmethod
+    def loginAs(email):
+        """Make email the endpoints user."""
+        os.environ['ENDPOINTS_AUTH_EMAIL'] = email
+        os.environ['ENDPOINTS_AUTH_DOMAIN'] = 'example.com'
+
+    @staticmethod
+    def request(method, **fields):
+        """Return a request message for an endpoints method."""
+        return method.remote.request_type(**fields)
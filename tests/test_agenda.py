@@ -0,0 +1,130 @@
+"""Tests of the schedule and agenda helpers in schedule.py."""
+
+import itertools
+import random
+import unittest
+
+from schedule import agendaAlternatives
+from schedule import agendaReach
+from schedule import buildSchedule
+from schedule import findConflicts
+from schedule import sessionEnd
+
+
+def entry(key, start, duration, type_of_session='Lecture', day='2016-07-04'):
+    """Return a schedule entry with just the fields the helpers read."""
+    return {'websafeKey': key, 'name': key, 'typeOfSession': type_of_session,
+            'day': day, 'startMinutes': start, 'durationMinutes': duration}
+
+
+def overlaps(a, b):
+    return a['startMinutes'] < sessionEnd(b) and \
+        b['startMinutes'] < sessionEnd(a)
+
+
+class BuildScheduleTest(unittest.TestCase):
+
+    def testSortsAndIndexes(self):
+        schedule = buildSchedule([
+            entry('c', 600, 60, day='2016-07-05'),
+            entry('b', None, 60),
+            entry('a', 540, 60, 'Workshop'),
+        ])
+        self.assertEqual([e['websafeKey'] for e in schedule['sessions']],
+                         ['a', 'b', 'c'])
+        self.assertEqual(schedule['byKey'], {'a': 0, 'b': 1, 'c': 2})
+        self.assertEqual(schedule['byType'],
+                         {'Workshop': [0], 'Lecture': [1, 2]})
+        self.assertEqual(schedule['byTypeDay'][('Lecture', '2016-07-04')],
+                         [1])
+
+
+class FindConflictsTest(unittest.TestCase):
+
+    def testOverlaps(self):
+        entries = [entry('b', 570, 60), entry('a', 540, 60),
+                   entry('c', 630, 30), entry('d', 700, None)]
+        conflicts = findConflicts(entries)
+        self.assertEqual([e['websafeKey'] for e in entries],
+                         ['a', 'b', 'c', 'd'])
+        # a session ending as another starts does not overlap it
+        self.assertEqual([sorted(c) for c in conflicts],
+                         [[1], [0], [], []])
+
+    def testZeroLengthSessionsTakeAMinute(self):
+        entries = [entry('a', 540, 0), entry('b', 540, None)]
+        self.assertEqual(findConflicts(entries), [[1], [0]])
+
+    def testMatchesAllPairs(self):
+        rand = random.Random(7)
+        for trial in range(200):
+            entries = [entry('s%d' % k, rand.randint(0, 60),
+                             rand.choice([None, 0, 5, 15, 30]))
+                       for k in range(rand.randint(1, 12))]
+            conflicts = findConflicts(entries)
+            expected = [[] for e in entries]
+            for i, j in itertools.combinations(range(len(entries)), 2):
+                if overlaps(entries[i], entries[j]):
+                    expected[i].append(j)
+                    expected[j].append(i)
+            self.assertEqual([sorted(c) for c in conflicts], expected)
+
+
+class AgendaAlternativesTest(unittest.TestCase):
+
+    def alternatives(self, schedule, entries, i, limit=10):
+        findConflicts(entries)
+        return [alt['websafeKey'] for alt in agendaAlternatives(
+            schedule, entries, agendaReach(entries), i, limit)]
+
+    def testSameTypeAndDayOnly(self):
+        sessions = [entry('a', 540, 60), entry('b', 540, 60),
+                    entry('free', 720, 60), entry('panel', 720, 60, 'Panel'),
+                    entry('tomorrow', 720, 60, day='2016-07-05')]
+        schedule = buildSchedule(sessions)
+        entries = [dict(sessions[0]), dict(sessions[1])]
+        self.assertEqual(self.alternatives(schedule, entries, 0), ['free'])
+
+    def testIgnoresTheSessionItReplaces(self):
+        sessions = [entry('a', 540, 120), entry('b', 600, 30),
+                    entry('early', 540, 30), entry('late', 660, 30)]
+        schedule = buildSchedule(sessions)
+        entries = [dict(sessions[0]), dict(sessions[1])]
+        # 'a' runs until 11:00, so only replacing it frees 9:00
+        self.assertEqual(self.alternatives(schedule, entries, 0),
+                         ['early', 'late'])
+        self.assertEqual(self.alternatives(schedule, entries, 1), ['late'])
+
+    def testLimit(self):
+        sessions = [entry('a', 540, 60), entry('b', 540, 60)] + [
+            entry('alt%d' % k, 720 + k * 60, 30) for k in range(5)]
+        schedule = buildSchedule(sessions)
+        entries = [dict(sessions[0]), dict(sessions[1])]
+        self.assertEqual(self.alternatives(schedule, entries, 0, limit=3),
+                         ['alt0', 'alt1', 'alt2'])
+
+    def testMatchesBruteForce(self):
+        rand = random.Random(11)
+        for trial in range(300):
+            sessions = [entry('s%02d' % k, rand.randint(0, 60),
+                              rand.choice([None, 0, 5, 15, 30]),
+                              rand.choice(['Lecture', 'Workshop']))
+                        for k in range(rand.randint(1, 12))]
+            schedule = buildSchedule(sessions)
+            entries = [dict(e) for e in rand.sample(
+                schedule['sessions'], rand.randint(1, len(sessions)))]
+            findConflicts(entries)
+            chosen = set(e['websafeKey'] for e in entries)
+            for i, chosen_entry in enumerate(entries):
+                others = entries[:i] + entries[i + 1:]
+                expected = [
+                    alt['websafeKey'] for alt in schedule['sessions']
+                    if alt['typeOfSession'] == chosen_entry['typeOfSession']
+                    and alt['websafeKey'] not in chosen
+                    and not any(overlaps(alt, other) for other in others)]
+                self.assertEqual(
+                    self.alternatives(schedule, entries, i), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Tests of the in-process conference search index in local_index.py."""
+
+import unittest
+
+from local_index import LocalIndex
+from local_index import SearchQuery
+
+
+def document(doc_id, name, city=u'', topics=(), month=0, max_attendees=0,
+             seats=0, description=u''):
+    return {'id': doc_id, 'name': name, 'description': description,
+            'city': city, 'topics': list(topics), 'month': month,
+            'maxAttendees': max_attendees, 'seatsAvailable': seats}
+
+
+def query(text=u'', filters=(), ranges=None, facets=(), limit=10, offset=0):
+    return SearchQuery(text, list(filters), ranges or {}, list(facets),
+                       limit, offset)
+
+
+class LocalIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = LocalIndex()
+        self.index.put([
+            document('a', u'PyCon', u'London', [u'Programming Languages'],
+                     month=6, max_attendees=500, seats=3,
+                     description=u'All about Python'),
+            document('b', u'MedTech', u'New York',
+                     [u'Medical Innovations', u'Web'], month=7,
+                     max_attendees=100, seats=50),
+            document('c', u'WebConf', u'London', [u'Web'], month=7,
+                     max_attendees=50, seats=0,
+                     description=u'Web technologies in London'),
+            document('d', u'Untitled'),
+        ])
+
+    def search(self, **kwargs):
+        return self.index.search(query(**kwargs)).ids
+
+    def testTextMatchesWordsOfNameAndDescription(self):
+        self.assertEqual(self.search(text=u'python'), ['a'])
+        self.assertEqual(self.search(text=u'web technologies'), ['c'])
+
+    def testTextMatchesWholeAtomValuesOnly(self):
+        # a whole single word city or topic matches ...
+        self.assertEqual(self.search(text=u'London'), ['a', 'c'])
+        self.assertEqual(self.search(text=u'web'), ['b', 'c'])
+        # ... but not one word of a longer value
+        self.assertEqual(self.search(text=u'york'), [])
+        self.assertEqual(self.search(text=u'innovations'), [])
+
+    def testEqualityIgnoresCase(self):
+        self.assertEqual(
+            self.search(filters=[('city', '=', u'london')]), ['a', 'c'])
+        self.assertEqual(
+            self.search(filters=[('topics', '=', u'web')]), ['b', 'c'])
+
+    def testNotEqualExcludesAnyMatchingValue(self):
+        # MedTech has the topic Web among others, and is still excluded
+        self.assertEqual(
+            self.search(filters=[('topics', '!=', u'Web')]), ['a', 'd'])
+        self.assertEqual(
+            self.search(filters=[('month', '!=', 7)]), ['a', 'd'])
+
+    def testComparisonsAreAnded(self):
+        self.assertEqual(self.search(filters=[
+            ('month', '>=', 7), ('maxAttendees', '>', 60)]), ['b'])
+
+    def testRangesAreOred(self):
+        # results come in name order: MedTech, Untitled, WebConf
+        self.assertEqual(self.search(ranges={
+            'seatsAvailable': [(None, 0), (40, None)]}), ['b', 'd', 'c'])
+
+    def testFacetsAndPaging(self):
+        result = self.index.search(query(
+            facets=['city', 'topics', 'month'], limit=2, offset=1))
+        self.assertEqual(result.total, 4)
+        # name order: MedTech, PyCon, Untitled, WebConf
+        self.assertEqual(result.ids, ['a', 'd'])
+        self.assertEqual(result.facets['city'],
+                         [(u'London', 2), (u'New York', 1)])
+        self.assertEqual(result.facets['topics'], [
+            (u'Web', 2), (u'Medical Innovations', 1),
+            (u'Programming Languages', 1)])
+        self.assertEqual(result.facets['month'], [(7, 2), (0, 1), (6, 1)])
+
+    def testReplaceAndDelete(self):
+        self.index.put([document('a', u'PyCon', u'Paris')])
+        self.assertEqual(self.search(text=u'london'), ['c'])
+        self.assertEqual(self.search(text=u'paris'), ['a'])
+        self.index.delete(['a', 'c'])
+        self.assertEqual(self.search(), ['b', 'd'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Tests of the query planning estimates in planner.py."""
+
+import collections
+import unittest
+
+from planner import couldMatch
+from planner import estimateMatches
+
+
+def filters(field, *conditions):
+    return [{'field': field, 'operator': op, 'value': value}
+            for op, value in conditions]
+
+
+class CouldMatchTest(unittest.TestCase):
+
+    def testSingleValue(self):
+        self.assertTrue(couldMatch(5, 5, '=', 5))
+        self.assertFalse(couldMatch(5, 5, '!=', 5))
+        self.assertTrue(couldMatch(5, 5, '!=', 6))
+        self.assertFalse(couldMatch(5, 5, '>', 5))
+        self.assertTrue(couldMatch(5, 5, '>=', 5))
+        self.assertFalse(couldMatch(5, 5, '<', 5))
+        self.assertTrue(couldMatch(5, 5, '<=', 5))
+
+    def testRange(self):
+        # a bucket of 64 through 127
+        self.assertTrue(couldMatch(64, 127, '=', 100))
+        self.assertFalse(couldMatch(64, 127, '=', 128))
+        self.assertTrue(couldMatch(64, 127, '!=', 100))
+        self.assertTrue(couldMatch(64, 127, '>', 100))
+        self.assertFalse(couldMatch(64, 127, '>', 127))
+        self.assertTrue(couldMatch(64, 127, '<', 100))
+        self.assertFalse(couldMatch(64, 127, '<', 64))
+
+    def testStrings(self):
+        self.assertTrue(couldMatch(u'London', u'London', '=', u'London'))
+        self.assertTrue(couldMatch(u'London', u'London', '>', u'Chicago'))
+        self.assertFalse(couldMatch(u'London', u'London', '<', u'Chicago'))
+
+
+class EstimateMatchesTest(unittest.TestCase):
+
+    def setUp(self):
+        # 0: one conference with maxAttendees 0; 7: 64 through 127;
+        # 11: 1024 through 2047
+        self.stats = collections.Counter({
+            'conferences': 10,
+            'city:London': 6, 'city:Tokyo': 3,
+            'topic:Web': 4, 'topic:Movies': 8,
+            'month:6': 2, 'month:7': 5,
+            'maxAttendees:0': 1, 'maxAttendees:7': 4, 'maxAttendees:11': 3,
+        })
+
+    def testEquality(self):
+        self.assertEqual(estimateMatches(
+            self.stats, 'city', filters('city', ('=', u'London'))), 6)
+        self.assertEqual(estimateMatches(
+            self.stats, 'month', filters('month', ('=', 8))), 0)
+
+    def testInequalities(self):
+        self.assertEqual(estimateMatches(
+            self.stats, 'month', filters('month', ('>=', 7))), 5)
+        self.assertEqual(estimateMatches(
+            self.stats, 'city', filters('city', ('!=', u'London'))), 3)
+        self.assertEqual(estimateMatches(
+            self.stats, 'maxAttendees',
+            filters('maxAttendees', ('>', 100), ('<', 1500))), 7)
+        self.assertEqual(estimateMatches(
+            self.stats, 'maxAttendees',
+            filters('maxAttendees', ('<', 64))), 1)
+
+    def testConferencesWithoutTheFieldAreNotCounted(self):
+        # month is unset on the three conferences in no month bucket
+        self.assertEqual(estimateMatches(
+            self.stats, 'month', filters('month', ('<', 12))), 7)
+
+    def testRepeatedFieldIsCappedAtTheTotal(self):
+        self.assertEqual(estimateMatches(
+            self.stats, 'topics', filters('topics', ('!=', u'Other'))), 10)
+
+    def testFieldWithoutHistogram(self):
+        self.assertEqual(estimateMatches(
+            self.stats, 'seatsAvailable',
+            filters('seatsAvailable', ('>', 5))), 10)
+
+    def testNoStatistics(self):
+        self.assertEqual(estimateMatches(
+            collections.Counter(), 'city',
+            filters('city', ('=', u'London'))), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""Tests of the session time helpers in schedule.py."""
+
+import unittest
+from datetime import date
+
+from schedule import calendarWeeks
+from schedule import parseDate
+from schedule import parseDuration
+from schedule import parseTime
+from schedule import weekNumber
+
+
+class ParseTimeTest(unittest.TestCase):
+
+    def testTwentyFourHourClock(self):
+        self.assertEqual(parseTime('13:00'), 13 * 60)
+        self.assertEqual(parseTime(' 9:30 '), 9 * 60 + 30)
+        self.assertEqual(parseTime('0:05'), 5)
+
+    def testTwelveHourClock(self):
+        self.assertEqual(parseTime('2pm'), 14 * 60)
+        self.assertEqual(parseTime('2:30 p.m.'), 14 * 60 + 30)
+        self.assertEqual(parseTime('12am'), 0)
+        self.assertEqual(parseTime('12 PM'), 12 * 60)
+
+    def testRejectsAmbiguousOrInvalidTimes(self):
+        for value in (None, '', '9', '24:00', '9:60', '13pm', '0am',
+                      'noon', '9.30'):
+            self.assertIsNone(parseTime(value), value)
+
+
+class ParseDurationTest(unittest.TestCase):
+
+    def testMinutes(self):
+        self.assertEqual(parseDuration('90'), 90)
+        self.assertEqual(parseDuration(' 45 '), 45)
+
+    def testHoursAndMinutes(self):
+        self.assertEqual(parseDuration('1:30'), 90)
+        self.assertEqual(parseDuration('2h'), 120)
+        self.assertEqual(parseDuration('1h 30min'), 90)
+        self.assertEqual(parseDuration('1 hour 15 minutes'), 75)
+        self.assertEqual(parseDuration('20 mins'), 20)
+
+    def testRejectsInvalidDurations(self):
+        for value in (None, '', '1:75', 'h', 'an hour', '1:xx'):
+            self.assertIsNone(parseDuration(value), value)
+
+
+class ParseDateTest(unittest.TestCase):
+
+    def testDates(self):
+        self.assertEqual(parseDate('2016-07-04'), date(2016, 7, 4))
+        # a time after the date is ignored
+        self.assertEqual(parseDate('2016-07-04T10:00'), date(2016, 7, 4))
+
+    def testRejectsInvalidDates(self):
+        for value in (None, '', '2016-13-01', '04/07/2016'):
+            self.assertIsNone(parseDate(value), value)
+
+
+class CalendarWeeksTest(unittest.TestCase):
+
+    def testWeeksRunMondayToSunday(self):
+        monday = date(2016, 7, 4)
+        self.assertEqual(weekNumber(date(2016, 7, 10)), weekNumber(monday))
+        self.assertEqual(weekNumber(date(2016, 7, 3)), weekNumber(monday) - 1)
+
+    def testWeeksOfAConference(self):
+        first = weekNumber(date(2016, 7, 4))
+        self.assertEqual(calendarWeeks(date(2016, 7, 8)), [first])
+        self.assertEqual(
+            calendarWeeks(date(2016, 7, 8), date(2016, 7, 19)),
+            [first, first + 1, first + 2])
+
+    def testMissingOrReversedDates(self):
+        self.assertEqual(calendarWeeks(None, date(2016, 7, 8)), [])
+        # an end before the start is treated as a one day conference
+        self.assertEqual(calendarWeeks(date(2016, 7, 8), date(2016, 6, 1)),
+                         calendarWeeks(date(2016, 7, 8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
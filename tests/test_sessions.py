@@ -0,0 +1,43 @@
+"""Tests of session creation through ConferenceApi; they need the SDK."""
+
+from tests.sdk import TestbedTestCase
+
+
+class CreateSessionTest(TestbedTestCase):
+
+    def setUp(self):
+        super(CreateSessionTest, self).setUp()
+        import conference
+        from models import ConferenceForm
+        self.api_class = conference.ConferenceApi
+        conf = self.api_class().createConference(ConferenceForm(
+            name='PyCon', city='London', startDate='2016-07-04',
+            endDate='2016-07-06', maxAttendees=100))
+        self.websafe_conference_key = conf.websafeKey
+
+    def testCreateSession(self):
+        session = self.api_class().createSession(self.request(
+            self.api_class.createSession,
+            websafeConferenceKey=self.websafe_conference_key,
+            name='Keynote', speaker='Jane Doe', typeOfSession='Keynote',
+            date='2016-07-04', start_time='9:00', duration='1h'))
+        self.assertTrue(session.websafeKey)
+        self.assertEqual(session.name, 'Keynote')
+
+        sessions = self.api_class().getConferenceSessions(self.request(
+            self.api_class.getConferenceSessions,
+            websafeConferenceKey=self.websafe_conference_key))
+        self.assertEqual([sf.websafeKey for sf in sessions.items],
+                         [session.websafeKey])
+
+    def testImportSessions(self):
+        from models import SessionForm
+        result = self.api_class().importSessions(self.request(
+            self.api_class.importSessions,
+            websafeConferenceKey=self.websafe_conference_key,
+            items=[SessionForm(name='Talk %d' % i, speaker='Jane Doe',
+                               conferenceName='ignored')
+                   for i in range(3)]))
+        self.assertEqual([item.error for item in result.items],
+                         [None, None, None])
+        self.assertTrue(all(item.websafeKey for item in result.items))
@@ -0,0 +1,120 @@
+"""Tests of the OAuth token cache in utils, with tokeninfo replaced by a
+local stub; they need the SDK for memcache and urlfetch."""
+
+import hashlib
+
+from tests.sdk import TestbedTestCase
+
+
+class FakeClock(object):
+    """FakeClock -- stands in for the time module of utils; sleeping
+    fails the test"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        raise AssertionError('slept %s seconds' % seconds)
+
+
+class TokenCacheTest(TestbedTestCase):
+
+    def setUp(self):
+        super(TokenCacheTest, self).setUp()
+        import utils
+        self.utils = utils
+        self.saved = (utils.fetchTokenInfo, utils.time)
+        self.clock = utils.time = FakeClock(1000000)
+        utils._token_cache.clear()
+        self.fetched = []
+        self.tokeninfo = {'user_id': '42', 'expires_in': '60'}
+        utils.fetchTokenInfo = self.fetchTokenInfo
+
+    def tearDown(self):
+        self.utils.fetchTokenInfo, self.utils.time = self.saved
+        self.utils._token_cache.clear()
+        super(TokenCacheTest, self).tearDown()
+
+    def fetchTokenInfo(self, token_type, token):
+        self.fetched.append((token_type, token))
+        return self.tokeninfo
+
+    def cached(self, token):
+        from google.appengine.api import memcache
+        return memcache.get(self.utils.MEMCACHE_TOKEN_PREFIX +
+                            hashlib.sha256(token).hexdigest())
+
+    def testTtlIsBoundedByExpiry(self):
+        self.assertEqual(self.utils.getOAuthUserId('id_token', 'abc'), '42')
+        self.assertEqual(self.cached('abc'), ('42', self.clock.now + 60))
+
+        self.tokeninfo = {'user_id': '43', 'expires_in': '86400'}
+        self.utils.getOAuthUserId('id_token', 'def')
+        self.assertEqual(
+            self.cached('def'),
+            ('43', self.clock.now + self.utils.TOKEN_CACHE_TTL))
+
+    def testExpiredTokenIsNotCached(self):
+        self.tokeninfo = {'user_id': '42', 'expires_in': '0'}
+        self.utils.getOAuthUserId('id_token', 'abc')
+        self.utils.getOAuthUserId('id_token', 'abc')
+        self.assertEqual(len(self.fetched), 2)
+        self.assertEqual(self.cached('abc'), None)
+
+    def testLookupsAreCached(self):
+        self.utils.getOAuthUserId('id_token', 'abc')
+        self.utils.getOAuthUserId('id_token', 'abc')
+        self.assertEqual(self.fetched, [('id_token', 'abc')])
+
+    def testMemcacheHit(self):
+        self.utils.getOAuthUserId('id_token', 'abc')
+        # another instance: nothing in the local tier
+        self.utils._token_cache.clear()
+        self.assertEqual(self.utils.getOAuthUserId('id_token', 'abc'), '42')
+        self.assertEqual(len(self.fetched), 1)
+
+    def testInvalidToken(self):
+        self.tokeninfo = {}
+        self.assertEqual(self.utils.getOAuthUserId('id_token', 'abc'), '')
+        self.tokeninfo = {'error': 'invalid_token'}
+        self.assertEqual(self.utils.getOAuthUserId('id_token', 'abc'), '')
+        self.assertEqual(len(self.fetched), 2)
+        self.assertEqual(self.cached('abc'), None)
+
+
+class FetchTokenInfoTest(TestbedTestCase):
+
+    def setUp(self):
+        super(FetchTokenInfoTest, self).setUp()
+        import utils
+        self.utils = utils
+        self.saved = (utils.urlfetch, utils.time)
+        utils.time = FakeClock(1000000)
+        self.urls = []
+        utils.urlfetch = self
+
+    def tearDown(self):
+        self.utils.urlfetch, self.utils.time = self.saved
+        super(FetchTokenInfoTest, self).tearDown()
+
+    # the part of the urlfetch module fetchTokenInfo uses; every call
+    # fails
+    @property
+    def Error(self):
+        return self.saved[0].Error
+
+    def create_rpc(self, deadline=None):
+        return self
+
+    def make_fetch_call(self, rpc, url):
+        self.urls.append(url)
+
+    def get_result(self):
+        raise self.Error('unreachable')
+
+    def testRetriesWithoutSleeping(self):
+        self.assertEqual(self.utils.fetchTokenInfo('id_token', 'abc'), {})
+        self.assertEqual(len(self.urls), self.utils.TOKENINFO_ATTEMPTS)
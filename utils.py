@@ -1,11 +1,26 @@
+import hashlib
 import json
 import os
 import time
 import uuid
 
+from google.appengine.api import memcache
 from google.appengine.api import urlfetch
 from models import Profile
 
+from cache import LRUCache
+from settings import LOCAL_CACHE_SIZE
+from settings import TOKEN_CACHE_TTL
+
+TOKENINFO_URL = 'https://www.googleapis.com/oauth2/v1/tokeninfo?%s=%s'
+TOKENINFO_ATTEMPTS = 3
+TOKENINFO_DEADLINE = 5
+MEMCACHE_TOKEN_PREFIX = 'oauth_user_id:'
+
+# user IDs of recently seen tokens in this instance; also dedupes the
+# lookups of a single request
+_token_cache = LRUCache(LOCAL_CACHE_SIZE, TOKEN_CACHE_TTL)
+
 
 def getUserId(user, id_type="email"):
     if id_type == "email":
@@ -18,22 +33,7 @@ def getUserId(user, id_type="email"):
         token_type = 'id_token'
         if 'OAUTH_USER_ID' in os.environ:
             token_type = 'access_token'
-        url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?%s=%s'
-               % (token_type, token))
-        user = {}
-        wait = 1
-        for i in range(3):
-            resp = urlfetch.fetch(url)
-            if resp.status_code == 200:
-                user = json.loads(resp.content)
-                break
-            elif resp.status_code == 400 and 'invalid_token' in resp.content:
-                url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?%s=%s'
-                       % ('access_token', token))
-            else:
-                time.sleep(wait)
-                wait = wait + i
-        return user.get('user_id', '')
+        return getOAuthUserId(token_type, token)
 
     if id_type == "custom":
         # implement your own user_id creation and getting algorythm
@@ -44,3 +44,53 @@ def getUserId(user, id_type="email"):
             return profile.id()
         else:
             return str(uuid.uuid1().get_hex())
+
+
+def getOAuthUserId(token_type, token):
+    """Return the user ID of an OAuth token ('' if it is not valid),
+    cached in this instance and in memcache until the token expires."""
+    cache_key = MEMCACHE_TOKEN_PREFIX + hashlib.sha256(token).hexdigest()
+    user_id = _token_cache.get(cache_key)
+    if user_id is not None:
+        return user_id
+
+    cached = memcache.get(cache_key)
+    if cached is None:
+        user = fetchTokenInfo(token_type, token)
+        user_id = user.get('user_id', '')
+        if not user_id:
+            return ''
+        ttl = min(int(user.get('expires_in', 0)), TOKEN_CACHE_TTL)
+        cached = (user_id, time.time() + ttl)
+        if ttl > 0:
+            memcache.set(cache_key, cached, time=ttl)
+
+    user_id, expires = cached
+    ttl = expires - time.time()
+    if ttl > 0:
+        _token_cache.set(cache_key, user_id, ttl=ttl)
+    return user_id
+
+
+def fetchTokenInfo(token_type, token):
+    """Return the Google tokeninfo of an OAuth token ({} if it cannot be
+    had). Failed calls are retried at once rather than after sleeping;
+    tests replace this function with a local stub."""
+    for attempt in range(TOKENINFO_ATTEMPTS):
+        rpc = urlfetch.create_rpc(deadline=TOKENINFO_DEADLINE)
+        urlfetch.make_fetch_call(rpc, TOKENINFO_URL % (token_type, token))
+        try:
+            resp = rpc.get_result()
+        except urlfetch.Error:
+            continue
+        if resp.status_code == 200:
+            return json.loads(resp.content)
+        elif resp.status_code == 400 and 'invalid_token' in resp.content:
+            token_type = 'access_token'
+    return {}
+
+
+def normalizeSpeaker(name):
+    """Return the canonical form of a speaker name: trimmed, inner
+    whitespace collapsed and lower case ('' if there is no name)."""
+    return u' '.join((name or u'').split()).lower()